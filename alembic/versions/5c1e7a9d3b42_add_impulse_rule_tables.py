@@ -0,0 +1,58 @@
+"""Add impulse rule tables
+
+Revision ID: 5c1e7a9d3b42
+Revises: 2dbb0dd88c27
+Create Date: 2026-10-17 11:20:04.512337
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5c1e7a9d3b42'
+down_revision: Union[str, None] = '2dbb0dd88c27'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'impulse_rule_sets',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('version', sa.Integer(), nullable=False),
+        sa.Column('min_triggers', sa.Integer(), nullable=True),
+        sa.Column('soft_trigger_threshold', sa.Integer(), nullable=True),
+        sa.Column('recent_purchase_days', sa.Integer(), nullable=True),
+        sa.Column('amount_threshold', sa.Float(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_impulse_rule_sets_id'), 'impulse_rule_sets', ['id'], unique=False)
+    op.create_index(op.f('ix_impulse_rule_sets_user_id'), 'impulse_rule_sets', ['user_id'], unique=True)
+    op.create_table(
+        'impulse_rule_keywords',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('rule_set_id', sa.Integer(), nullable=False),
+        sa.Column('category', sa.String(), nullable=False),
+        sa.Column('keyword', sa.String(), nullable=False),
+        sa.ForeignKeyConstraint(['rule_set_id'], ['impulse_rule_sets.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_impulse_rule_keywords_id'), 'impulse_rule_keywords', ['id'], unique=False)
+    op.create_index(op.f('ix_impulse_rule_keywords_rule_set_id'), 'impulse_rule_keywords', ['rule_set_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_impulse_rule_keywords_rule_set_id'), table_name='impulse_rule_keywords')
+    op.drop_index(op.f('ix_impulse_rule_keywords_id'), table_name='impulse_rule_keywords')
+    op.drop_table('impulse_rule_keywords')
+    op.drop_index(op.f('ix_impulse_rule_sets_user_id'), table_name='impulse_rule_sets')
+    op.drop_index(op.f('ix_impulse_rule_sets_id'), table_name='impulse_rule_sets')
+    op.drop_table('impulse_rule_sets')
@@ -0,0 +1,49 @@
+"""Add user behavior feature tables
+
+Revision ID: 8f3b2c6d1e07
+Revises: 5c1e7a9d3b42
+Create Date: 2026-10-17 11:48:31.207615
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8f3b2c6d1e07'
+down_revision: Union[str, None] = '5c1e7a9d3b42'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Rows are backfilled lazily from spending_logs / nudge_logs on first use
+    op.create_table(
+        'user_behavior_features',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('purchase_count', sa.Integer(), nullable=False),
+        sa.Column('regret_count', sa.Integer(), nullable=False),
+        sa.Column('last_purchase_at', sa.DateTime(), nullable=True),
+        sa.Column('nudge_count', sa.Integer(), nullable=False),
+        sa.Column('last_nudge_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('user_id')
+    )
+    op.create_table(
+        'user_daily_spend',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('amount', sa.Float(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('user_id', 'day')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('user_daily_spend')
+    op.drop_table('user_behavior_features')
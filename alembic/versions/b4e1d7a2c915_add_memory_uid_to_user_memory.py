@@ -0,0 +1,31 @@
+"""Add memory_uid to user_memory
+
+Revision ID: b4e1d7a2c915
+Revises: 8f3b2c6d1e07
+Create Date: 2026-10-17 14:05:12.418337
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b4e1d7a2c915'
+down_revision: Union[str, None] = '8f3b2c6d1e07'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Existing rows keep NULL: their vector-store entries used count-based IDs
+    op.add_column('user_memory', sa.Column('memory_uid', sa.String(length=26), nullable=True))
+    op.create_index(op.f('ix_user_memory_memory_uid'), 'user_memory', ['memory_uid'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_user_memory_memory_uid'), table_name='user_memory')
+    op.drop_column('user_memory', 'memory_uid')
@@ -0,0 +1,45 @@
+"""Add memory outbox table
+
+Revision ID: d2f8a6c4e193
+Revises: b4e1d7a2c915
+Create Date: 2026-10-17 15:22:47.903114
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd2f8a6c4e193'
+down_revision: Union[str, None] = 'b4e1d7a2c915'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'memory_outbox',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('memory_uid', sa.String(length=26), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('content', sa.String(), nullable=False),
+        sa.Column('timestamp', sa.DateTime(), nullable=True),
+        sa.Column('attempts', sa.Integer(), nullable=False),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('next_attempt_at', sa.DateTime(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_memory_outbox_id'), 'memory_outbox', ['id'], unique=False)
+    op.create_index(op.f('ix_memory_outbox_next_attempt_at'), 'memory_outbox', ['next_attempt_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_memory_outbox_next_attempt_at'), table_name='memory_outbox')
+    op.drop_index(op.f('ix_memory_outbox_id'), table_name='memory_outbox')
+    op.drop_table('memory_outbox')
@@ -0,0 +1,47 @@
+"""Add nudge quota usage table
+
+Revision ID: e7c3b9d5f241
+Revises: d2f8a6c4e193
+Create Date: 2026-10-17 18:05:12.441873
+
+"""
+from datetime import datetime
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e7c3b9d5f241'
+down_revision: Union[str, None] = 'd2f8a6c4e193'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'nudge_quota_usage',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('period', sa.String(length=7), nullable=False),
+        sa.Column('nudge_count', sa.Integer(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('user_id', 'period')
+    )
+    # Seed the current month; other months are backfilled lazily by services.nudge_quota
+    now = datetime.utcnow()
+    op.get_bind().execute(
+        sa.text(
+            "INSERT INTO nudge_quota_usage (user_id, period, nudge_count, updated_at) "
+            "SELECT user_id, :period, COUNT(*), :now FROM nudge_logs "
+            "WHERE timestamp >= :start GROUP BY user_id"
+        ),
+        {"period": now.strftime("%Y-%m"), "now": now, "start": datetime(now.year, now.month, 1)},
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('nudge_quota_usage')
@@ -0,0 +1,76 @@
+"""Synthetic spending-intent corpus for impulse engine benchmarks.
+
+Rows look like the payloads the app sends to scan_impulse_triggers: an item
+name, mood, situation and explanation drawn from realistic phrases, plus the
+structured pattern / urgency / last_purchase_days fields. Generation is fully
+determined by (rows, seed), so golden snapshots are reproducible.
+"""
+import random
+from typing import Dict, Iterator, List
+
+BRANDS = ["Gucci", "Louis Vuitton", "Nike", "Apple", "Sony", "Zara", "Rolex", "Adidas", "Prada", "IKEA", "Samsung", "Uniqlo", ""]
+ADJECTIVES = ["limited edition", "designer", "new", "premium", "vintage", "exclusive", "collectible", "cheap", "used", "on-sale", "", ""]
+ITEMS = [
+    "sneakers", "handbag", "watch", "jacket", "iPhone 15 Pro", "MacBook Air", "headphones", "smartwatch",
+    "weekend trip to Paris", "vacation package", "gaming console", "sunglasses", "perfume", "hoodie",
+    "groceries", "rent", "electric bill", "medicine", "bus pass", "car insurance", "water bill", "gas refill",
+]
+MOODS = [
+    "bored", "sad", "anxious", "excited", "stressed out", "lonely", "happy", "calm", "tired", "burned out",
+    "feeling FOMO", "restless", "overwhelmed", "fine", "content", "angry after a fight", "", "",
+]
+SITUATIONS = [
+    "flash sale ending soon", "friends are all buying one", "everyone around me has it", "birthday celebration",
+    "peer pressure at work", "reward for finishing a project", "treat myself after a stressful week",
+    "only 1 left in stock", "last chance deal today", "regular monthly shopping", "planned purchase",
+    "saw it on instagram", "special occasion", "just browsing", "", "",
+]
+EXPLANATIONS = [
+    "idk, just felt like it", "I don't know why", "because I wanted to", "no reason really", "I just really want it",
+    "can't explain it", "probably don't need it", "not sure", "it feels right", "need it for work",
+    "my old one broke", "been saving up for months", "it's on my budget list", "must buy now before it's gone",
+    "impulse", "", "",
+]
+
+
+def generate_rows(rows: int, seed: int = 1337) -> Iterator[Dict]:
+    rng = random.Random(seed)
+    for _ in range(rows):
+        item = " ".join(p for p in (rng.choice(BRANDS), rng.choice(ADJECTIVES), rng.choice(ITEMS)) if p)
+        yield {
+            "item_name": item,
+            "mood": rng.choice(MOODS),
+            "pattern": rng.choice([None, None, "", "bought similar last month"]),
+            "urgency": rng.choice([None, False, False, True]),
+            "last_purchase_days": rng.choice([None, None, 0, 1, 2, 3, 5, 14, 30]),
+            "situation": rng.choice(SITUATIONS),
+            "explanation": rng.choice(EXPLANATIONS),
+        }
+
+
+def generate_corpus(rows: int, seed: int = 1337) -> List[Dict]:
+    return list(generate_rows(rows, seed))
+
+
+MEMORY_TEMPLATES = [
+    "I bought {item} when I was {mood} and regretted it. {explanation}",
+    "Spent too much on {item}: {situation}.",
+    "Skipped {item} after waiting a day, glad I did.",
+    "Regret buying {item}, {explanation}.",
+    "{situation} so I got {item}. Felt {mood} afterwards.",
+]
+
+
+def generate_memory_texts(rows: int, seed: int = 1337) -> List[str]:
+    """Journal-style memory sentences (the text users store via /memory/store) built from the same phrases."""
+    rng = random.Random(seed)
+    texts = []
+    for row in generate_rows(rows, seed):
+        template = rng.choice(MEMORY_TEMPLATES)
+        texts.append(" ".join(template.format(
+            item=row["item_name"],
+            mood=row["mood"] or "fine",
+            situation=row["situation"] or "no reason",
+            explanation=row["explanation"] or "no reason",
+        ).split()))
+    return texts
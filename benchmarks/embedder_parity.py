@@ -0,0 +1,90 @@
+"""Cosine parity and latency of the ONNX int8 embedder against SentenceTransformer.
+
+Usage (from the repo root, after scripts/export_onnx_embedder.py):
+    python -m benchmarks.embedder_parity
+    python -m benchmarks.embedder_parity --onnx-path models/all-MiniLM-L6-v2-onnx-int8 --rows 2000 --min-cosine 0.98
+
+Both backends embed the same synthetic memory corpus. The report covers:
+- per-text cosine between the two vectors (mean / p1 / min)
+- how often the top-1 nearest neighbour of each query is the same under both
+  models (what memory search actually depends on)
+- single-text and batch latency for each backend
+
+Exits non-zero if the minimum cosine falls below --min-cosine.
+"""
+import argparse
+import json
+import sys
+import time
+
+import numpy as np
+
+from benchmarks.corpus import generate_memory_texts
+from utils.embedder_backends import EMBEDDER_ONNX_PATH, OnnxEmbedder
+
+
+def _latency(encode, texts, single_calls: int = 200):
+    clock = time.perf_counter
+    singles = []
+    for text in texts[:single_calls]:
+        t0 = clock()
+        encode([text])
+        singles.append(clock() - t0)
+    t0 = clock()
+    vectors = encode(texts)
+    batch_seconds = clock() - t0
+    return np.asarray(vectors, dtype=np.float32), {
+        "single_p50_ms": round(float(np.percentile(singles, 50)) * 1000, 2),
+        "single_p99_ms": round(float(np.percentile(singles, 99)) * 1000, 2),
+        "batch_texts_per_sec": round(len(texts) / batch_seconds) if batch_seconds else None,
+    }
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    return vectors / np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+
+
+def parity(reference: np.ndarray, candidate: np.ndarray, queries: int = 200) -> dict:
+    reference, candidate = _normalize(reference), _normalize(candidate)
+    cosine = np.einsum("ij,ij->i", reference, candidate)
+    # Each of the first `queries` texts searches the rest of the corpus
+    q = min(queries, len(reference) - 1)
+    ref_sims = reference[:q] @ reference[q:].T
+    cand_sims = candidate[:q] @ candidate[q:].T
+    top1 = float(np.mean(ref_sims.argmax(axis=1) == cand_sims.argmax(axis=1))) if q > 0 else 1.0
+    return {
+        "texts": len(cosine),
+        "cosine_mean": round(float(cosine.mean()), 5),
+        "cosine_p1": round(float(np.percentile(cosine, 1)), 5),
+        "cosine_min": round(float(cosine.min()), 5),
+        "top1_agreement": round(top1, 4),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default="all-MiniLM-L6-v2", help="SentenceTransformer reference model")
+    parser.add_argument("--onnx-path", default=EMBEDDER_ONNX_PATH)
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--min-cosine", type=float, default=0.98)
+    args = parser.parse_args(argv)
+
+    from sentence_transformers import SentenceTransformer
+
+    texts = generate_memory_texts(args.rows, args.seed)
+    reference_model = SentenceTransformer(args.model)
+    onnx_model = OnnxEmbedder(args.onnx_path)
+
+    reference, reference_latency = _latency(reference_model.encode, texts)
+    candidate, onnx_latency = _latency(onnx_model.encode, texts)
+    print(json.dumps({"sentence-transformers": reference_latency}))
+    print(json.dumps({"onnx-int8": onnx_latency}))
+
+    report = parity(reference, candidate)
+    print(json.dumps({"parity": report}))
+    return 0 if report["cosine_min"] >= args.min_cosine else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,140 @@
+"""Index RAM, disk footprint and recall@k of the memory embedding storage layouts.
+
+Usage (from the repo root):
+    python -m benchmarks.embedding_storage_bench
+    python -m benchmarks.embedding_storage_bench --memories 20000 --dims 192 128 64 --encode
+
+Layouts:
+- f32: full-dimension float32, what Chroma stores
+- f16: full-dimension float16, the numpy backend
+- pca<d> / truncate<d>: reduced float16 (utils.embedding_projection),
+  alone and with the full-precision re-rank of
+  MEMORY_RERANK_FACTOR x k candidates
+
+Recall@k is measured against exact float32 search. Index bytes cover only
+the searched matrix; Chroma's HNSW graph comes on top. Re-ranking also
+reads full vectors from the embedding cache's disk tier, reported as
+rerank_store_bytes.
+
+By default the vectors are synthetic, with a low-rank structure like
+sentence embeddings. --encode embeds benchmark-corpus memories with the
+configured embedder instead, which is the realistic case for PCA.
+"""
+import argparse
+import json
+import sys
+import time
+
+import numpy as np
+
+from utils.embedding_projection import MEMORY_RERANK_FACTOR, EmbeddingProjection
+
+DIM = 384
+
+
+def _unit(vectors: np.ndarray) -> np.ndarray:
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def synthetic_vectors(rng, rows: int, rank: int = 48, noise: float = 0.15) -> np.ndarray:
+    mixing = rng.standard_normal((rank, DIM)).astype(np.float32)
+    latent = rng.standard_normal((rows, rank)).astype(np.float32) * np.linspace(2.0, 0.2, rank, dtype=np.float32)
+    return _unit(latent @ mixing + noise * rng.standard_normal((rows, DIM)).astype(np.float32))
+
+
+def encoded_vectors(memories: int, queries: int, seed: int):
+    from benchmarks.corpus import generate_memory_texts, generate_rows
+    from memory import EMBEDDING_MODEL
+    from utils.embedder_backends import EMBEDDER_BACKEND, load_embedder
+    model = load_embedder(EMBEDDING_MODEL, EMBEDDER_BACKEND)
+    texts = generate_memory_texts(memories, seed=seed)
+    query_texts = [row["item_name"] for row in generate_rows(queries, seed=seed + 1)]
+    encode = lambda batch: np.asarray(model.encode(batch), dtype=np.float32)
+    docs = np.concatenate([encode(texts[i:i + 256]) for i in range(0, len(texts), 256)])
+    return _unit(docs), _unit(encode(query_texts))
+
+
+def _search(matrix: np.ndarray, queries: np.ndarray, k: int):
+    """Brute-force top-k by squared L2 (what the numpy backend does), with per-query latency."""
+    upcast = np.asarray(matrix, dtype=np.float32)
+    sq_norms = np.einsum("ij,ij->i", upcast, upcast)
+    found, latencies = [], []
+    for q in queries:
+        t0 = time.perf_counter()
+        # Upcast per query, as the numpy backend does block by block
+        distances = sq_norms - 2 * (np.asarray(matrix, dtype=np.float32) @ q)
+        top = np.argpartition(distances, k - 1)[:k]
+        found.append(top[np.argsort(distances[top])])
+        latencies.append(time.perf_counter() - t0)
+    return found, latencies
+
+
+def _rerank(full: np.ndarray, queries: np.ndarray, shortlists, k: int):
+    out, latencies = [], []
+    for q, rows in zip(queries, shortlists):
+        t0 = time.perf_counter()
+        distances = ((full[rows] - q) ** 2).sum(axis=1)
+        out.append(rows[np.argsort(distances, kind="stable")[:k]])
+        latencies.append(time.perf_counter() - t0)
+    return out, latencies
+
+
+def _recall(found, truth) -> float:
+    return float(np.mean([len(set(f.tolist()) & set(t.tolist())) / len(t) for f, t in zip(found, truth)]))
+
+
+def _report(name, matrix, found, truth, latencies, rerank_bytes=0) -> dict:
+    return {
+        "layout": name,
+        "dim": matrix.shape[1],
+        "dtype": str(matrix.dtype),
+        "index_bytes": int(matrix.nbytes),
+        "rerank_store_bytes": rerank_bytes,
+        f"recall@{len(truth[0])}": round(_recall(found, truth), 4),
+        "p50_ms": round(float(np.percentile(latencies, 50)) * 1000, 3),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--memories", type=int, default=10000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--dims", type=int, nargs="+", default=[192, 128, 64])
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--rerank-factor", type=int, default=MEMORY_RERANK_FACTOR)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--encode", action="store_true", help="embed corpus texts with the configured embedder")
+    args = parser.parse_args(argv)
+
+    if args.encode:
+        docs, queries = encoded_vectors(args.memories, args.queries, args.seed)
+    else:
+        rng = np.random.default_rng(args.seed)
+        both = synthetic_vectors(rng, args.memories + args.queries)
+        docs, queries = both[:args.memories], both[args.memories:]
+
+    k = args.k
+    truth, _ = _search(docs, queries, k)
+    found, latencies = _search(docs, queries, k)
+    print(json.dumps(_report("f32", docs, found, truth, latencies)))
+    f16 = docs.astype(np.float16)
+    found, latencies = _search(f16, queries, k)
+    print(json.dumps(_report("f16", f16, found, truth, latencies)))
+
+    pca = EmbeddingProjection.fit_pca(docs, min(len(docs), DIM))
+    for dim in args.dims:
+        for method in ("pca", "truncate"):
+            projection = EmbeddingProjection(dim, method, pca.mean, pca.components) if method == "pca" else EmbeddingProjection(dim)
+            reduced = projection(docs).astype(np.float16)
+            reduced_queries = projection(queries)
+            found, latencies = _search(reduced, reduced_queries, k)
+            print(json.dumps(_report(f"{method}{dim}", reduced, found, truth, latencies)))
+            shortlists, latencies = _search(reduced, reduced_queries, k * args.rerank_factor)
+            found, rerank_latencies = _rerank(docs, queries, shortlists, k)
+            latencies = np.add(latencies, rerank_latencies)
+            print(json.dumps(_report(f"{method}{dim}+rerank", reduced, found, truth, latencies, rerank_bytes=int(docs.nbytes))))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,92 @@
+"""How often the lexical index answers a nudge's memory query on its own.
+
+Usage (from the repo root):
+    python -m benchmarks.hybrid_search_bench
+    python -m benchmarks.hybrid_search_bench --users 200 --memories-per-user 100 --queries 5000 --encode
+
+Each synthetic user gets journal-style memories (benchmarks.corpus). Queries
+are the item names nudges send (the memory_recall stage queries pattern,
+spending intent or item name). Reported:
+- short_circuit_rate: the share of queries answered without the embedding
+  model
+- p50/p99 latency of the lexical lookup
+- with --encode, the same for encoding each query with the configured
+  embedder, i.e. the cost a short circuit saves
+"""
+import argparse
+import json
+import random
+import sys
+import time
+
+import numpy as np
+
+from benchmarks.corpus import generate_memory_texts, generate_rows
+from utils.lexical_index import LexicalIndex
+
+
+def _latency_stats(latencies) -> dict:
+    return {
+        "p50_ms": round(float(np.percentile(latencies, 50)) * 1000, 4),
+        "p99_ms": round(float(np.percentile(latencies, 99)) * 1000, 4),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--memories-per-user", type=int, default=50)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--encode", action="store_true", help="also time the embedding model per query")
+    args = parser.parse_args(argv)
+
+    texts = generate_memory_texts(args.users * args.memories_per_user, seed=args.seed)
+    memories = {
+        user_id: texts[user_id * args.memories_per_user:(user_id + 1) * args.memories_per_user]
+        for user_id in range(args.users)
+    }
+
+    def load(user_id):
+        docs = memories[user_id]
+        return [f"{user_id}-{i}" for i in range(len(docs))], docs, [{"ts": 0.0} for _ in docs]
+
+    index = LexicalIndex(load, max_users=args.users, ttl=float("inf"))
+    t0 = time.perf_counter()
+    for user_id in memories:
+        index.user(user_id)
+    build_seconds = time.perf_counter() - t0
+
+    rng = random.Random(args.seed)
+    queries = [(rng.randrange(args.users), row["item_name"]) for row in generate_rows(args.queries, seed=args.seed + 1)]
+    latencies, answered = [], 0
+    for user_id, query in queries:
+        t0 = time.perf_counter()
+        hits = index.confident_hits(user_id, query, 3)
+        latencies.append(time.perf_counter() - t0)
+        answered += hits is not None
+    print(json.dumps({"lexical": {
+        "users": args.users,
+        "memories_per_user": args.memories_per_user,
+        "build_ms_per_user": round(build_seconds / args.users * 1000, 3),
+        "queries": len(queries),
+        "short_circuit_rate": round(answered / len(queries), 4),
+        **_latency_stats(latencies),
+    }}))
+
+    if args.encode:
+        from memory import EMBEDDING_MODEL
+        from utils.embedder_backends import EMBEDDER_BACKEND, load_embedder
+        model = load_embedder(EMBEDDING_MODEL, EMBEDDER_BACKEND)
+        model.encode(["warm-up"])
+        latencies = []
+        for _, query in queries[:500]:
+            t0 = time.perf_counter()
+            model.encode([query])
+            latencies.append(time.perf_counter() - t0)
+        print(json.dumps({"encode": {"backend": EMBEDDER_BACKEND, **_latency_stats(latencies)}}))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,143 @@
+"""Benchmark and accuracy regression check for utils.impulse_engine.
+
+Usage (from the repo root):
+    python -m benchmarks.impulse_engine_bench                   # 1k, 100k rows
+    python -m benchmarks.impulse_engine_bench --rows 1000000
+    python -m benchmarks.impulse_engine_bench --update-golden   # after an intended behaviour change
+
+Each run reports throughput and p50/p99 per-call latency of
+scan_impulse_triggers with SCAN_CACHE bypassed (the engine itself) and with
+it starting empty (cache hits for repeated rows, hit rate included), plus
+rows/s of scan_impulse_batch. It then compares the flags produced for the
+golden corpus, scanned uncached, against benchmarks/golden/impulse_flags.json.
+Exits non-zero if any row disagrees, so an optimization can be gated on both
+speed and identical output.
+"""
+from contextlib import contextmanager
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+from benchmarks.corpus import generate_corpus
+from utils.impulse_engine import FLAG_ORDER, SCAN_CACHE, scan_impulse_batch, scan_impulse_triggers
+
+GOLDEN_PATH = os.path.join(os.path.dirname(__file__), "golden", "impulse_flags.json")
+GOLDEN_ROWS = 5000
+GOLDEN_SEED = 1337
+
+# Bit layout of an encoded result: one bit per flag in FLAG_ORDER, then "soft",
+# then total_triggers in the upper bits.
+_FLAG_BITS = {flag: 1 << i for i, flag in enumerate(FLAG_ORDER + ("soft",))}
+_TOTAL_SHIFT = len(_FLAG_BITS)
+
+
+def encode_result(result: dict) -> int:
+    code = 0
+    for flag in result["triggered_flags"]:
+        code |= _FLAG_BITS[flag]
+    return code | (result["total_triggers"] << _TOTAL_SHIFT)
+
+
+@contextmanager
+def scan_cache(enabled: bool):
+    """Run with SCAN_CACHE emptied, and bypassed unless enabled."""
+    maxsize = SCAN_CACHE.maxsize
+    SCAN_CACHE.clear()
+    if not enabled:
+        SCAN_CACHE.maxsize = 0
+    try:
+        yield
+    finally:
+        SCAN_CACHE.maxsize = maxsize
+        SCAN_CACHE.clear()
+
+
+def bench_single(corpus, cached: bool = False):
+    with scan_cache(cached):
+        report = _time_single(corpus)
+        if cached:
+            report["hit_rate"] = SCAN_CACHE.stats()["hit_rate"]
+    return report
+
+
+def _time_single(corpus):
+    latencies = np.empty(len(corpus), dtype=np.int64)
+    clock = time.perf_counter_ns
+    start = clock()
+    for i, row in enumerate(corpus):
+        t0 = clock()
+        scan_impulse_triggers(row)
+        latencies[i] = clock() - t0
+    elapsed = (clock() - start) / 1e9
+    return {
+        "rows": len(corpus),
+        "seconds": round(elapsed, 3),
+        "rows_per_sec": round(len(corpus) / elapsed) if elapsed else None,
+        "p50_us": round(float(np.percentile(latencies, 50)) / 1000, 2),
+        "p99_us": round(float(np.percentile(latencies, 99)) / 1000, 2),
+    }
+
+
+def bench_batch(corpus):
+    item_names = [row["item_name"] for row in corpus]
+    explanations = [row["explanation"] for row in corpus]
+    start = time.perf_counter()
+    scan_impulse_batch(item_names, explanations)
+    elapsed = time.perf_counter() - start
+    return {"rows": len(corpus), "seconds": round(elapsed, 3), "rows_per_sec": round(len(corpus) / elapsed) if elapsed else None}
+
+
+def golden_codes():
+    with scan_cache(False):
+        return [encode_result(scan_impulse_triggers(row)) for row in generate_corpus(GOLDEN_ROWS, GOLDEN_SEED)]
+
+
+def check_golden():
+    with open(GOLDEN_PATH, "r", encoding="utf-8") as f:
+        golden = json.load(f)
+    expected = golden["codes"]
+    actual = golden_codes()
+    mismatches = [i for i, (a, b) in enumerate(zip(actual, expected)) if a != b]
+    mismatches += list(range(min(len(actual), len(expected)), max(len(actual), len(expected))))
+    return {
+        "rows": len(expected),
+        "agreement": round(1 - len(mismatches) / max(len(expected), 1), 6),
+        "mismatched_rows": mismatches[:20],
+    }
+
+
+def update_golden():
+    os.makedirs(os.path.dirname(GOLDEN_PATH), exist_ok=True)
+    with open(GOLDEN_PATH, "w", encoding="utf-8") as f:
+        json.dump({"rows": GOLDEN_ROWS, "seed": GOLDEN_SEED, "flag_order": list(FLAG_ORDER) + ["soft"], "codes": golden_codes()}, f)
+    print(f"Wrote {GOLDEN_PATH}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000, 100000], help="corpus sizes to benchmark (e.g. 1000 100000 1000000)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--update-golden", action="store_true", help="rewrite the golden snapshot from the current engine")
+    args = parser.parse_args(argv)
+
+    if args.update_golden:
+        update_golden()
+        return 0
+
+    for rows in args.rows:
+        corpus = generate_corpus(rows, args.seed)
+        print(json.dumps({"scan_impulse_triggers": bench_single(corpus)}))
+        print(json.dumps({"scan_impulse_triggers_cached": bench_single(corpus, cached=True)}))
+        print(json.dumps({"scan_impulse_batch": bench_batch(corpus)}))
+
+    accuracy = check_golden()
+    print(json.dumps({"golden": accuracy}))
+    return 0 if accuracy["agreement"] == 1 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
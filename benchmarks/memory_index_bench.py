@@ -0,0 +1,147 @@
+"""Compare the per-user NumPy index (utils.vector_index) with the shared Chroma collection.
+
+Usage (from the repo root):
+    python -m benchmarks.memory_index_bench                          # 10, 1k, 100k memories per user
+    python -m benchmarks.memory_index_bench --sizes 10 1000 --queries 500 --background 50000
+
+For each size, one user gets that many random unit vectors (MiniLM's 384
+dimensions), and --background vectors from other users share the Chroma
+collection, as in production. Both backends then answer the same user-scoped
+top-k queries. Reported per backend: insert throughput, p50/p99 query
+latency, and recall@k against an exact float32 search. The NumPy index
+stores float16; Chroma's HNSW is approximate.
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from utils.vector_index import NumpyMemoryIndex
+
+DIM = 384
+CHROMA_MAX_BATCH = 5000
+
+
+def _unit_vectors(rng, rows: int) -> np.ndarray:
+    vectors = rng.standard_normal((rows, DIM)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def _exact_top_k(vectors: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    sims = queries @ vectors.T
+    return np.argsort(-sims, axis=1)[:, :k]
+
+
+def _recall(found, truth) -> float:
+    return float(np.mean([len(set(f) & set(t)) / len(t) for f, t in zip(found, truth)]))
+
+
+def _latency_stats(latencies) -> dict:
+    return {
+        "p50_ms": round(float(np.percentile(latencies, 50)) * 1000, 3),
+        "p99_ms": round(float(np.percentile(latencies, 99)) * 1000, 3),
+    }
+
+
+def bench_numpy(root: str, user_id: int, vectors: np.ndarray, queries: np.ndarray, k: int):
+    index = NumpyMemoryIndex(root)
+    ids = [f"user-{user_id}-memory-{i}" for i in range(len(vectors))]
+    metas = [{"user_id": user_id, "row": i} for i in range(len(vectors))]
+    t0 = time.perf_counter()
+    index.user(user_id).add(ids, [f"memory {i}" for i in range(len(vectors))], metas, vectors)
+    insert_seconds = time.perf_counter() - t0
+
+    user_index = NumpyMemoryIndex(root).user(user_id)  # cold open from disk, like a fresh process
+    latencies, found = [], []
+    for q in queries:
+        t0 = time.perf_counter()
+        hits = user_index.query(q, k)
+        latencies.append(time.perf_counter() - t0)
+        found.append([meta["row"] for _, meta, _ in hits])
+    return insert_seconds, latencies, found
+
+
+def bench_chroma(user_id: int, vectors: np.ndarray, background: np.ndarray, queries: np.ndarray, k: int):
+    import chromadb
+
+    client = chromadb.Client()
+    name = f"bench_{user_id}_{len(vectors)}"
+    collection = client.get_or_create_collection(name=name)
+    for start in range(0, len(background), CHROMA_MAX_BATCH):
+        chunk = background[start:start + CHROMA_MAX_BATCH]
+        collection.add(
+            ids=[f"bg-{start + i}" for i in range(len(chunk))],
+            embeddings=chunk.tolist(),
+            metadatas=[{"user_id": 1_000_000 + (start + i) % 1000} for i in range(len(chunk))],
+        )
+    t0 = time.perf_counter()
+    for start in range(0, len(vectors), CHROMA_MAX_BATCH):
+        chunk = vectors[start:start + CHROMA_MAX_BATCH]
+        collection.add(
+            ids=[f"user-{user_id}-memory-{start + i}" for i in range(len(chunk))],
+            embeddings=chunk.tolist(),
+            metadatas=[{"user_id": user_id, "row": start + i} for i in range(len(chunk))],
+            documents=[f"memory {start + i}" for i in range(len(chunk))],
+        )
+    insert_seconds = time.perf_counter() - t0
+
+    latencies, found = [], []
+    for q in queries:
+        t0 = time.perf_counter()
+        result = collection.query(query_embeddings=[q.tolist()], n_results=k, where={"user_id": user_id}, include=["metadatas", "distances"])
+        latencies.append(time.perf_counter() - t0)
+        found.append([meta["row"] for meta in result["metadatas"][0]])
+    client.delete_collection(name)
+    return insert_seconds, latencies, found
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 1000, 100000], help="memories for the benchmarked user")
+    parser.add_argument("--background", type=int, default=20000, help="other users' memories in the shared Chroma collection")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--skip-chroma", action="store_true")
+    args = parser.parse_args(argv)
+
+    rng = np.random.default_rng(args.seed)
+    background = _unit_vectors(rng, args.background)
+    for size in args.sizes:
+        vectors = _unit_vectors(rng, size)
+        queries = _unit_vectors(rng, args.queries)
+        k = min(args.k, size)
+        truth = _exact_top_k(vectors, queries, k)
+
+        root = tempfile.mkdtemp(prefix="memory_index_bench_")
+        try:
+            insert_seconds, latencies, found = bench_numpy(root, 1, vectors, queries, k)
+        finally:
+            shutil.rmtree(root, ignore_errors=True)
+        print(json.dumps({"numpy": {
+            "memories": size,
+            "inserts_per_sec": round(size / insert_seconds) if insert_seconds else None,
+            **_latency_stats(latencies),
+            f"recall@{k}": round(_recall(found, truth), 4),
+        }}))
+
+        if args.skip_chroma:
+            continue
+        insert_seconds, latencies, found = bench_chroma(1, vectors, background, queries, k)
+        print(json.dumps({"chroma": {
+            "memories": size,
+            "background": args.background,
+            "inserts_per_sec": round(size / insert_seconds) if insert_seconds else None,
+            **_latency_stats(latencies),
+            f"recall@{k}": round(_recall(found, truth), 4),
+        }}))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,100 @@
+"""Per-call cost of memory hot-path logging, before and after utils.memory_logging.
+
+Usage (from the repo root):
+    python -m benchmarks.memory_logging_bench
+    python -m benchmarks.memory_logging_bench --calls 20000 --sample-rates 0.01 0.1 1.0
+
+Modes:
+- legacy: what store_memory did per call, i.e. print() of the memory, its
+  384-float embedding and metadata to stdout (redirected to /dev/null here)
+  plus a synchronous logging.info of the same text to a file
+- structured@<rate>: log_event with the text digested and the vector scrubbed to
+  its shape, sampled at <rate>, through the queue to a rotating file
+
+Reported per mode: mean and p99 microseconds on the calling thread, and
+bytes written per call.
+"""
+import argparse
+import contextlib
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from utils import memory_logging
+
+DIM = 384
+
+
+def _stats(latencies, path: str, calls: int) -> dict:
+    memory_logging.shutdown()
+    size = sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+    return {
+        "mean_us": round(float(np.mean(latencies)) * 1e6, 2),
+        "p99_us": round(float(np.percentile(latencies, 99)) * 1e6, 2),
+        "bytes_per_call": round(size / calls, 1),
+    }
+
+
+def run_legacy(calls: int, embedding, memory: str, workdir: str) -> dict:
+    legacy = logging.getLogger("memory_bench_legacy")
+    legacy.propagate = False
+    handler = logging.FileHandler(os.path.join(workdir, "legacy.log"), encoding="utf-8")
+    handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+    legacy.addHandler(handler)
+    legacy.setLevel(logging.INFO)
+    latencies = []
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        for i in range(calls):
+            t0 = time.perf_counter()
+            log_msg = f"\n📦 Storing memory: {memory}\n🧠 Embedding: {embedding}\nUser ID: {i}\nTimestamp: None\n"
+            print(log_msg)
+            legacy.info(log_msg)
+            print("🔍 Stored memory in ChromaDB:")
+            print("Content:", memory)
+            legacy.info(f"Stored memory in ChromaDB - Content: {memory}, User ID: {i}, Collection Name: finivo_memory")
+            latencies.append(time.perf_counter() - t0)
+    legacy.removeHandler(handler)
+    handler.close()
+    return _stats(latencies, workdir, calls)
+
+
+def run_structured(calls: int, embedding, memory: str, workdir: str, rate: float) -> dict:
+    memory_logging.MEMORY_LOG_SAMPLE_RATE = rate
+    memory_logging.configure(path=os.path.join(workdir, "memory.log"))
+    latencies = []
+    for i in range(calls):
+        t0 = time.perf_counter()
+        memory_logging.log_event("memory.stored", user_id=i, memory_id=f"bench-{i}", dim=len(embedding[0]),
+                                 texts={"memory": memory})
+        latencies.append(time.perf_counter() - t0)
+    stats = _stats(latencies, workdir, calls)
+    stats["dropped"] = memory_logging.log_stats()["dropped"]
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=5000)
+    parser.add_argument("--sample-rates", type=float, nargs="+", default=[memory_logging.MEMORY_LOG_SAMPLE_RATE, 1.0])
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args(argv)
+
+    rng = np.random.default_rng(args.seed)
+    embedding = rng.standard_normal((1, DIM)).astype(np.float32).tolist()
+    memory = "Spent way too much on a designer bag again, I promised myself I would save for the trip instead."
+
+    with tempfile.TemporaryDirectory() as workdir:
+        print(json.dumps({"legacy": run_legacy(args.calls, embedding, memory, workdir)}))
+    for rate in args.sample_rates:
+        with tempfile.TemporaryDirectory() as workdir:
+            print(json.dumps({f"structured@{rate:g}": run_structured(args.calls, embedding, memory, workdir, rate)}))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
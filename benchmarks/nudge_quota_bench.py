@@ -0,0 +1,87 @@
+"""Monthly quota check latency: COUNT(*) over nudge_logs vs. the nudge_quota_usage counter.
+
+Usage (from the repo root):
+    python -m benchmarks.nudge_quota_bench
+    python -m benchmarks.nudge_quota_bench --users 200 --nudges-per-user 500 --checks 5000
+
+Builds a throwaway SQLite database with --nudges-per-user logs for each user
+this month, then times per check:
+- count: the old SELECT COUNT(*) ... WHERE user_id=? AND timestamp >= month start
+- counter: services.nudge_quota.nudge_count with the in-process cache off
+- cached: the same with the default cache TTL
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import models
+from database import Base
+from services import nudge_quota
+
+
+def _timed(fn, checks) -> dict:
+    latencies = []
+    for user_id in checks:
+        t0 = time.perf_counter()
+        fn(user_id)
+        latencies.append(time.perf_counter() - t0)
+    return {
+        "p50_us": round(float(np.percentile(latencies, 50)) * 1e6, 1),
+        "p99_us": round(float(np.percentile(latencies, 99)) * 1e6, 1),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--nudges-per-user", type=int, default=200)
+    parser.add_argument("--checks", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        engine = create_engine(f"sqlite:///{os.path.join(workdir, 'quota.db')}")
+        Base.metadata.create_all(engine)
+        db = sessionmaker(bind=engine, autoflush=False)()
+        now = datetime.utcnow()
+        start = datetime(now.year, now.month, 1)
+        span = max(1, int((now - start).total_seconds()))
+        rng = random.Random(args.seed)
+        db.add_all(models.User(id=user_id, email=f"bench{user_id}@example.com") for user_id in range(1, args.users + 1))
+        db.add_all(
+            models.NudgeLog(user_id=user_id, nudge_message="bench", timestamp=start + timedelta(seconds=rng.randrange(span)))
+            for user_id in range(1, args.users + 1)
+            for _ in range(args.nudges_per_user)
+        )
+        db.commit()
+
+        checks = [rng.randint(1, args.users) for _ in range(args.checks)]
+        count = lambda user_id: db.query(models.NudgeLog).filter(
+            models.NudgeLog.user_id == user_id, models.NudgeLog.timestamp >= start
+        ).count()
+        results = {"logs": args.users * args.nudges_per_user, "count": _timed(count, checks)}
+
+        nudge_quota.QUOTA_CACHE.ttl = 0
+        for user_id in range(1, args.users + 1):
+            nudge_quota.nudge_count(user_id, db)  # backfill every counter row first
+        results["counter"] = _timed(lambda user_id: nudge_quota.nudge_count(user_id, db), checks)
+        nudge_quota.QUOTA_CACHE.ttl = nudge_quota.NUDGE_QUOTA_CACHE_TTL
+        nudge_quota.QUOTA_CACHE.clear()
+        results["cached"] = _timed(lambda user_id: nudge_quota.nudge_count(user_id, db), checks)
+        db.close()
+        engine.dispose()
+    print(json.dumps(results))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
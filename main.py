@@ -5,16 +5,22 @@ from fastapi import FastAPI, Depends
 from sqlalchemy.orm import Session
 from database import SessionLocal, engine
 import models, schemas
+import utils.feature_store  # noqa: F401 - registers the SpendingLog/NudgeLog feature listeners
+import services.nudge_quota  # noqa: F401 - registers the NudgeLog quota counter listener
 import routers.user as user
 import routers.spending as spending
 import routers.nudge_memory_logic as nudge_memory_logic
+import routers.memory as memory_routes
 import routers.report as report
 import routers.plaid as plaid
 import routers.voice as voice
+import routers.impulse_rules as impulse_rules
 
 # Use the safe nudge inspection router implementation
 import routers.nudge_inspection as nudge_inspection
 from fastapi.staticfiles import StaticFiles
+from fastapi.responses import JSONResponse
+import logging
 import threading
 import time
 
@@ -29,8 +35,10 @@ app.mount("/static", StaticFiles(directory="static"), name="static")
 app.include_router(user.router)
 app.include_router(spending.router)
 app.include_router(nudge_memory_logic.router, prefix="/memory")
+app.include_router(memory_routes.router)
 app.include_router(nudge_inspection.router)
 app.include_router(report.router)
+app.include_router(impulse_rules.router)
 app.include_router(plaid.router, prefix="/plaid")
 from routers.voice import router as voice_router
 app.include_router(voice_router)
@@ -60,6 +68,29 @@ def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
     db.refresh(db_user)
     return db_user
 
+# Set MEMORY_WARMUP=true to load the embedding model and Chroma collection at startup
+MEMORY_WARMUP = os.getenv("MEMORY_WARMUP", "false").lower() in ("1", "true", "yes")
+
+
+@app.get("/ready")
+def readiness():
+    """Readiness probe: 503 until the memory warm-up has finished (when MEMORY_WARMUP is on)."""
+    import memory
+    state = dict(memory.warmup_state)
+    if memory.is_warm():
+        state["status"] = "warm"
+    state["warmup_enabled"] = MEMORY_WARMUP
+    if MEMORY_WARMUP and state["status"] != "warm":
+        return JSONResponse(status_code=503, content=state)
+    return state
+
+
+def start_memory_warmup_background_task():
+    import memory
+    thread = threading.Thread(target=memory.warm_up, name="memory-warmup", daemon=True)
+    thread.start()
+
+
 def cleanup_old_audio_files(directory="static/audio", max_age_hours=24):
     now = time.time()
     cutoff = now - max_age_hours * 3600
@@ -83,4 +114,33 @@ def start_audio_cleanup_background_task():
     thread = threading.Thread(target=run_cleanup, daemon=True)
     thread.start()
 
+# Drains the memory outbox into the vector store; disable on workers that should only serve requests
+MEMORY_INDEXER_ENABLED = os.getenv("MEMORY_INDEXER_ENABLED", "true").lower() in ("1", "true", "yes")
+
+# Set MEMORY_COMPACTION_INTERVAL_HOURS to expire and merge memories on a schedule (0 = off)
+MEMORY_COMPACTION_INTERVAL_HOURS = float(os.getenv("MEMORY_COMPACTION_INTERVAL_HOURS", "0"))
+
+
+def start_memory_compaction_background_task():
+    def run_compaction_loop():
+        from services.memory_compaction import run_compaction
+        while True:
+            time.sleep(MEMORY_COMPACTION_INTERVAL_HOURS * 3600)
+            db = SessionLocal()
+            try:
+                run_compaction(db)
+            except Exception:
+                logging.exception("Scheduled memory compaction failed")
+            finally:
+                db.close()
+    thread = threading.Thread(target=run_compaction_loop, name="memory-compaction", daemon=True)
+    thread.start()
+
 start_audio_cleanup_background_task()
+if MEMORY_INDEXER_ENABLED:
+    from services.memory_indexer import MEMORY_INDEXER
+    MEMORY_INDEXER.start()
+if MEMORY_COMPACTION_INTERVAL_HOURS > 0:
+    start_memory_compaction_background_task()
+if MEMORY_WARMUP:
+    start_memory_warmup_background_task()
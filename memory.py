@@ -4,152 +4,593 @@ ChromaDB integration for user memory storage and semantic search.
 Provides functions to store, update, and search user memory documents with embeddings.
 """
 import os
+import hashlib
 import logging
+import threading
 from fastapi import APIRouter, HTTPException, Body
 from pydantic import BaseModel
 
+from utils.memory_ids import new_memory_id
+from utils.memory_logging import log_event
+
 # Lazy-loaded heavy ML/DB clients
 chroma_client = None
 embedder = None
 collection = None
+embedding_cache = None
+embedding_batcher = None
+vector_index = None
+collection_router = None
+lexical_index = None
+projection = None
+full_vectors = None
+
+EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+# "chroma" (shared finivo_memory collection) or "numpy" (per-user memmapped matrices, utils.vector_index)
+MEMORY_INDEX_BACKEND = os.getenv("MEMORY_INDEX_BACKEND", "chroma").lower()
+
+_init_lock = threading.Lock()
 
 
 def _init_chroma():
     """Lazily initialize ChromaDB client and the embedding model.
 
     Import heavy libraries only when needed to reduce cold-start time for
-    endpoints that don't use embeddings.
+    endpoints that don't use embeddings. Set CHROMA_PATH to persist the
+    collection on disk; otherwise an in-memory client is used.
     """
-    global chroma_client, embedder, collection
     if chroma_client is not None and embedder is not None and collection is not None:
         return
+    with _init_lock:
+        if chroma_client is None or embedder is None or collection is None:
+            _load_clients()
+
+
+def _load_clients():
+    global chroma_client, embedder, collection, embedding_cache, embedding_batcher, vector_index, collection_router, lexical_index, projection, full_vectors
     try:
         import chromadb
         from chromadb.config import Settings  # noqa: F401 - keep if needed by chromadb internals
-        from sentence_transformers import SentenceTransformer
+        from utils.embedder_backends import EMBEDDER_BACKEND, cache_model_name, load_embedder
 
         # Initialize client and model
-        try:
-            chroma_client = chromadb.Client()
-        except Exception:
-            chroma_client = chromadb.Client()
-
-        collection = chroma_client.get_or_create_collection(name="finivo_memory")
-        embedder = SentenceTransformer("all-MiniLM-L6-v2")
-        # Setup logging for memory operations
-        logging.basicConfig(filename='memory_debug.log', level=logging.INFO, format='%(asctime)s %(message)s')
+        chroma_path = os.getenv("CHROMA_PATH")
+        chroma_client = chromadb.PersistentClient(path=chroma_path) if chroma_path else chromadb.Client()
+
+        # Memories are routed to per-user (or per-bucket) collections; "collection" is the legacy global one
+        from services.chroma_service import GLOBAL_COLLECTION, CollectionRouter
+        collection_router = CollectionRouter(chroma_client)
+        collection = chroma_client.get_or_create_collection(name=GLOBAL_COLLECTION)
+        if collection_router.sharding != "global" and collection.count():
+            log_event("memory.legacy_collection", level=logging.WARNING, sampled=False, collection=GLOBAL_COLLECTION,
+                      memories=collection.count(), hint="run scripts/migrate_memory_collections.py")
+        if MEMORY_INDEX_BACKEND == "numpy" and vector_index is None:
+            from utils.vector_index import NumpyMemoryIndex
+            vector_index = NumpyMemoryIndex()
+        from utils.lexical_index import MEMORY_LEXICAL_SEARCH, LexicalIndex
+        if MEMORY_LEXICAL_SEARCH and lexical_index is None:
+            lexical_index = LexicalIndex(_user_documents)
+        from utils.embedding_projection import load_projection
+        if projection is None:
+            projection = load_projection()
+        if projection is not None and full_vectors is None:
+            # Full-precision copies for the re-rank, since the search index only holds projected vectors
+            import numpy as np
+            from utils.embedding_projection import MEMORY_FULL_VECTOR_DIR
+            from utils.vector_index import NumpyMemoryIndex
+            full_vectors = NumpyMemoryIndex(MEMORY_FULL_VECTOR_DIR, dtype=np.float32)
+        model = load_embedder(EMBEDDING_MODEL, EMBEDDER_BACKEND)
+        if embedding_cache is None:
+            from utils.embedding_cache import EmbeddingCache
+            embedding_cache = EmbeddingCache(cache_model_name(EMBEDDING_MODEL, EMBEDDER_BACKEND))
+        if embedding_batcher is None:
+            from services.embedding_batcher import EmbeddingBatcher
+            embedding_batcher = EmbeddingBatcher(model.encode)
+        # Published last: the unlocked check in _init_chroma treats a set embedder as "ready"
+        embedder = model
     except Exception as e:
-        logging.exception('ChromaDB/Embedder init failed: %s', e)
+        log_event("memory.init_failed", level=logging.ERROR, sampled=False, exc_info=True, error=str(e))
         raise
 
+
+# Warm-up state reported by GET /ready: "cold", "warming", "warm" or "failed"
+warmup_state = {"status": "cold", "started_at": None, "finished_at": None, "duration_ms": None, "error": None}
+
+
+def warm_up():
+    """Load the model, run a dummy encode and open the collection so the first real request is fast."""
+    import time
+    from datetime import datetime
+    warmup_state.update(status="warming", started_at=datetime.utcnow().isoformat(), error=None)
+    start = time.perf_counter()
+    try:
+        _init_chroma()
+        # Straight to the model: the point is to pay first-inference cost, not to fill the cache
+        embedder.encode(["warm-up"])
+        collection.count()
+    except Exception as e:
+        log_event("memory.warmup_failed", level=logging.ERROR, sampled=False, exc_info=True, error=str(e))
+        warmup_state.update(status="failed", error=str(e))
+        return False
+    finally:
+        warmup_state.update(finished_at=datetime.utcnow().isoformat(), duration_ms=round((time.perf_counter() - start) * 1000, 1))
+    warmup_state["status"] = "warm"
+    return True
+
+
+def is_warm() -> bool:
+    return chroma_client is not None and embedder is not None and collection is not None
+
+
+def embed(texts) -> list:
+    """Embed texts through the embedding cache; uncached texts join the shared micro-batch."""
+    return embedding_cache.encode(list(texts), embedding_batcher.encode).tolist()
+
+
+def embedding_cache_stats() -> dict:
+    return embedding_cache.stats() if embedding_cache is not None else {}
+
+
+def embedding_batch_stats() -> dict:
+    return embedding_batcher.stats() if embedding_batcher is not None else {}
+
+
+def lexical_search_stats() -> dict:
+    return lexical_index.stats() if lexical_index is not None else {}
+
+
+def content_hash(memory: str) -> str:
+    """SHA-256 of the memory text with whitespace collapsed and case folded."""
+    normalized = " ".join(memory.split()).casefold()
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+def epoch_seconds(timestamp):
+    """ISO string or datetime -> UTC epoch seconds (naive values are UTC, as stored). None if unparseable."""
+    from datetime import datetime, timezone
+    if isinstance(timestamp, str):
+        try:
+            timestamp = datetime.fromisoformat(timestamp)
+        except ValueError:
+            return None
+    if not isinstance(timestamp, datetime):
+        return None
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+    return timestamp.timestamp()
+
+
+def _memory_metadata(user_id: int, timestamp: str, digest: str) -> dict:
+    # "ts" (epoch seconds) is what queries filter on; "timestamp" stays for readers of the ISO string.
+    # "indexed_at" (write time) lets services.chroma_service find writes that raced a collection rebuild.
+    import time
+    return {"user_id": user_id, "timestamp": timestamp, "ts": epoch_seconds(timestamp) or 0.0, "content_hash": digest, "indexed_at": time.time()}
+
+
+def _find_memory_by_hash(user_id: int, digest: str):
+    """Return the id of the user's memory with this content hash, or None (single indexed lookup)."""
+    if vector_index is not None:
+        return vector_index.user(user_id).id_for_hash(digest)
+    target = collection_router.find(user_id)
+    if target is None:
+        return None
+    existing = target.get(
+        where={"$and": [{"user_id": user_id}, {"content_hash": digest}]},
+        limit=1,
+        include=[]
+    )
+    ids = existing.get("ids") if existing else None
+    return ids[0] if ids else None
+
+
+def _known_hashes(user_id: int, digests) -> dict:
+    """Which of these content hashes the user already has, as {hash: memory id} (one lookup for the whole batch)."""
+    if vector_index is not None:
+        return vector_index.user(user_id).ids_for_hashes(digests)
+    target = collection_router.find(user_id)
+    if target is None:
+        return {}
+    existing = target.get(
+        where={"$and": [{"user_id": user_id}, {"content_hash": {"$in": list(digests)}}]},
+        include=["metadatas"]
+    )
+    known = {}
+    for mem_id, meta in zip(existing.get("ids") or [], existing.get("metadatas") or []):
+        if meta and meta.get("content_hash"):
+            known.setdefault(meta["content_hash"], mem_id)
+    return known
+
+
+def _add_memories(user_id: int, ids, documents, metadatas, embeddings):
+    if full_vectors is not None:
+        # Written first, so every indexed memory can be re-ranked without re-encoding
+        full_vectors.user(user_id).add(ids, [""] * len(ids), [{"content_hash": meta["content_hash"]} for meta in metadatas], embeddings)
+    if projection is not None:
+        embeddings = projection(embeddings).tolist()
+    if vector_index is not None:
+        vector_index.user(user_id).add(ids, documents, metadatas, embeddings)
+    else:
+        collection_router.for_user(user_id).add(
+            documents=documents,
+            metadatas=metadatas,
+            ids=list(ids),
+            embeddings=embeddings
+        )
+    if lexical_index is not None:
+        lexical_index.add(user_id, ids, documents, metadatas)
+
+
+def indexed_ids(user_id: int, ids) -> set:
+    """The memory ids among these that the user's index already holds."""
+    ids = list(ids)
+    if not ids:
+        return set()
+    _init_chroma()
+    if vector_index is not None:
+        return vector_index.user(user_id).known_ids(ids)
+    target = collection_router.find(user_id)
+    if target is None:
+        return set()
+    return set(target.get(ids=ids, include=[]).get("ids") or [])
+
+
+def _user_documents(user_id: int):
+    """(ids, documents, metadatas) of every memory a user has, without embeddings (builds the lexical index)."""
+    if vector_index is not None:
+        return vector_index.user(user_id).rows()
+    target = collection_router.find(user_id)
+    if target is None:
+        return [], [], []
+    page = target.get(where={"user_id": user_id}, include=["documents", "metadatas"])
+    return page.get("ids") or [], page.get("documents") or [], page.get("metadatas") or []
+
+
+def _query_memories(query_embedding, n_results: int, user_id=None, since=None, max_distance=None):
+    """Nearest memories as (document, metadata, distance), closest first; all users when user_id is None.
+
+    since (epoch seconds) filters on the "ts" metadata inside the query, so
+    older memories never take one of the n_results slots. With reduced-dimension
+    storage the index only shortlists candidates; distances come from the
+    full-precision re-rank.
+    """
+    if projection is None:
+        return _search_index(query_embedding, n_results, user_id, since, max_distance)
+    from utils.embedding_projection import MEMORY_RERANK_FACTOR
+    candidates = _search_index(projection(query_embedding).tolist(), n_results * MEMORY_RERANK_FACTOR, user_id, since, None)
+    return _rerank(query_embedding, candidates, n_results, max_distance)
+
+
+def _full_vectors(candidates):
+    """Stored full-precision vectors of the candidates (by user and content hash); re-encodes only those missing."""
+    import numpy as np
+    wanted = {}
+    for _, meta, _ in candidates:
+        if meta.get("content_hash"):
+            wanted.setdefault(meta.get("user_id"), set()).add(meta["content_hash"])
+    stored = {}
+    for user_id, digests in wanted.items():
+        if user_id is not None:
+            found = full_vectors.user(user_id).vectors_for_hashes(digests)
+            stored.update(((user_id, digest), vector) for digest, vector in found.items())
+    vectors = [stored.get((meta.get("user_id"), meta.get("content_hash"))) for _, meta, _ in candidates]
+    missing = [i for i, vector in enumerate(vectors) if vector is None]
+    if missing:
+        # Memories stored before full vectors were kept (until scripts/reembed_memories.py runs)
+        for i, vector in zip(missing, embed([candidates[i][0] for i in missing])):
+            vectors[i] = vector
+    return np.asarray(vectors, dtype=np.float32)
+
+
+def _rerank(query_embedding, candidates, n_results: int, max_distance=None):
+    """Exact squared L2 on the stored full-precision vectors for the shortlisted candidates."""
+    import numpy as np
+    if not candidates:
+        return []
+    full = _full_vectors(candidates)
+    distances = ((full - np.asarray(query_embedding[0], dtype=np.float32)) ** 2).sum(axis=1)
+    order = np.argsort(distances, kind="stable")
+    hits = [(candidates[i][0], candidates[i][1], float(distances[i])) for i in order]
+    return [hit for hit in hits if max_distance is None or hit[2] <= max_distance][:n_results]
+
+
+def _search_index(query_embedding, n_results: int, user_id=None, since=None, max_distance=None):
+    if vector_index is not None:
+        if user_id is None:
+            return vector_index.query_all(query_embedding[0], n_results)
+        return vector_index.user(user_id).query(query_embedding[0], n_results, since=since, max_distance=max_distance)
+    clauses = []
+    if user_id is not None:
+        # Still needed with bucket sharding, where users share a collection
+        clauses.append({"user_id": user_id})
+    if since is not None:
+        clauses.append({"ts": {"$gte": since}})
+    kwargs = {}
+    if clauses:
+        kwargs["where"] = clauses[0] if len(clauses) == 1 else {"$and": clauses}
+    if user_id is None:
+        targets = collection_router.all_collections()
+    else:
+        target = collection_router.find(user_id)
+        targets = [target] if target is not None else []  # a user without memories has no collection
+    hits = []
+    for target in targets:
+        results = target.query(
+            query_embeddings=query_embedding,
+            n_results=n_results,
+            include=["metadatas", "documents", "distances"],
+            **kwargs
+        )
+        hits.extend(zip(results["documents"][0], results["metadatas"][0], results["distances"][0]))
+    if len(targets) > 1:
+        hits = sorted(hits, key=lambda hit: hit[2])[:n_results]
+    # Hits come back closest first, so the distance cut-off only trims the tail
+    return [hit for hit in hits if max_distance is None or hit[2] <= max_distance]
+
+
+def _backfill_metadata(fix, batch_size: int) -> int:
+    """Page through every memory collection and update each memory whose metadata fix(doc, meta) changed."""
+    _init_chroma()
+    updated = 0
+    for target in collection_router.all_collections():
+        offset = 0
+        while True:
+            page = target.get(include=["documents", "metadatas"], limit=batch_size, offset=offset)
+            ids = page.get("ids") or []
+            if not ids:
+                break
+            todo_ids, todo_meta = [], []
+            for mem_id, doc, meta in zip(ids, page["documents"], page["metadatas"]):
+                meta = dict(meta or {})
+                if fix(doc, meta):
+                    todo_ids.append(mem_id)
+                    todo_meta.append(meta)
+            if todo_ids:
+                target.update(ids=todo_ids, metadatas=todo_meta)
+                updated += len(todo_ids)
+            offset += len(ids)
+    return updated
+
+
+def backfill_content_hashes(batch_size: int = 500) -> int:
+    """Add content_hash metadata to memories stored before hash-based dedup. Returns rows updated."""
+    def fix(doc, meta):
+        if "content_hash" in meta or doc is None:
+            return False
+        meta["content_hash"] = content_hash(doc)
+        return True
+    return _backfill_metadata(fix, batch_size)
+
+
+def backfill_epoch_timestamps(batch_size: int = 500) -> int:
+    """Add numeric "ts" metadata to memories stored with only the ISO timestamp. Returns rows updated.
+
+    Memories without a timestamp get the backfill time (they were always
+    treated as recent); unparseable ones get 0 (they were always skipped).
+    """
+    import time
+    now = time.time()
+
+    def fix(doc, meta):
+        if "ts" in meta:
+            return False
+        raw = meta.get("timestamp")
+        meta["ts"] = (epoch_seconds(raw) or 0.0) if raw else now
+        return True
+    return _backfill_metadata(fix, batch_size)
+
+def user_memories(user_id: int) -> list:
+    """Every memory a user has, as (id, document, metadata, embedding) with float32 embeddings."""
+    import numpy as np
+    _init_chroma()
+    if vector_index is not None:
+        ids, documents, metadatas, vectors = vector_index.user(user_id).rows(include_vectors=True)
+        return list(zip(ids, documents, metadatas, vectors))
+    target = collection_router.find(user_id)
+    if target is None:
+        return []  # not created just to find it empty
+    page = target.get(
+        where={"user_id": user_id},
+        include=["documents", "metadatas", "embeddings"]
+    )
+    embeddings = page.get("embeddings")
+    if embeddings is None or not len(embeddings):
+        return []
+    vectors = np.asarray(embeddings, dtype=np.float32)
+    return list(zip(page["ids"], page["documents"], page["metadatas"], vectors))
+
+
+def delete_memories(user_id: int, ids) -> int:
+    """Remove memories by id from the user's index. Returns how many were removed."""
+    ids = list(ids)
+    if not ids:
+        return 0
+    _init_chroma()
+    if lexical_index is not None:
+        lexical_index.remove(user_id, ids)
+    if full_vectors is not None:
+        full_vectors.user(user_id).remove(ids)
+    if vector_index is not None:
+        # Rewrites the user's files, so the numpy backend never fragments
+        return vector_index.user(user_id).remove(ids)
+    from services.chroma_service import record_deletes
+    target = collection_router.find(user_id)
+    if target is None:
+        return 0
+    target.delete(ids=ids)
+    record_deletes(target, len(ids))
+    return len(ids)
+
+
+def clear_user_memories(user_id: int) -> int:
+    """Remove every memory a user has from the vector store (before re-embedding). Returns the number removed."""
+    _init_chroma()
+    if vector_index is not None:
+        return delete_memories(user_id, vector_index.user(user_id).rows()[0])
+    target = collection_router.find(user_id)
+    if target is None:
+        return 0
+    ids = target.get(where={"user_id": user_id}, include=[]).get("ids") or []
+    removed = delete_memories(user_id, ids)
+    if not target.count():
+        # Dropped rather than left empty: a collection keeps its embedding dimension, and a new model may differ
+        collection_router.drop(target.name)
+    return removed
+
+
 # --- Embedding-powered ChromaDB in-memory client setup and memory functions ---
 
-def store_memory(user_id: int, memory: str, timestamp=None):
-    """Store a memory string for a user in ChromaDB (initializes chroma/embedder lazily)."""
+def store_memory(user_id: int, memory: str, timestamp=None, memory_id: str = None):
+    """Store a memory string for a user in ChromaDB (initializes chroma/embedder lazily).
+
+    memory_id is the ID allocated for the user_memory row (a new one is
+    allocated if omitted). Returns the ID the memory is stored under, which
+    is the existing memory's ID when the content is a duplicate.
+    """
     try:
         _init_chroma()
     except Exception:
         raise RuntimeError("Chroma/embedding initialization failed")
 
-    print("store_memory called")
     from datetime import datetime
     if timestamp is None:
         timestamp = datetime.utcnow().isoformat()
-    # Check for duplicate: exact same content for the same user
-    existing = collection.get(
-        where={"user_id": user_id},
-        include=["documents"]
-    )
-    if existing and "documents" in existing:
-        user_docs = existing["documents"]
-        if user_docs and any(doc == memory for doc in user_docs):
-            print(f"Duplicate memory detected for user {user_id}, skipping add.")
-            logging.info(f"Duplicate memory detected for user {user_id}, skipping add: {memory}")
-            return  # Skip adding duplicate
-    embedding = embedder.encode([memory]).tolist()  # List of lists
-    log_msg = f"\n📦 Storing memory: {memory}\n🧠 Embedding: {embedding}\nUser ID: {user_id}\nTimestamp: {timestamp}\n"
-    print(log_msg)
-    logging.info(log_msg)
-    collection.add(
-        documents=[memory],
-        metadatas=[{"user_id": user_id, "timestamp": timestamp}],
-        ids=[f"user-{user_id}-memory-{collection.count() + 1}"],
-        embeddings=embedding
-    )
-    # After adding memory to ChromaDB
-    from uuid import uuid4
+    elif isinstance(timestamp, datetime):
+        timestamp = timestamp.isoformat()
+    # Check for duplicate content for the same user via its content hash
+    digest = content_hash(memory)
+    existing_id = _find_memory_by_hash(user_id, digest)
+    if existing_id:
+        log_event("memory.duplicate", user_id=user_id, memory_id=existing_id, content_hash=digest[:12])
+        return existing_id  # Skip adding duplicate
+    embedding = embed([memory])  # List of lists
+    memory_id = memory_id or new_memory_id()
+    _add_memories(user_id, [memory_id], [memory], [_memory_metadata(user_id, timestamp, digest)], embedding)
+    log_event("memory.stored", user_id=user_id, memory_id=memory_id, content_hash=digest[:12], chars=len(memory), timestamp=timestamp)
+    return memory_id
+
+
+def store_memories(user_id: int, items):
+    """Store many memories for a user with one embedding batch and one Chroma write.
+
+    items are strings or dicts with "content" and optional "timestamp" and
+    "id" (a preallocated memory ID). Duplicates within the batch and memories
+    the user already has (by content hash) are skipped. Returns
+    {"stored": [...], "skipped": [...], "ids": [...], "skipped_ids": [...]}:
+    stored and skipped contents, the memory ID of each stored content, and
+    the ID of the memory each skipped content duplicates.
+    """
+    try:
+        _init_chroma()
+    except Exception:
+        raise RuntimeError("Chroma/embedding initialization failed")
+
     from datetime import datetime
-    print("🔍 Stored memory in ChromaDB:")
-    print("Content:", memory)
-    print("Timestamp:", datetime.now().isoformat())
-    print("User ID:", user_id)
-    print("Collection Name:", "finivo_memory")
-    print("Memory ID:", str(uuid4()))
-    logging.info(f"Stored memory in ChromaDB - Content: {memory}, Timestamp: {datetime.now().isoformat()}, User ID: {user_id}, Collection Name: finivo_memory")
+    default_timestamp = datetime.utcnow().isoformat()
+    batch, skipped, assigned = [], [], {}
+    for item in items:
+        if isinstance(item, str):
+            text, timestamp, memory_id = item, None, None
+        else:
+            text, timestamp, memory_id = item["content"], item.get("timestamp"), item.get("id")
+        if isinstance(timestamp, datetime):
+            timestamp = timestamp.isoformat()
+        digest = content_hash(text)
+        if digest in assigned:
+            skipped.append((text, digest))
+            continue
+        assigned[digest] = memory_id or new_memory_id()
+        batch.append((text, timestamp or default_timestamp, digest))
+
+    # One lookup for every hash in the batch instead of one per memory
+    known = _known_hashes(user_id, list(assigned)) if batch else {}
+    new = []
+    for text, timestamp, digest in batch:
+        if digest in known:
+            skipped.append((text, digest))
+        else:
+            new.append((text, timestamp, digest))
+    assigned.update(known)
+    result = {
+        "stored": [text for text, _, _ in new],
+        "skipped": [text for text, _ in skipped],
+        "ids": [assigned[digest] for _, _, digest in new],
+        "skipped_ids": [assigned[digest] for _, digest in skipped],
+    }
+    if not new:
+        return result
+
+    embeddings = embed(result["stored"])
+    _add_memories(user_id, result["ids"], result["stored"], [_memory_metadata(user_id, ts, digest) for _, ts, digest in new], embeddings)
+    log_event("memory.stored_batch", user_id=user_id, stored=len(new), skipped=len(skipped))
+    return result
 
 
-def search_memory(query: str, n_results: int = 5):
-    """Perform semantic search over user memory documents and return unique results only."""
+def search_memory(query: str, n_results: int = 5, user_id: int = None):
+    """Perform semantic search over user memory documents and return unique results only.
+
+    Pass user_id to search only that user's memories (one collection). Without
+    it every memory collection is searched, which is only meant for admin/debug use.
+    User-scoped searches are hybrid: a short query whose terms all appear in
+    some memories is answered from the lexical index alone, otherwise BM25 and
+    vector rankings are fused.
+    """
     try:
         _init_chroma()
     except Exception:
         raise RuntimeError("Chroma/embedding initialization failed")
 
-    print("search_memory called")
-    query_embedding = embedder.encode([query]).tolist()
-    print("🔍 Query embedding:", query_embedding)
-    logging.info(f"🔍 Query embedding: {query_embedding}")
-    results = collection.query(
-        query_embeddings=query_embedding,
-        n_results=n_results * 2  # Fetch more to ensure uniqueness
-    )
+    hybrid = lexical_index is not None and user_id is not None
+    if hybrid:
+        hits = lexical_index.confident_hits(user_id, query, n_results)
+        if hits is not None:
+            log_event("memory.search", user_id=user_id, path="lexical", results=len(hits), texts={"query": query})
+            return [[doc for doc, _, _ in hits]]
+    query_embedding = embed([query])
+    results = _query_memories(query_embedding, n_results * 2, user_id=user_id)  # Fetch more to ensure uniqueness
+    ranked = [doc for doc, _, _ in results]
+    if hybrid:
+        from utils.lexical_index import reciprocal_rank_fusion
+        lexical = [doc for doc, _, _ in lexical_index.ranked(user_id, query, n_results * 2)]
+        fused = reciprocal_rank_fusion(ranked, lexical)
+        ranked = sorted(fused, key=fused.get, reverse=True)
     # Deduplicate results by content
     seen = set()
     unique_docs = []
-    for doc in results["documents"][0]:
+    for doc in ranked:
         if doc not in seen:
             unique_docs.append(doc)
             seen.add(doc)
         if len(unique_docs) >= n_results:
             break
-    print("📄 Unique search result:", unique_docs)
-    logging.info(f"📄 Unique search result: {unique_docs}")
+    log_event("memory.search", user_id=user_id, path="hybrid" if hybrid else "vector", results=len(unique_docs), texts={"query": query})
     return [unique_docs]
 
 
 def semantic_search_recent_memories(user_id: int, query: str, min_similarity: float = 0.8, days: int = 30, n_results: int = 5):
+    """Recent memories similar to query as (document, similarity), most relevant first.
+
+    similarity is always the vector similarity (1 - distance), and hits below
+    min_similarity are dropped, so there is no lexical-only short-circuit
+    here. With the lexical index enabled, the vector hits are re-ranked by
+    fusing in their BM25 rank.
+    """
     try:
         _init_chroma()
     except Exception:
         raise RuntimeError("Chroma/embedding initialization failed")
 
-    from datetime import datetime, timedelta
-    query_embedding = embedder.encode([query]).tolist()
-    # Calculate cutoff date
-    cutoff = datetime.utcnow() - timedelta(days=days)
-    # Query for recent memories only
-    results = collection.query(
-        query_embeddings=query_embedding,
-        n_results=n_results * 2,
-        where={"user_id": user_id},
-        include=["metadatas", "documents", "distances"]
-    )
-    filtered = []
-    for doc, meta, dist in zip(results["documents"][0], results["metadatas"][0], results["distances"][0]):
-        mem_time = meta.get("timestamp")
-        if mem_time:
-            try:
-                mem_time = datetime.fromisoformat(mem_time)
-            except Exception:
-                continue
-            if mem_time < cutoff:
-                continue
-        similarity = 1 - dist
-        if similarity >= min_similarity:
-            filtered.append((doc, similarity))
-        if len(filtered) >= n_results:
-            break
-    return filtered
+    import time
+    since = time.time() - days * 86400
+    query_embedding = embed([query])
+    # Time window and similarity floor are applied inside the query: one call, exact top-k
+    fetch = n_results * 2 if lexical_index is not None else n_results
+    results = _query_memories(query_embedding, fetch, user_id=user_id, since=since, max_distance=1 - min_similarity)
+    if lexical_index is not None and len(results) > 1:
+        from utils.lexical_index import reciprocal_rank_fusion
+        lexical = [doc for doc, _, _ in lexical_index.ranked(user_id, query, fetch, since=since)]
+        fused = reciprocal_rank_fusion([doc for doc, _, _ in results], lexical)
+        results = sorted(results, key=lambda hit: fused[hit[0]], reverse=True)
+    return [(doc, 1 - dist) for doc, _, dist in results[:n_results]]
 
 router = APIRouter()
 
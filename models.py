@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime, ForeignKey, Text
+from sqlalchemy import Column, Integer, String, Float, Boolean, Date, DateTime, ForeignKey, Text
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from database import Base
@@ -47,6 +47,24 @@ class UserMemory(Base):
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     content = Column(String, nullable=False)
     timestamp = Column(DateTime, default=datetime.utcnow)
+    # ULID of the matching vector-store entry (utils.memory_ids); duplicates share the original's ID
+    memory_uid = Column(String(26), nullable=True, index=True)
+
+
+class MemoryOutbox(Base):
+    """Memories waiting to be embedded and indexed; written in the same transaction as the UserMemory row."""
+    __tablename__ = "memory_outbox"
+
+    id = Column(Integer, primary_key=True, index=True)
+    memory_uid = Column(String(26), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    content = Column(String, nullable=False)
+    timestamp = Column(DateTime, nullable=True)
+    attempts = Column(Integer, nullable=False, default=0)
+    last_error = Column(Text, nullable=True)
+    # services.memory_indexer picks up rows whose next_attempt_at has passed (backoff after failures)
+    next_attempt_at = Column(DateTime, nullable=False, default=datetime.utcnow, index=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
 
 
 class NudgeLog(Base):
@@ -62,6 +80,66 @@ class NudgeLog(Base):
     source = Column(String, default="text")
 
 
+class NudgeQuotaUsage(Base):
+    """Nudges logged per user and calendar month, maintained by services.nudge_quota on NudgeLog inserts."""
+    __tablename__ = "nudge_quota_usage"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    # "YYYY-MM" (UTC), the period plan nudge_limit applies to
+    period = Column(String(7), primary_key=True)
+    nudge_count = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class UserBehaviorFeatures(Base):
+    """Running per-user counters maintained by utils.feature_store on log inserts."""
+    __tablename__ = "user_behavior_features"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    purchase_count = Column(Integer, nullable=False, default=0)
+    regret_count = Column(Integer, nullable=False, default=0)
+    last_purchase_at = Column(DateTime, nullable=True)
+    nudge_count = Column(Integer, nullable=False, default=0)
+    last_nudge_at = Column(DateTime, nullable=True)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class UserDailySpend(Base):
+    """Per-user, per-day spend totals backing the rolling 7/30-day windows."""
+    __tablename__ = "user_daily_spend"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    amount = Column(Float, nullable=False, default=0.0)
+
+
+class ImpulseRuleSet(Base):
+    __tablename__ = "impulse_rule_sets"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, unique=True, index=True)
+    # bumped on every edit; compiled matchers are cached per (user_id, version)
+    version = Column(Integer, nullable=False, default=1)
+    min_triggers = Column(Integer, nullable=True)
+    soft_trigger_threshold = Column(Integer, nullable=True)
+    recent_purchase_days = Column(Integer, nullable=True)
+    amount_threshold = Column(Float, nullable=True)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    keywords = relationship("ImpulseRuleKeyword", back_populates="rule_set", cascade="all, delete-orphan")
+
+
+class ImpulseRuleKeyword(Base):
+    __tablename__ = "impulse_rule_keywords"
+
+    id = Column(Integer, primary_key=True, index=True)
+    rule_set_id = Column(Integer, ForeignKey("impulse_rule_sets.id"), nullable=False, index=True)
+    category = Column(String, nullable=False)  # one of utils.impulse_engine.RULE_CATEGORIES
+    keyword = Column(String, nullable=False)
+
+    rule_set = relationship("ImpulseRuleSet", back_populates="keywords")
+
+
 class UserPlaidToken(Base):
     __tablename__ = "user_plaid_tokens"
 
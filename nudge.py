@@ -1,5 +1,5 @@
 import os
-from memory import embedder, collection
+import memory
 import openai
 
 openai.api_key = os.getenv("OPENAI_API_KEY")
@@ -9,21 +9,17 @@ def smart_nudge(user_id: int, spending_intent: str, plan: str = "free") -> str:
     Analyze user's past vector memories and return a smart nudge message based on similarity/context and plan.
     Uses OpenAI for plan-based tone and decision logic.
     """
-    # Embed the spending intent
-    embedding = embedder.encode([spending_intent]).tolist()
-    # Search for similar memories for this user
-    results = collection.query(
-        query_embeddings=embedding,
-        n_results=3,
-        where={"user_id": user_id}
-    )
+    # Embed the spending intent (cached) and search for similar memories for this user
+    memory._init_chroma()
+    embedding = memory.embed([spending_intent])
+    # Goes through memory's query path so either index backend and reduced-dimension storage work
+    results = memory._query_memories(embedding, 3, user_id=user_id)
     # Prepare context for OpenAI prompt
     similar_regret = None
-    if results.get("distances") and results["distances"][0]:
-        for idx, dist in enumerate(results["distances"][0]):
-            if dist < (1 - 0.75):  # Similarity > 0.75
-                similar_regret = results["documents"][0][idx]
-                break
+    for doc, _, dist in results:
+        if dist < (1 - 0.75):  # Similarity > 0.75
+            similar_regret = doc
+            break
     # Dynamic prompt based on plan
     from utils.plan_features import sanitize_plan
     plan = sanitize_plan(plan)
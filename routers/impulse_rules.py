@@ -0,0 +1,41 @@
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+
+from database import get_db
+from models import User, ImpulseRuleSet
+import schemas
+from utils.plan_features import get_plan_features, sanitize_plan
+from utils.impulse_rules import rule_set_keywords, save_user_rules, THRESHOLD_FIELDS
+
+router = APIRouter(prefix="/rules", tags=["Impulse Rules"])
+
+
+def _rules_response(user_id: int, rule_set: ImpulseRuleSet) -> dict:
+    response = {"user_id": user_id, "version": rule_set.version, "keywords": rule_set_keywords(rule_set)}
+    for field in THRESHOLD_FIELDS:
+        response[field] = getattr(rule_set, field)
+    return response
+
+
+@router.get("/{user_id}", response_model=schemas.ImpulseRulesResponse)
+def get_impulse_rules(user_id: int, db: Session = Depends(get_db)):
+    rule_set = db.query(ImpulseRuleSet).filter(ImpulseRuleSet.user_id == user_id).first()
+    if not rule_set:
+        return {"user_id": user_id, "version": 0, "keywords": {}}
+    return _rules_response(user_id, rule_set)
+
+
+@router.put("/{user_id}", response_model=schemas.ImpulseRulesResponse)
+def update_impulse_rules(user_id: int, req: schemas.ImpulseRulesUpdate, db: Session = Depends(get_db)):
+    user = db.query(User).filter(User.id == user_id).first()
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found.")
+    features = get_plan_features(sanitize_plan(user.plan))
+    if not features.get("custom_rules"):
+        raise HTTPException(status_code=403, detail="Custom rules are not available for your current plan.")
+    thresholds = {field: getattr(req, field) for field in THRESHOLD_FIELDS}
+    try:
+        rule_set = save_user_rules(user_id, db, req.keywords, thresholds)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return _rules_response(user_id, rule_set)
@@ -28,16 +28,91 @@ def get_db():
         db.close()
 
 
+def _inspection_allowed() -> bool:
+    debug = os.getenv("DEBUG", "false").lower() in ("1", "true", "yes")
+    admin = os.getenv("ADMIN_MODE", "false").lower() in ("1", "true", "yes")
+    return debug or admin
+
+
+@router.get("/impulse-cache")
+def get_impulse_cache_stats():
+    """
+    Returns hit/miss counters for the impulse scan cache.
+    Accessible only when DEBUG or ADMIN_MODE is enabled.
+    """
+    if not _inspection_allowed():
+        raise HTTPException(status_code=403, detail="Not authorized")
+    from utils.impulse_engine import impulse_cache_stats
+    return impulse_cache_stats()
+
+
+@router.get("/embedding-cache")
+def get_embedding_cache_stats():
+    """
+    Returns hit/miss counters for the text embedding cache.
+    Accessible only when DEBUG or ADMIN_MODE is enabled.
+    """
+    if not _inspection_allowed():
+        raise HTTPException(status_code=403, detail="Not authorized")
+    from memory import embedding_cache_stats
+    return embedding_cache_stats()
+
+
+@router.get("/embedding-batcher")
+def get_embedding_batcher_stats():
+    """
+    Returns batch counts and sizes for the micro-batching embedding worker.
+    Accessible only when DEBUG or ADMIN_MODE is enabled.
+    """
+    if not _inspection_allowed():
+        raise HTTPException(status_code=403, detail="Not authorized")
+    from memory import embedding_batch_stats
+    return embedding_batch_stats()
+
+
+@router.get("/memory-lexical")
+def get_memory_lexical_stats():
+    """
+    Returns how many memory searches the lexical index answered without the embedding model.
+    Accessible only when DEBUG or ADMIN_MODE is enabled.
+    """
+    if not _inspection_allowed():
+        raise HTTPException(status_code=403, detail="Not authorized")
+    from memory import lexical_search_stats
+    return lexical_search_stats()
+
+
+@router.get("/memory-indexer")
+def get_memory_indexer_stats(db: Session = Depends(get_db)):
+    """
+    Returns memory outbox backlog (pending and dead-letter rows) and indexer counters.
+    Accessible only when DEBUG or ADMIN_MODE is enabled.
+    """
+    if not _inspection_allowed():
+        raise HTTPException(status_code=403, detail="Not authorized")
+    from services.memory_indexer import MEMORY_INDEXER
+    return MEMORY_INDEXER.stats(db)
+
+
+@router.get("/pipeline-stats")
+def get_nudge_pipeline_stats():
+    """
+    Returns per-stage call counts and timings for the nudge pipeline.
+    Accessible only when DEBUG or ADMIN_MODE is enabled.
+    """
+    if not _inspection_allowed():
+        raise HTTPException(status_code=403, detail="Not authorized")
+    from services.nudge_pipeline import pipeline_stats
+    return pipeline_stats()
+
+
 @router.get("/earn/{user_id}")
 def get_earn_sessions(user_id: int, limit: int = 5, db: Session = Depends(get_db)):
     """
     Returns the last few E.A.R.N. persuasion sessions for a given user.
     Accessible only when DEBUG or ADMIN_MODE is enabled.
     """
-    debug = os.getenv("DEBUG", "false").lower() in ("1", "true", "yes")
-    admin = os.getenv("ADMIN_MODE", "false").lower() in ("1", "true", "yes")
-
-    if not (debug or admin):
+    if not _inspection_allowed():
         raise HTTPException(status_code=403, detail="Not authorized")
 
     try:
@@ -87,3 +162,27 @@ def get_earn_sessions(user_id: int, limit: int = 5, db: Session = Depends(get_db
         "total": len(result),
         "entries": result,
     }
+
+
+@router.get("/memory-logging")
+def get_memory_logging_stats():
+    """
+    Returns the memory log sample rate and how many records the log queue holds or has dropped.
+    Accessible only when DEBUG or ADMIN_MODE is enabled.
+    """
+    if not _inspection_allowed():
+        raise HTTPException(status_code=403, detail="Not authorized")
+    from utils.memory_logging import log_stats
+    return log_stats()
+
+
+@router.get("/quota-cache")
+def get_quota_cache_stats():
+    """
+    Returns hit/miss counters for the monthly nudge quota cache.
+    Accessible only when DEBUG or ADMIN_MODE is enabled.
+    """
+    if not _inspection_allowed():
+        raise HTTPException(status_code=403, detail="Not authorized")
+    from services.nudge_quota import quota_cache_stats
+    return quota_cache_stats()
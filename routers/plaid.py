@@ -14,7 +14,9 @@ from plaid.model.transactions_get_request import TransactionsGetRequest
 from datetime import datetime, timedelta
 from typing import Optional, List, Dict
 from pydantic import BaseModel
-from utils.impulse_engine import scan_impulse_triggers
+from utils.impulse_engine import scan_impulse_batch, DEFAULT_MATCHER
+from utils.impulse_rules import get_user_matcher
+from services.nudge_pipeline import log_nudge
 from sqlalchemy.orm import Session
 from database import SessionLocal
 import models
@@ -186,55 +188,47 @@ def import_transactions(payload: TransactionsPayload = None):
             pass
         imported = 0
         impulsive_count = 0
-        for txn in transactions:
+
+        # Scan every transaction in one vectorized pass (engine + Plaid heuristics)
+        try:
+            matcher = get_user_matcher(user_id, db)
+        except Exception:
+            # Rule tables may be missing on this DB bind; fall back to built-in rules
+            matcher = DEFAULT_MATCHER
+        scan = scan_impulse_batch(
+            item_names=[txn.get("name") or txn.get("merchant_name") or "" for txn in transactions],
+            explanations=[txn.get("name", "") for txn in transactions],
+            amounts=[txn.get("amount") for txn in transactions],
+            categories=[txn.get("category") for txn in transactions],
+            merchants=[txn.get("merchant_name") for txn in transactions],
+            matcher=matcher,
+        )
+        impulsive_flags = scan["is_impulsive"].tolist()
+
+        # Look up already-imported transaction ids with one query instead of one per row
+        known_ids = [txn.get("transaction_id") or txn.get("id") for txn in transactions]
+        if not all(known_ids):
+            # Rows without an id fall back to "txn-<n>", so check those names too
+            known_ids += [f"txn-{i}" for i in range(len(transactions))]
+        known_ids = [t for t in known_ids if t]
+        try:
+            existing_ids = {
+                row[0] for row in db.query(models.SpendingLog.comment).filter(models.SpendingLog.comment.in_(known_ids)).all()
+            } if known_ids else set()
+        except Exception:
+            # If the spending_logs table is missing in this DB session, skip duplicate check
+            existing_ids = set()
+
+        for txn, is_impulsive in zip(transactions, impulsive_flags):
             # normalize fields from Plaid-like txn dict
             item_name = txn.get("name") or txn.get("merchant_name")
             amount = txn.get("amount")
             txn_id = txn.get("transaction_id") or txn.get("id") or f"txn-{imported}"
 
-            # Avoid duplicates
-            try:
-                exists = db.query(models.SpendingLog).filter_by(comment=txn_id).first()
-            except Exception:
-                # If the spending_logs table is missing in this DB session, skip duplicate check
-                exists = None
-            if exists:
+            # Avoid duplicates (against the DB and within this batch)
+            if txn_id in existing_ids:
                 continue
-
-            # Detect impulsivity using the impulse engine
-            try:
-                scan_input = {
-                    "item_name": item_name or "",
-                    "mood": None,
-                    "pattern": None,
-                    "urgency": None,
-                    "last_purchase_days": None,
-                    "situation": None,
-                    "explanation": txn.get("name", "")
-                }
-                impulse_result = scan_impulse_triggers(scan_input)
-                is_impulsive = impulse_result.get("is_impulsive", False)
-            except Exception:
-                is_impulsive = False
-
-            # Heuristic boosts: very large amounts or explicit luxury categories/merchants
-            try:
-                if amount and float(amount) > 1000:
-                    is_impulsive = True
-            except Exception:
-                pass
-            try:
-                cats = txn.get("category") or []
-                if any("luxury" in str(c).lower() for c in cats):
-                    is_impulsive = True
-            except Exception:
-                pass
-            try:
-                merchant = (txn.get("merchant_name") or "").lower()
-                if "rolex" in merchant or "gucci" in merchant or "louis" in merchant:
-                    is_impulsive = True
-            except Exception:
-                pass
+            existing_ids.add(txn_id)
 
             # Create spending log
             log = models.SpendingLog(
@@ -250,8 +244,7 @@ def import_transactions(payload: TransactionsPayload = None):
             # If impulsive, create a NudgeLog entry
             if is_impulsive:
                 try:
-                    n = models.NudgeLog(user_id=user_id, spending_intent=str(txn.get("name", "")), nudge_message="impulse_detected", plan=None, source="plaid_auto")
-                    db.add(n)
+                    log_nudge(db, user_id, str(txn.get("name", "")), "impulse_detected", None, "plaid_auto", commit=False)
                     impulsive_count += 1
                 except Exception:
                     pass
@@ -2,7 +2,9 @@ from fastapi import APIRouter, HTTPException, Depends
 from sqlalchemy.orm import Session
 from database import SessionLocal
 import models, schemas
-from utils.impulse_engine import scan_impulse_triggers
+from utils.impulse_engine import scan_impulse_triggers, DEFAULT_MATCHER
+from utils.impulse_rules import get_user_matcher
+from services.nudge_pipeline import log_nudge
 
 router = APIRouter(prefix="/spending", tags=["Spending"])
 
@@ -15,7 +17,11 @@ def get_db():
 
 @router.post("/", response_model=schemas.SpendingLogOut)
 def create_spending_log(spending: schemas.SpendingLogCreate, db: Session = Depends(get_db)):
-    # Run impulse detection using available fields
+    # Run impulse detection using available fields (and the user's custom rules, if any)
+    try:
+        matcher = get_user_matcher(spending.user_id, db)
+    except Exception:
+        matcher = DEFAULT_MATCHER
     try:
         scan_input = {
             "item_name": spending.item_name,
@@ -26,7 +32,7 @@ def create_spending_log(spending: schemas.SpendingLogCreate, db: Session = Depen
             "situation": getattr(spending, "situation", None),
             "explanation": getattr(spending, "explanation", None),
         }
-        impulse_result = scan_impulse_triggers(scan_input)
+        impulse_result = scan_impulse_triggers(scan_input, matcher=matcher)
         is_impulsive = impulse_result.get("is_impulsive", False)
     except Exception:
         is_impulsive = False
@@ -48,9 +54,7 @@ def create_spending_log(spending: schemas.SpendingLogCreate, db: Session = Depen
     # If impulsive, create a NudgeLog entry for inspection/history
     if is_impulsive:
         try:
-            n = models.NudgeLog(user_id=spending.user_id, spending_intent=spending.item_name, nudge_message="impulse_detected", plan=None, source="spending_route")
-            db.add(n)
-            db.commit()
+            log_nudge(db, spending.user_id, spending.item_name, "impulse_detected", None, "spending_route")
         except Exception:
             pass
     return new_log
@@ -1,10 +1,11 @@
 from fastapi import APIRouter, Depends
-from .nudge_memory_logic import nudge_user, NudgeRequest, get_db
+from .nudge_memory_logic import NudgeRequest, get_db
+from services.nudge_pipeline import run_nudge
 
 router = APIRouter(prefix="/voice", tags=["Voice"])
 
 @router.post("/nudge/{user_id}")
-async def voice_nudge(user_id: int, request: NudgeRequest, db=Depends(get_db)):
+def voice_nudge(user_id: int, request: NudgeRequest, db=Depends(get_db)):
     """Handle voice nudge requests."""
-    # Pass source='voice' to nudge_user and await the coroutine
-    return await nudge_user(user_id, request, db, source="voice")
\ No newline at end of file
+    # Same pipeline as text nudges, tagged as voice in the nudge log
+    return run_nudge(user_id, request.dict(), db, source="voice")
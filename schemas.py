@@ -1,6 +1,7 @@
-from pydantic import BaseModel
-from typing import Optional, List
+from pydantic import BaseModel, Field, field_validator
+from typing import Optional, List, Dict
 from datetime import datetime, date
+from enum import Enum
 
 
 class NudgeRequest(BaseModel):
@@ -74,11 +75,22 @@ class UserMemoryResponse(BaseModel):
     user_id: int
     content: str
     timestamp: datetime
+    memory_uid: Optional[str] = None
 
     class Config:
         from_attributes = True
 
 
+class UserMemoryBulkCreate(BaseModel):
+    items: List[UserMemoryCreate]
+
+
+class UserMemoryBulkResponse(BaseModel):
+    stored: int
+    skipped: int
+    memories: List[UserMemoryResponse]
+
+
 class NudgeLogCreate(BaseModel):
     user_id: int
     spending_intent: Optional[str] = None
@@ -88,6 +100,12 @@ class NudgeLogCreate(BaseModel):
     source: str = "text"
 
 
+class NudgeSource(str, Enum):
+    """Channels a client may report on POST /memory/nudge; server-side paths set their own source."""
+    text = "text"
+    whatsapp = "whatsapp"
+
+
 class NudgeLogResponse(BaseModel):
     id: int
     user_id: int
@@ -103,3 +121,30 @@ class NudgeLogResponse(BaseModel):
 
 class PlanUpdateRequest(BaseModel):
     plan: str
+
+
+class ImpulseRulesUpdate(BaseModel):
+    # category ("essential", "I", "M", "U", "S", "E") -> extra keywords
+    keywords: Dict[str, List[str]] = {}
+    min_triggers: Optional[int] = Field(None, ge=0)
+    soft_trigger_threshold: Optional[int] = Field(None, ge=0)
+    recent_purchase_days: Optional[int] = Field(None, ge=0)
+    amount_threshold: Optional[float] = Field(None, ge=0)
+
+    @field_validator("keywords")
+    @classmethod
+    def keywords_not_empty(cls, keywords: Dict[str, List[str]]) -> Dict[str, List[str]]:
+        for category, kws in keywords.items():
+            if not any(kw and kw.strip() for kw in kws):
+                raise ValueError(f"Keyword list for category {category} is empty")
+        return keywords
+
+
+class ImpulseRulesResponse(BaseModel):
+    user_id: int
+    version: int
+    keywords: Dict[str, List[str]] = {}
+    min_triggers: Optional[int] = None
+    soft_trigger_threshold: Optional[int] = None
+    recent_purchase_days: Optional[int] = None
+    amount_threshold: Optional[float] = None
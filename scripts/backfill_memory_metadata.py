@@ -0,0 +1,24 @@
+"""One-off migration for memories stored in Chroma before the current metadata layout.
+
+Adds content_hash (hash-based dedup) and ts (epoch seconds used by the
+recency filter in semantic_search_recent_memories) where they are missing.
+Safe to re-run; rows that already have both are left untouched.
+
+Usage:
+    CHROMA_PATH=chroma_storage python scripts/backfill_memory_metadata.py
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import memory
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+    print(f"content_hash added to {memory.backfill_content_hashes(args.batch_size)} memories")
+    print(f"ts added to {memory.backfill_epoch_timestamps(args.batch_size)} memories")
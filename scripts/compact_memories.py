@@ -0,0 +1,33 @@
+"""Run one memory retention/compaction pass (see services/memory_compaction.py).
+
+Expires memories past their plan's retention, merges near-duplicates,
+rebuilds fragmented Chroma collections and prints the before/after report.
+
+Usage:
+    CHROMA_PATH=chroma_storage python scripts/compact_memories.py --dry-run
+    CHROMA_PATH=chroma_storage python scripts/compact_memories.py --user 42 --similarity 0.97
+"""
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import SessionLocal
+from services.memory_compaction import MEMORY_COMPACTION_REBUILD_RATIO, MEMORY_COMPACTION_SIMILARITY, run_compaction
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--user", type=int, action="append", dest="user_ids", help="only these users (repeatable)")
+    parser.add_argument("--similarity", type=float, default=MEMORY_COMPACTION_SIMILARITY)
+    parser.add_argument("--rebuild-ratio", type=float, default=MEMORY_COMPACTION_REBUILD_RATIO)
+    parser.add_argument("--dry-run", action="store_true", help="report what would be removed without deleting")
+    args = parser.parse_args()
+    db = SessionLocal()
+    try:
+        report = run_compaction(db, args.user_ids, similarity=args.similarity, rebuild_ratio=args.rebuild_ratio, dry_run=args.dry_run)
+    finally:
+        db.close()
+    print(json.dumps(report, indent=2))
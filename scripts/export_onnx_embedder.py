@@ -0,0 +1,72 @@
+"""Export the sentence embedder to ONNX and quantize it to int8 for EMBEDDER_BACKEND=onnx.
+
+Usage (needs torch, transformers, onnx and onnxruntime; run once, not in the serving image):
+    python scripts/export_onnx_embedder.py
+    python scripts/export_onnx_embedder.py --model sentence-transformers/all-MiniLM-L6-v2 --out models/all-MiniLM-L6-v2-onnx-int8
+
+Writes model_fp32.onnx, model_int8.onnx (dynamic int8 weight quantization)
+and tokenizer.json into --out.
+"""
+import argparse
+import inspect
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.embedder_backends import EMBEDDER_ONNX_PATH, ONNX_MODEL_FILE
+
+
+def export(model_name: str, out_dir: str, opset: int = 14):
+    import torch
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    from transformers import AutoModel, AutoTokenizer
+
+    os.makedirs(out_dir, exist_ok=True)
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModel.from_pretrained(model_name)
+    model.eval()
+
+    sample = tokenizer(["warm-up sentence for export"], return_tensors="pt")
+    input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+
+    class Encoder(torch.nn.Module):
+        # Fixed positional signature and a single output, independent of the transformers version
+        def __init__(self, base):
+            super().__init__()
+            self.base = base
+
+        def forward(self, *inputs):
+            return self.base(**dict(zip(input_names, inputs))).last_hidden_state
+
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+    fp32_path = os.path.join(out_dir, "model_fp32.onnx")
+    # Newer torch defaults to the dynamo exporter (needs onnxscript); the TorchScript one is enough here
+    legacy = {"dynamo": False} if "dynamo" in inspect.signature(torch.onnx.export).parameters else {}
+    with torch.no_grad():
+        torch.onnx.export(
+            Encoder(model),
+            tuple(sample[name] for name in input_names),
+            fp32_path,
+            input_names=input_names,
+            output_names=["last_hidden_state"],
+            dynamic_axes=dynamic_axes,
+            opset_version=opset,
+            **legacy,
+        )
+
+    int8_path = os.path.join(out_dir, ONNX_MODEL_FILE)
+    quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+    tokenizer.save_pretrained(out_dir)
+    for path in (fp32_path, int8_path):
+        print(f"{path}: {os.path.getsize(path) / 1e6:.1f} MB")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default="sentence-transformers/all-MiniLM-L6-v2")
+    parser.add_argument("--out", default=EMBEDDER_ONNX_PATH)
+    parser.add_argument("--opset", type=int, default=14)
+    args = parser.parse_args()
+    export(args.model, args.out, args.opset)
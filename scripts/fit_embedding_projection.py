@@ -0,0 +1,57 @@
+"""Fit the PCA projection used when MEMORY_EMBEDDING_DIM is set (see utils/embedding_projection.py).
+
+Encodes a sample of stored memories (user_memory.content) with the
+configured embedder and saves every principal component to MEMORY_PCA_PATH,
+so MEMORY_EMBEDDING_DIM can be changed later without refitting. Re-embed
+afterwards (scripts/reembed_memories.py) so stored vectors use the new
+projection.
+
+Usage:
+    python scripts/fit_embedding_projection.py --sample 20000
+    python scripts/fit_embedding_projection.py --synthetic 5000   # no database: benchmark corpus texts
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.embedding_projection import MEMORY_PCA_PATH, EmbeddingProjection
+
+
+def _texts(sample: int, synthetic: int):
+    if synthetic:
+        from benchmarks.corpus import generate_memory_texts
+        return generate_memory_texts(synthetic)
+    from sqlalchemy import func
+    from database import SessionLocal
+    from models import UserMemory
+    db = SessionLocal()
+    try:
+        rows = db.query(UserMemory.content).order_by(func.random()).limit(sample).all()
+    finally:
+        db.close()
+    return [content for (content,) in rows]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sample", type=int, default=20000, help="stored memories to fit on")
+    parser.add_argument("--synthetic", type=int, default=0, help="fit on this many synthetic memories instead")
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--out", default=MEMORY_PCA_PATH)
+    args = parser.parse_args()
+
+    from memory import EMBEDDING_MODEL
+    from utils.embedder_backends import EMBEDDER_BACKEND, load_embedder
+    import numpy as np
+
+    texts = list(dict.fromkeys(_texts(args.sample, args.synthetic)))
+    model = load_embedder(EMBEDDING_MODEL, EMBEDDER_BACKEND)
+    vectors = np.concatenate([
+        np.asarray(model.encode(texts[start:start + args.batch_size]), dtype=np.float32)
+        for start in range(0, len(texts), args.batch_size)
+    ])
+    projection = EmbeddingProjection.fit_pca(vectors, min(len(vectors), vectors.shape[1]))
+    projection.save(args.out)
+    print(f"Fitted {projection.dim} components on {len(vectors)} memories -> {args.out}")
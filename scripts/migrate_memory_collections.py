@@ -0,0 +1,27 @@
+"""Move memories from the legacy global finivo_memory collection into per-user/bucket collections.
+
+Run once after enabling MEMORY_COLLECTION_SHARDING=user (the default) or
+bucket on an existing persistent Chroma store. Embeddings are copied as
+stored, so nothing is re-encoded.
+
+Usage:
+    CHROMA_PATH=chroma_storage python scripts/migrate_memory_collections.py [--delete-source]
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import memory
+from services.chroma_service import migrate_global_collection
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--delete-source", action="store_true", help="drop finivo_memory once everything is copied")
+    args = parser.parse_args()
+    memory._init_chroma()
+    moved = migrate_global_collection(memory.collection_router, args.batch_size, args.delete_source)
+    print(f"Migrated {moved} memories ({memory.collection_router.sharding} sharding)")
@@ -0,0 +1,36 @@
+"""Rebuild the vector index from the user_memory table, e.g. after changing the embedding model.
+
+Each user's vectors are dropped, their memories are queued in the memory
+outbox, and the outbox is drained here (the running app's indexer would
+pick them up as well). Until a user's rows are drained, their searches
+return nothing. Pass --queue-only to leave the draining to the app.
+
+Usage:
+    CHROMA_PATH=chroma_storage python scripts/reembed_memories.py
+    CHROMA_PATH=chroma_storage python scripts/reembed_memories.py --user 42 --queue-only
+"""
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import SessionLocal
+from services.memory_indexer import MEMORY_OUTBOX_BATCH, drain, reembed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--user", type=int, action="append", dest="user_ids", help="only these users (repeatable)")
+    parser.add_argument("--batch-size", type=int, default=MEMORY_OUTBOX_BATCH)
+    parser.add_argument("--queue-only", action="store_true", help="queue the memories without indexing them here")
+    args = parser.parse_args()
+    db = SessionLocal()
+    try:
+        report = reembed(db, args.user_ids)
+        if not args.queue_only:
+            report.update(drain(db, args.batch_size))
+    finally:
+        db.close()
+    print(json.dumps(report, indent=2))
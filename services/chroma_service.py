@@ -1,7 +1,44 @@
-"""Light wrapper to lazily initialize a ChromaDB client and manage collections.
+"""Light wrapper to lazily initialize a ChromaDB client and route memories to collections.
 
 This avoids importing the heavy `chromadb` package at module import time.
+
+CollectionRouter decides which collection holds a user's memories, based on
+MEMORY_COLLECTION_SHARDING:
+
+    user    one collection per user, user_<id>_memory (default)
+    bucket  MEMORY_COLLECTION_BUCKETS collections, finivo_memory_<n>, picked by a stable hash of user_id
+    global  the single legacy finivo_memory collection
+
+With user or bucket sharding, a user-scoped query only touches that user's
+(or that bucket's) index. Open collection handles are cached in an LRU for
+at most MEMORY_COLLECTION_HANDLE_TTL seconds. After that they are reopened
+by name, so every process follows a collection swapped in by
+rebuild_collection() in another process.
+migrate_global_collection() moves memories written to finivo_memory before
+sharding was enabled.
+
+Write paths open collections with for_user(), which creates them. Read
+paths use find(), so looking up a user without memories doesn't leave an
+empty collection behind.
 """
+from collections import OrderedDict
+import hashlib
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger("chroma_service")
+
+GLOBAL_COLLECTION = "finivo_memory"
+MEMORY_COLLECTION_SHARDING = os.getenv("MEMORY_COLLECTION_SHARDING", "user").lower()
+MEMORY_COLLECTION_BUCKETS = int(os.getenv("MEMORY_COLLECTION_BUCKETS", "16"))
+MEMORY_COLLECTION_HANDLES = int(os.getenv("MEMORY_COLLECTION_HANDLES", "512"))
+MEMORY_COLLECTION_HANDLE_TTL = float(os.getenv("MEMORY_COLLECTION_HANDLE_TTL", "30"))
+# How long a rebuilt collection's old copy is kept for writers still holding a handle to it;
+# must exceed MEMORY_COLLECTION_HANDLE_TTL plus the longest write
+MEMORY_REBUILD_GRACE_SECONDS = float(os.getenv("MEMORY_REBUILD_GRACE_SECONDS", "300"))
+
 chroma_client = None
 
 
@@ -19,10 +56,295 @@ def _get_chroma_client():
         return chroma_client
 
 
-def get_or_create_collection(user_id: str):
-    client = _get_chroma_client()
-    collection_name = f"user_{user_id}_memory"
+def user_bucket(user_id, buckets: int = MEMORY_COLLECTION_BUCKETS) -> int:
+    # Stable across processes (unlike hash()), so every worker routes a user to the same bucket
+    return int.from_bytes(hashlib.sha1(str(user_id).encode("utf-8")).digest()[:4], "big") % buckets
+
+
+class CollectionRouter:
+    def __init__(self, client, sharding: str = MEMORY_COLLECTION_SHARDING, buckets: int = MEMORY_COLLECTION_BUCKETS, max_handles: int = MEMORY_COLLECTION_HANDLES,
+                 handle_ttl: float = MEMORY_COLLECTION_HANDLE_TTL):
+        if sharding not in ("user", "bucket", "global"):
+            raise ValueError(f"Unknown MEMORY_COLLECTION_SHARDING: {sharding}")
+        self.client = client
+        self.sharding = sharding
+        self.buckets = max(1, buckets)
+        self.max_handles = max(1, max_handles)
+        self.handle_ttl = handle_ttl
+        # name -> (handle, monotonic expiry)
+        self._handles: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def collection_name(self, user_id) -> str:
+        if self.sharding == "user":
+            return f"user_{user_id}_memory"
+        if self.sharding == "bucket":
+            return f"{GLOBAL_COLLECTION}_{user_bucket(user_id, self.buckets)}"
+        return GLOBAL_COLLECTION
+
+    def _cached(self, name: str):
+        with self._lock:
+            entry = self._handles.get(name)
+            if entry is None:
+                return None
+            if entry[1] < time.monotonic():
+                del self._handles[name]  # reopen by name: the collection may have been swapped
+                return None
+            self._handles.move_to_end(name)
+            return entry[0]
+
+    def _remember(self, name: str, handle):
+        with self._lock:
+            self._handles[name] = (handle, time.monotonic() + self.handle_ttl)
+            self._handles.move_to_end(name)
+            while len(self._handles) > self.max_handles:
+                self._handles.popitem(last=False)
+        return handle
+
+    def _open(self, name: str):
+        handle = self._cached(name)
+        if handle is not None:
+            return handle
+        return self._remember(name, self.client.get_or_create_collection(name=name))
+
+    def for_user(self, user_id):
+        return self._open(self.collection_name(user_id))
+
+    def find(self, user_id):
+        """The user's collection if it exists, without creating it (None otherwise)."""
+        name = self.collection_name(user_id)
+        handle = self._cached(name)
+        if handle is not None:
+            return handle
+        try:
+            from chromadb.errors import NotFoundError
+        except ImportError:  # older chromadb raises ValueError for a missing collection
+            NotFoundError = ValueError
+        try:
+            return self._remember(name, self.client.get_collection(name=name))
+        except (NotFoundError, ValueError):
+            return None
+
+    def _is_memory_collection(self, name: str) -> bool:
+        if "." in name:
+            return False  # .rebuild/.old copies from rebuild_collection
+        if self.sharding == "user":
+            return name.startswith("user_") and name.endswith("_memory")
+        if self.sharding == "bucket":
+            return name.startswith(f"{GLOBAL_COLLECTION}_")
+        return name == GLOBAL_COLLECTION
+
+    def all_collections(self):
+        """Every memory collection under the current sharding (for unscoped searches and backfills)."""
+        names = []
+        for entry in self.client.list_collections():
+            name = entry if isinstance(entry, str) else entry.name
+            if self._is_memory_collection(name):
+                names.append(name)
+        return [self._open(name) for name in sorted(names)]
+
+    def forget(self, name: str):
+        with self._lock:
+            self._handles.pop(name, None)
+
+    def drop(self, name: str):
+        self.forget(name)
+        self.client.delete_collection(name)
+
+
+def migrate_global_collection(router: CollectionRouter, batch_size: int = 500, delete_source: bool = False) -> int:
+    """Copy memories from the legacy finivo_memory collection into their routed collections.
+
+    Embeddings are copied as stored, so nothing is re-encoded. Re-running is
+    safe because upsert keys on the memory id. Returns the number of memories
+    copied.
+    """
+    if router.sharding == "global":
+        return 0
+    source = router.client.get_or_create_collection(name=GLOBAL_COLLECTION)
+    moved = 0
+    offset = 0
+    while True:
+        page = source.get(include=["documents", "metadatas", "embeddings"], limit=batch_size, offset=offset)
+        ids = page.get("ids") or []
+        if not ids:
+            break
+        by_collection = {}
+        for mem_id, doc, meta, emb in zip(ids, page["documents"], page["metadatas"], page["embeddings"]):
+            user_id = (meta or {}).get("user_id")
+            if user_id is None:
+                logger.warning("Skipping memory %s without user_id during migration", mem_id)
+                continue
+            rows = by_collection.setdefault(router.collection_name(user_id), ([], [], [], []))
+            rows[0].append(mem_id)
+            rows[1].append(doc)
+            rows[2].append(meta)
+            rows[3].append(list(emb))
+        for name, (mem_ids, docs, metas, embs) in by_collection.items():
+            router._open(name).upsert(ids=mem_ids, documents=docs, metadatas=metas, embeddings=embs)
+            moved += len(mem_ids)
+        offset += len(ids)
+    if delete_source and moved:
+        router.client.delete_collection(GLOBAL_COLLECTION)
+        router.forget(GLOBAL_COLLECTION)
+    logger.info("Migrated %d memories out of %s", moved, GLOBAL_COLLECTION)
+    return moved
+
+
+def record_deletes(collection, count: int):
+    """Count deletes since the last rebuild in the collection's metadata (HNSW keeps deleted nodes)."""
+    meta = dict(collection.metadata or {})
+    meta["deleted_since_rebuild"] = int(meta.get("deleted_since_rebuild", 0)) + count
+    collection.modify(metadata=meta)
+
+
+def fragmentation(collection) -> float:
+    """Share of the collection's index taken up by deleted entries."""
+    deleted = int((collection.metadata or {}).get("deleted_since_rebuild", 0))
+    total = collection.count() + deleted
+    return deleted / total if total else 0.0
+
+
+def _collection_names(client) -> set:
+    return {entry if isinstance(entry, str) else entry.name for entry in client.list_collections()}
+
+
+def _copy_rows(source, target, batch_size: int = 500) -> int:
+    copied = 0
+    offset = 0
+    while True:
+        page = source.get(include=["documents", "metadatas", "embeddings"], limit=batch_size, offset=offset)
+        ids = page.get("ids") or []
+        if not ids:
+            return copied
+        target.upsert(ids=ids, documents=page["documents"], metadatas=page["metadatas"], embeddings=[list(e) for e in page["embeddings"]])
+        copied += len(ids)
+        offset += len(ids)
+
+
+def _copy_missing(source, target, where=None) -> int:
+    """Upsert the rows of source (matching where) whose ids target lacks. Returns how many were copied."""
+    page = source.get(where=where, include=[]) if where else source.get(include=[])
+    ids = page.get("ids") or []
+    present = set(target.get(ids=ids, include=[]).get("ids") or []) if ids else set()
+    missing = [mem_id for mem_id in ids if mem_id not in present]
+    if missing:
+        rows = source.get(ids=missing, include=["documents", "metadatas", "embeddings"])
+        target.upsert(ids=rows["ids"], documents=rows["documents"], metadatas=rows["metadatas"], embeddings=[list(e) for e in rows["embeddings"]])
+    return len(missing)
+
+
+def _swap_in(router: CollectionRouter, staging, name: str):
+    """Rename staging to name, first folding in rows a request wrote to a freshly created name in between."""
     try:
-        return client.get_collection(name=collection_name)
+        staging.modify(name=name)
+        return
     except Exception:
-        return client.create_collection(name=collection_name)
+        if name not in _collection_names(router.client):
+            raise
+    router.forget(name)
+    _copy_rows(router.client.get_collection(name), staging)
+    router.client.delete_collection(name)
+    staging.modify(name=name)
+
+
+def recover_rebuild(router: CollectionRouter, name: str, grace: float = MEMORY_REBUILD_GRACE_SECONDS) -> bool:
+    """Finish a rebuild of name: retire its old copy or repair an interrupted swap. Returns True if anything was left over.
+
+    A rebuild renames name -> name.old, then name.rebuild -> name, and keeps
+    name.old for grace seconds: other processes may still write to it until
+    their handles expire. After that, rows indexed into name.old since the
+    copy started and missing from name are copied over, and name.old is
+    dropped. A leftover staging copy is swapped in when the live collection
+    is missing. Next to a live collection it is usually a partial copy; rows
+    it holds that the live collection lacks (left by a crash of the older
+    delete-then-rename swap) are copied back before it is dropped.
+    """
+    names = _collection_names(router.client)
+    staging_name, old_name = f"{name}.rebuild", f"{name}.old"
+    if staging_name not in names and old_name not in names:
+        return False
+    if name in names and old_name in names and staging_name not in names:
+        retired = router.client.get_collection(old_name).metadata or {}
+        if "retired_at" in retired and time.time() - float(retired["retired_at"]) < grace:
+            return False  # still in its grace period
+    router.forget(name)
+    if name not in names:
+        # Crashed between the renames (or, before this order was used, after deleting the original)
+        keep = staging_name if staging_name in names else old_name
+        router.client.get_collection(keep).modify(name=name)
+        names.discard(keep)
+        names.add(name)
+        logger.warning("Recovered %s from %s after an interrupted rebuild", name, keep)
+    elif old_name in names and staging_name in names:
+        # Crashed between the renames after a request recreated name: the staging copy is the data
+        _swap_in(router, router.client.get_collection(staging_name), name)
+        names.discard(staging_name)
+        logger.warning("Recovered %s from %s after an interrupted rebuild", name, staging_name)
+    elif staging_name in names:
+        restored = _copy_missing(router.client.get_collection(staging_name), router.client.get_collection(name))
+        if restored:
+            logger.warning("Restored %d memories into %s from %s", restored, name, staging_name)
+    else:
+        old = router.client.get_collection(old_name)
+        copy_started = (old.metadata or {}).get("copy_started_at")
+        if copy_started is not None:
+            # Written through handles that still pointed at the old collection
+            restored = _copy_missing(old, router.client.get_collection(name), where={"indexed_at": {"$gte": float(copy_started)}})
+            if restored:
+                logger.warning("Moved %d late writes into %s from %s", restored, name, old_name)
+    for leftover in (staging_name, old_name):
+        if leftover in names:
+            router.client.delete_collection(leftover)
+    return True
+
+
+def recover_rebuilds(router: CollectionRouter) -> list:
+    """recover_rebuild for every collection with a leftover .rebuild/.old copy."""
+    bases = set()
+    for leftover in _collection_names(router.client):
+        for suffix in (".rebuild", ".old"):
+            if leftover.endswith(suffix):
+                bases.add(leftover[:-len(suffix)])
+    return [name for name in sorted(bases) if recover_rebuild(router, name)]
+
+
+def rebuild_collection(router: CollectionRouter, name: str, batch_size: int = 500) -> int:
+    """Copy a collection's live rows into a fresh index and swap it in under the same name.
+
+    Stored embeddings are reused, so nothing is re-encoded. The swap is two
+    renames (name -> name.old, name.rebuild -> name), so the rows exist under
+    some name at every point; a crash is repaired by recover_rebuild() on the
+    next run. name.old is kept until recover_rebuild() retires it after
+    MEMORY_REBUILD_GRACE_SECONDS, picking up writes other processes made
+    through their cached handles in the meantime.
+    Returns the number of rows copied (0 if the collection changed meanwhile
+    or its previous rebuild is still in its grace period).
+    """
+    recover_rebuild(router, name)
+    staging_name, old_name = f"{name}.rebuild", f"{name}.old"
+    if old_name in _collection_names(router.client):
+        logger.info("Skipped rebuilding %s: its previous rebuild is still in its grace period", name)
+        return 0
+    source = router.client.get_collection(name)
+    copy_started = time.time()
+    staging = router.client.create_collection(name=staging_name)
+    copied = _copy_rows(source, staging, batch_size)
+    if source.count() != copied:
+        # Written to while we copied; leave it alone and try again next run
+        router.client.delete_collection(staging_name)
+        logger.info("Skipped rebuilding %s: it changed during the copy", name)
+        return 0
+    router.forget(name)
+    source.modify(name=old_name)
+    _swap_in(router, staging, name)
+    retired = dict(source.metadata or {})
+    retired.update(retired_at=time.time(), copy_started_at=copy_started)
+    source.modify(metadata=retired)
+    logger.info("Rebuilt %s with %d memories", name, copied)
+    return copied
+
+
+def get_or_create_collection(user_id: str):
+    """Per-user collection on the default client (kept for existing callers)."""
+    return CollectionRouter(_get_chroma_client(), sharding="user").for_user(user_id)
@@ -0,0 +1,149 @@
+"""Micro-batching front end for the sentence embedder.
+
+Concurrent requests each need a handful of embeddings, and with
+OMP_NUM_THREADS=1 a forward pass over one text costs almost as much as a pass
+over dozens. EmbeddingBatcher queues encode requests from every caller. A
+single worker thread flushes the queue as one model batch once
+EMBEDDING_BATCH_MAX texts are waiting or EMBEDDING_BATCH_WAIT_MS has passed
+since the first one arrived.
+
+Callers block on encode() for at most EMBEDDING_BATCH_TIMEOUT seconds. A
+request whose future was cancelled is dropped from the batch.
+
+encode() is synchronous: it blocks the calling thread until the batch is
+done. Call it from plain `def` handlers, which FastAPI runs in its thread
+pool, or from worker threads. Never call it directly on the event loop. An
+`async def` caller must go through run_in_threadpool, or await
+asyncio.wrap_future(batcher.submit(texts)).
+"""
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+import logging
+import os
+import queue
+import threading
+import time
+
+import numpy as np
+
+logger = logging.getLogger("embedding_batcher")
+
+# EMBEDDING_BATCH_WAIT_MS=0 disables batching (texts are encoded on the caller's thread)
+EMBEDDING_BATCH_WAIT_MS = float(os.getenv("EMBEDDING_BATCH_WAIT_MS", "5"))
+EMBEDDING_BATCH_MAX = int(os.getenv("EMBEDDING_BATCH_MAX", "64"))
+EMBEDDING_BATCH_TIMEOUT = float(os.getenv("EMBEDDING_BATCH_TIMEOUT", "30"))
+
+
+class EmbeddingBatcher:
+    def __init__(self, encode_fn: Callable[[List[str]], np.ndarray], max_batch: int = EMBEDDING_BATCH_MAX, max_wait_ms: float = EMBEDDING_BATCH_WAIT_MS, timeout: float = EMBEDDING_BATCH_TIMEOUT):
+        self.encode_fn = encode_fn
+        self.timeout = timeout
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue: "queue.Queue[Tuple[List[str], Future]]" = queue.Queue()
+        self._worker: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.batches = 0
+        self.requests = 0
+        self.texts = 0
+        self.max_batch_seen = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_wait > 0
+
+    def _ensure_worker(self):
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+                self._worker.start()
+
+    def submit(self, texts: Sequence[str]) -> Future:
+        """Queue texts for the next batch; the future resolves to a float32 array (one row per text)."""
+        future: Future = Future()
+        texts = list(texts)
+        if not texts:
+            future.set_result(np.zeros((0, 0), dtype=np.float32))
+            return future
+        if not self.enabled:
+            try:
+                future.set_result(np.asarray(self.encode_fn(texts), dtype=np.float32))
+            except Exception as e:
+                future.set_exception(e)
+            return future
+        self._ensure_worker()
+        self._queue.put((texts, future))
+        return future
+
+    def encode(self, texts: Sequence[str]) -> np.ndarray:
+        """Block the calling thread until the texts' batch is encoded; raises concurrent.futures.TimeoutError after self.timeout seconds.
+
+        Sync-only: never call it on the event loop (see the module docstring).
+        """
+        future = self.submit(texts)
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeout:
+            future.cancel()  # the worker skips it if it hasn't been picked up yet
+            raise
+
+    def _collect(self) -> List[Tuple[List[str], Future]]:
+        pending = [self._queue.get()]
+        count = len(pending[0][0])
+        deadline = time.monotonic() + self.max_wait
+        while count < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            pending.append(item)
+            count += len(item[0])
+        # Drop requests cancelled while queued; the rest can no longer be cancelled
+        return [(texts, future) for texts, future in pending if future.set_running_or_notify_cancel()]
+
+    def _run(self):
+        while True:
+            pending = self._collect()
+            if not pending:
+                continue
+            # Identical texts from different requests are encoded once
+            unique: Dict[str, int] = {}
+            for texts, _ in pending:
+                for text in texts:
+                    unique.setdefault(text, len(unique))
+            try:
+                vectors = np.asarray(self.encode_fn(list(unique)), dtype=np.float32)
+            except Exception as e:
+                logger.exception("Embedding batch of %d texts failed", len(unique))
+                for _, future in pending:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for texts, future in pending:
+                if not future.done():
+                    future.set_result(vectors[[unique[text] for text in texts]])
+            with self._stats_lock:
+                self.batches += 1
+                self.requests += len(pending)
+                self.texts += len(unique)
+                self.max_batch_seen = max(self.max_batch_seen, len(unique))
+
+    def stats(self) -> Dict:
+        with self._stats_lock:
+            return {
+                "enabled": self.enabled,
+                "max_batch": self.max_batch,
+                "max_wait_ms": self.max_wait * 1000,
+                "queued": self._queue.qsize(),
+                "batches": self.batches,
+                "requests": self.requests,
+                "texts": self.texts,
+                "avg_batch_size": round(self.texts / self.batches, 2) if self.batches else 0.0,
+                "max_batch_size": self.max_batch_seen,
+            }
@@ -0,0 +1,238 @@
+"""Memory retention and compaction.
+
+Without this, memories are never deleted or merged. The Chroma directory and
+its HNSW index grow without bound, and recall and latency degrade as stale
+near-duplicates crowd the top-k. A compaction run does this per user:
+
+1. Expire memories older than the plan's memory_retention_days
+   (utils.plan_features; None keeps them forever).
+2. Merge near-duplicates. Memories whose embeddings have cosine similarity
+   of at least MEMORY_COMPACTION_SIMILARITY collapse into the newest one in
+   the vector store. Their user_memory rows keep their text and are
+   repointed to the surviving memory_uid.
+3. Delete the user_memory rows past the TTL, judged by each row's own
+   timestamp (including rows from before memory_uid existed). A newer row
+   whose content was deduplicated onto an expired memory keeps its text and
+   is queued for indexing again under a new memory_uid.
+
+Only users with user_memory rows are visited. Chroma keeps deleted entries
+in its HNSW graph. Afterwards, any collection
+whose deleted share is at least MEMORY_COMPACTION_REBUILD_RATIO is copied
+into a fresh index. The numpy backend rewrites a user's files on delete,
+so it never needs a rebuild.
+
+run_compaction() returns a report with before/after memory counts,
+user_memory row counts and on-disk bytes. main.py runs it every
+MEMORY_COMPACTION_INTERVAL_HOURS; scripts/compact_memories.py runs it once.
+"""
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+import logging
+import math
+import os
+import time
+
+import numpy as np
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+
+from models import User, UserMemory
+from services import memory_indexer
+from utils.memory_ids import new_memory_id
+from utils.plan_features import get_plan_features, sanitize_plan
+
+logger = logging.getLogger("memory_compaction")
+
+MEMORY_COMPACTION_SIMILARITY = float(os.getenv("MEMORY_COMPACTION_SIMILARITY", "0.95"))
+MEMORY_COMPACTION_REBUILD_RATIO = float(os.getenv("MEMORY_COMPACTION_REBUILD_RATIO", "0.2"))
+
+
+def _memory_epoch(metadata: Dict) -> float:
+    import memory
+    if "ts" in metadata:
+        return float(metadata["ts"])
+    raw = metadata.get("timestamp")
+    if not raw:
+        return math.inf  # no timestamp: never expires
+    return memory.epoch_seconds(raw) or 0.0
+
+
+def near_duplicate_groups(embeddings: np.ndarray, epochs: np.ndarray, threshold: float) -> Dict[int, List[int]]:
+    """Greedy clustering, newest first: {representative row: [rows merged into it]}.
+
+    Each row joins the most similar representative at or above threshold,
+    or becomes a representative itself.
+    """
+    if not len(embeddings):
+        return {}
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    unit = embeddings / np.where(norms == 0, 1, norms)
+    reps = np.empty_like(unit)
+    rep_rows: List[int] = []
+    groups: Dict[int, List[int]] = {}
+    for row in np.argsort(-epochs, kind="stable"):
+        if rep_rows:
+            sims = reps[:len(rep_rows)] @ unit[row]
+            best = int(np.argmax(sims))
+            if sims[best] >= threshold:
+                groups[rep_rows[best]].append(int(row))
+                continue
+        reps[len(rep_rows)] = unit[row]
+        rep_rows.append(int(row))
+        groups[int(row)] = []
+    return groups
+
+
+def compact_user(user_id: int, db: Session, plan: Optional[str] = None, now: Optional[float] = None,
+                 similarity: float = MEMORY_COMPACTION_SIMILARITY, dry_run: bool = False) -> Dict:
+    import memory
+    now = time.time() if now is None else now
+    if plan is None:
+        user = db.query(User).filter(User.id == user_id).first()
+        plan = user.plan if user else None
+    plan = sanitize_plan(plan)
+    retention_days = get_plan_features(plan).get("memory_retention_days")
+    cutoff = now - retention_days * 86400 if retention_days else None
+
+    rows = memory.user_memories(user_id)
+    epochs = np.array([_memory_epoch(meta or {}) for _, _, meta, _ in rows], dtype=np.float64)
+    expired = [i for i in range(len(rows)) if cutoff is not None and epochs[i] < cutoff]
+    live = [i for i in range(len(rows)) if cutoff is None or epochs[i] >= cutoff]
+    merged = []
+    merged_into: Dict[str, str] = {}
+    if len(live) > 1:
+        vectors = np.stack([rows[i][3] for i in live])
+        for rep, members in near_duplicate_groups(vectors, epochs[live], similarity).items():
+            merged.extend(live[m] for m in members)
+            for m in members:
+                merged_into[rows[live[m]][0]] = rows[live[rep]][0]
+
+    expired_ids = [rows[i][0] for i in expired]
+    removed_ids = expired_ids + list(merged_into)
+    # Near-duplicates only collapse in the vector store; user_memory keeps their text.
+    # Rows expire by their own timestamp: a fresh row may share an old memory's uid after dedup.
+    cutoff_at = datetime.utcfromtimestamp(cutoff) if cutoff is not None else None
+    sql_rows = db.query(UserMemory).filter(UserMemory.user_id == user_id, UserMemory.timestamp < cutoff_at) if cutoff_at else None
+    sql_deleted = sql_rows.count() if sql_rows is not None else 0
+    requeue = []
+    if expired_ids:
+        requeue = db.query(UserMemory).filter(
+            UserMemory.user_id == user_id,
+            UserMemory.memory_uid.in_(expired_ids),
+            or_(UserMemory.timestamp >= cutoff_at, UserMemory.timestamp.is_(None)),
+        ).all()
+    repointed = db.query(UserMemory).filter(UserMemory.user_id == user_id, UserMemory.memory_uid.in_(list(merged_into))).count() if merged_into else 0
+    if not dry_run:
+        memory.delete_memories(user_id, removed_ids)
+        for merged_id, target_id in merged_into.items():
+            db.query(UserMemory).filter(UserMemory.user_id == user_id, UserMemory.memory_uid == merged_id).update(
+                {UserMemory.memory_uid: target_id}, synchronize_session=False
+            )
+        if sql_deleted:
+            sql_rows.delete(synchronize_session=False)
+        # Queued after the vectors are gone, so the indexer can't dedup them onto the expired memory
+        for row in requeue:
+            row.memory_uid = new_memory_id()
+            memory_indexer.enqueue(db, row)
+        if sql_deleted or repointed or requeue:
+            db.commit()
+        if requeue:
+            memory_indexer.MEMORY_INDEXER.notify()
+    return {
+        "user_id": user_id,
+        "plan": plan,
+        "retention_days": retention_days,
+        "before": len(rows),
+        "expired": len(expired),
+        "merged": len(merged),
+        "after": len(rows) - len(removed_ids),
+        "sql_rows_deleted": sql_deleted,
+        "sql_rows_repointed": repointed,
+        "sql_rows_requeued": len(requeue),
+    }
+
+
+def _disk_bytes() -> Optional[int]:
+    import memory
+    if memory.vector_index is not None:
+        root = memory.vector_index.root
+    else:
+        root = os.getenv("CHROMA_PATH")
+    if not root or not os.path.isdir(root):
+        return None  # in-memory Chroma
+    total = 0
+    for dirpath, _, filenames in os.walk(root):
+        for name in filenames:
+            try:
+                total += os.path.getsize(os.path.join(dirpath, name))
+            except OSError:
+                pass
+    return total
+
+
+def _rebuild_fragmented(ratio: float) -> List[str]:
+    import memory
+    from services.chroma_service import fragmentation, rebuild_collection, recover_rebuilds
+    if memory.vector_index is not None:
+        return []
+    recover_rebuilds(memory.collection_router)
+    rebuilt = []
+    for target in memory.collection_router.all_collections():
+        if fragmentation(target) >= ratio and rebuild_collection(memory.collection_router, target.name):
+            rebuilt.append(target.name)
+    return rebuilt
+
+
+def run_compaction(db: Session, user_ids: Optional[Iterable[int]] = None, similarity: float = MEMORY_COMPACTION_SIMILARITY,
+                   rebuild_ratio: float = MEMORY_COMPACTION_REBUILD_RATIO, dry_run: bool = False) -> Dict:
+    """Compact every user's memories (or just user_ids) and report before/after sizes."""
+    import memory
+    memory._init_chroma()
+    started = time.perf_counter()
+    now = time.time()
+    disk_before = _disk_bytes()
+    sql_before = db.query(UserMemory).count()
+    if user_ids is None:
+        # Users without memories are skipped rather than given an empty collection
+        with_memories = db.query(UserMemory.user_id).distinct()
+        users = db.query(User.id, User.plan).filter(User.id.in_(with_memories)).order_by(User.id).all()
+    else:
+        wanted = list(user_ids)
+        plans = dict(db.query(User.id, User.plan).filter(User.id.in_(wanted)).all())
+        users = [(uid, plans.get(uid)) for uid in wanted]
+
+    totals = {"before": 0, "expired": 0, "merged": 0, "after": 0, "sql_rows_deleted": 0, "sql_rows_repointed": 0, "sql_rows_requeued": 0}
+    compacted = []
+    for user_id, plan in users:
+        try:
+            result = compact_user(user_id, db, plan=plan or "essential", now=now, similarity=similarity, dry_run=dry_run)
+        except Exception:
+            db.rollback()
+            logger.exception("Compaction failed for user %s", user_id)
+            continue
+        for key in totals:
+            totals[key] += result[key]
+        if result["expired"] or result["merged"] or result["sql_rows_deleted"]:
+            compacted.append(result)
+
+    rebuilt = [] if dry_run else _rebuild_fragmented(rebuild_ratio)
+    report = {
+        "dry_run": dry_run,
+        "users": len(users),
+        "memories_before": totals["before"],
+        "memories_after": totals["after"],
+        "expired": totals["expired"],
+        "merged": totals["merged"],
+        "sql_rows_before": sql_before,
+        "sql_rows_after": sql_before - totals["sql_rows_deleted"],
+        "sql_rows_repointed": totals["sql_rows_repointed"],
+        "sql_rows_requeued": totals["sql_rows_requeued"],
+        "disk_bytes_before": disk_before,
+        "disk_bytes_after": _disk_bytes(),
+        "rebuilt_collections": rebuilt,
+        "compacted_users": compacted,
+        "duration_ms": round((time.perf_counter() - started) * 1000, 1),
+    }
+    logger.info("Memory compaction: %d -> %d memories (%d expired, %d merged), rebuilt %s",
+                report["memories_before"], report["memories_after"], report["expired"], report["merged"], rebuilt)
+    return report
@@ -0,0 +1,219 @@
+"""Transactional outbox between the user_memory table and the vector store.
+
+POST /memory/store/{user_id} writes the UserMemory row and a MemoryOutbox row
+in one transaction, then returns without embedding anything. MemoryIndexer,
+a background thread, drains due outbox rows in batches of
+MEMORY_OUTBOX_BATCH. It groups them per user and indexes them through
+memory.store_memories under the row's memory_uid (one embedding batch per
+user).
+
+When a row is indexed, its outbox entry is deleted. If the content is a
+duplicate, the UserMemory row is repointed to the memory that is already
+indexed. Rows sharing a memory_uid (near-duplicates merged by
+services.memory_compaction) are indexed once, with the newest row's text,
+and a memory_uid that is already indexed is not added again. If indexing fails, the row's attempts is bumped and it is retried
+with exponential backoff. After MEMORY_OUTBOX_MAX_ATTEMPTS failures the row
+is left in place as a dead letter and reported in stats().
+
+A crash between the SQL commit and the vector write can no longer lose a
+memory: the outbox row stays until it is indexed. Indexing is idempotent
+(content-hash dedup), so a batch retried after a partial failure does not
+double-insert.
+
+reembed() rebuilds a user's vectors from SQL after a model change;
+scripts/reembed_memories.py wraps it.
+"""
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Optional
+import logging
+import os
+import threading
+import time
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from models import MemoryOutbox, UserMemory
+
+logger = logging.getLogger("memory_indexer")
+
+MEMORY_OUTBOX_BATCH = int(os.getenv("MEMORY_OUTBOX_BATCH", "64"))
+MEMORY_OUTBOX_POLL_SECONDS = float(os.getenv("MEMORY_OUTBOX_POLL_SECONDS", "2"))
+MEMORY_OUTBOX_MAX_ATTEMPTS = int(os.getenv("MEMORY_OUTBOX_MAX_ATTEMPTS", "8"))
+MEMORY_OUTBOX_MAX_BACKOFF_SECONDS = 3600
+
+
+def enqueue(db: Session, memory: UserMemory) -> MemoryOutbox:
+    """Add the outbox row for a UserMemory; the caller commits both together."""
+    entry = MemoryOutbox(memory_uid=memory.memory_uid, user_id=memory.user_id, content=memory.content, timestamp=memory.timestamp)
+    db.add(entry)
+    return entry
+
+
+def drain_once(db: Session, batch_size: int = MEMORY_OUTBOX_BATCH) -> Dict[str, int]:
+    """Index up to batch_size due outbox rows. Returns indexed/duplicate/failed counts."""
+    import memory as memory_store
+    now = datetime.utcnow()
+    rows = (
+        db.query(MemoryOutbox)
+        .filter(MemoryOutbox.next_attempt_at <= now, MemoryOutbox.attempts < MEMORY_OUTBOX_MAX_ATTEMPTS)
+        .order_by(MemoryOutbox.id)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)  # several workers can drain without taking the same rows
+        .all()
+    )
+    counts = {"indexed": 0, "duplicates": 0, "failed": 0}
+    by_user = {}
+    for row in rows:
+        by_user.setdefault(row.user_id, []).append(row)
+    for user_id, user_rows in by_user.items():
+        # One vector per memory_uid: the newest row stands for the others
+        primary = {}
+        for row in user_rows:
+            current = primary.get(row.memory_uid)
+            if current is None or (row.timestamp or datetime.min) > (current.timestamp or datetime.min):
+                primary[row.memory_uid] = row
+        try:
+            already = memory_store.indexed_ids(user_id, primary)
+            pending = [row for uid, row in primary.items() if uid not in already]
+            items = [{"content": row.content, "timestamp": row.timestamp, "id": row.memory_uid} for row in pending]
+            result = memory_store.store_memories(user_id, items) if items else {"stored": [], "skipped": [], "ids": [], "skipped_ids": []}
+        except Exception as e:
+            logger.warning("Indexing %d outbox rows for user %s failed: %s", len(user_rows), user_id, e)
+            for row in user_rows:
+                row.attempts += 1
+                row.last_error = str(e)[:1000]
+                row.next_attempt_at = now + timedelta(seconds=min(MEMORY_OUTBOX_MAX_BACKOFF_SECONDS, 2 ** row.attempts))
+            counts["failed"] += len(user_rows)
+            continue
+        indexed_as = {}
+        for text, mem_id in zip(result["stored"] + result["skipped"], result["ids"] + result["skipped_ids"]):
+            indexed_as[memory_store.content_hash(text)] = mem_id
+        for row in user_rows:
+            if row.memory_uid in already or primary[row.memory_uid] is not row:
+                counts["duplicates"] += 1  # its memory_uid is (now) indexed
+                db.delete(row)
+                continue
+            target = indexed_as.get(memory_store.content_hash(row.content), row.memory_uid)
+            if target != row.memory_uid:
+                # Duplicate content: point the SQL row at the memory that is already indexed
+                db.query(UserMemory).filter(UserMemory.memory_uid == row.memory_uid).update(
+                    {UserMemory.memory_uid: target}, synchronize_session=False
+                )
+                counts["duplicates"] += 1
+            else:
+                counts["indexed"] += 1
+            db.delete(row)
+    db.commit()
+    return counts
+
+
+def drain(db: Session, batch_size: int = MEMORY_OUTBOX_BATCH) -> Dict[str, int]:
+    """drain_once until no due rows are left."""
+    totals = {"indexed": 0, "duplicates": 0, "failed": 0}
+    while True:
+        counts = drain_once(db, batch_size)
+        for key in totals:
+            totals[key] += counts[key]
+        if sum(counts.values()) < batch_size or counts["failed"]:
+            return totals
+
+
+def reembed(db: Session, user_ids: Optional[Iterable[int]] = None) -> Dict[str, int]:
+    """Drop the vectors of each user (all users with memories by default) and queue their SQL memories again.
+
+    user_memory is the source of truth: vector-store entries without a SQL
+    row are dropped. Rows stored before memory_uid existed get an ID here.
+    Searches for a user return nothing until their rows are drained again.
+
+    The vectors are cleared before the rows are queued. Queuing first would
+    let a running indexer drain the new rows in between, dedup them against
+    the old vectors, and then lose them to the clear.
+    """
+    import memory as memory_store
+    from utils.memory_ids import new_memory_id
+    if user_ids is None:
+        user_ids = [uid for (uid,) in db.query(UserMemory.user_id).distinct().order_by(UserMemory.user_id)]
+    totals = {"users": 0, "cleared": 0, "queued": 0}
+    for user_id in user_ids:
+        # Pending entries are re-queued below; dropping them first keeps the indexer from re-adding old vectors
+        db.query(MemoryOutbox).filter(MemoryOutbox.user_id == user_id).delete(synchronize_session=False)
+        db.commit()
+        totals["cleared"] += memory_store.clear_user_memories(user_id)
+        for row in db.query(UserMemory).filter(UserMemory.user_id == user_id).order_by(UserMemory.id):
+            if not row.memory_uid:
+                row.memory_uid = new_memory_id()
+            enqueue(db, row)
+            totals["queued"] += 1
+        db.commit()
+        totals["users"] += 1
+    return totals
+
+
+class MemoryIndexer:
+    def __init__(self, batch_size: int = MEMORY_OUTBOX_BATCH, poll_seconds: float = MEMORY_OUTBOX_POLL_SECONDS):
+        self.batch_size = batch_size
+        self.poll_seconds = poll_seconds
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.indexed = 0
+        self.duplicates = 0
+        self.failed = 0
+        self.last_drain_at = None
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name="memory-indexer", daemon=True)
+            self._thread.start()
+
+    def notify(self):
+        """Drain now instead of at the next poll (called after a memory is queued)."""
+        self._wake.set()
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self):
+        from database import SessionLocal
+        while not self._stop.is_set():
+            self._wake.wait(self.poll_seconds)
+            self._wake.clear()
+            db = SessionLocal()
+            try:
+                counts = drain(db, self.batch_size)
+            except Exception:
+                db.rollback()
+                logger.exception("Memory outbox drain failed")
+                time.sleep(self.poll_seconds)
+                continue
+            finally:
+                db.close()
+            with self._lock:
+                self.indexed += counts["indexed"]
+                self.duplicates += counts["duplicates"]
+                self.failed += counts["failed"]
+                self.last_drain_at = datetime.utcnow().isoformat()
+
+    def stats(self, db: Optional[Session] = None) -> Dict:
+        with self._lock:
+            stats = {
+                "running": self._thread is not None and self._thread.is_alive(),
+                "indexed": self.indexed,
+                "duplicates": self.duplicates,
+                "failed_attempts": self.failed,
+                "last_drain_at": self.last_drain_at,
+            }
+        if db is not None:
+            stats["pending"] = db.query(func.count(MemoryOutbox.id)).filter(MemoryOutbox.attempts < MEMORY_OUTBOX_MAX_ATTEMPTS).scalar()
+            stats["dead_letters"] = db.query(func.count(MemoryOutbox.id)).filter(MemoryOutbox.attempts >= MEMORY_OUTBOX_MAX_ATTEMPTS).scalar()
+        return stats
+
+
+MEMORY_INDEXER = MemoryIndexer()
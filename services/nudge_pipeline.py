@@ -0,0 +1,302 @@
+"""Staged nudge pipeline shared by every nudge entry point.
+
+A nudge runs through fixed, named stages:
+
+    load_user -> quota_check -> impulse_scan -> memory_recall -> persuasion -> render -> log
+
+Each stage is a function taking the NudgeContext. It can stop the run early by
+setting ctx.response and ctx.halted (unknown user, quota reached). Every stage
+is timed. Timings go on the context and into process-wide per-stage stats,
+which GET /nudge/pipeline-stats exposes. Stages can be swapped with
+NudgePipeline.replace() to try an optimization against the same hot path.
+"""
+import logging
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from models import NudgeLog, User
+from services import nudge_quota
+from utils.plan_features import get_plan_features, sanitize_plan
+
+logger = logging.getLogger("nudge_pipeline")
+
+PLAN_NUDGE_MESSAGES = {
+    "essential": "This feels impulsive. Want to pause and revisit tomorrow? I can remind you if you want.",
+    "prestige": "Impulse detected! Let's take a breather and reflect for 24 hours. If you want, I can help you set a reminder or talk through your reasons.",
+    "elite": "I sense this is an impulse purchase. Let's dig deeper: Is this truly aligned with your goals, or is it a fleeting urge? I can bookmark this and check in with you tomorrow, or we can discuss your motivations in detail.",
+}
+DEFAULT_NUDGE_MESSAGE = "This seems impulsive. You might want to wait before buying."
+DEFAULT_FALLBACK_MESSAGE = "All clear. Just a gentle reminder to stay mindful."
+# Logged regrets at which the P (pattern) flag fires even if the client didn't send one
+REGRET_PATTERN_THRESHOLD = 3
+
+
+@dataclass
+class NudgeContext:
+    user_id: int
+    payload: Dict[str, Any]
+    db: Session
+    source: str = "text"
+    trace: bool = False
+    user: Optional[User] = None
+    plan: Optional[str] = None
+    plan_features: Dict[str, Any] = field(default_factory=dict)
+    nudge_count: Optional[int] = None
+    nudge_limit: Optional[int] = None
+    impulse: Optional[Dict[str, Any]] = None
+    memories: List[str] = field(default_factory=list)
+    earn: Dict[str, str] = field(default_factory=dict)
+    persuasion_mode: bool = False
+    nudge_message: str = ""
+    response: Optional[Dict[str, Any]] = None
+    halted: bool = False
+    timings: Dict[str, float] = field(default_factory=dict)
+
+    def halt(self, response: Dict[str, Any]):
+        self.response = response
+        self.halted = True
+
+
+def run_earn_persuasion(body, tone: str) -> dict:
+    """E.A.R.N. (Empathize / Ask / Reframe / Nudge) script for the plan's AI tone."""
+    if tone == "smart":
+        return {
+            "empathize": "That sounds like something that caught your attention in the moment—totally valid.",
+            "ask": "What’s driving this feeling of urgency today? Could this be a short-term emotion?",
+            "reframe": "What if we paused for 24 hours and revisited this tomorrow with fresh eyes?",
+            "nudge": "Want me to bookmark this for now and check in with you tomorrow?"
+        }
+    elif tone == "luxury":
+        return {
+            "empathize": "I understand the excitement and allure of owning a limited edition piece, especially when it speaks to your personal style.",
+            "ask": "Let’s pause and reflect: What is making this purchase feel urgent to you right now? Are there deeper reasons behind it?",
+            "reframe": "Considering your financial vision, it may be valuable to hold off for 48 hours and reflect.",
+            "nudge": "I’ll save this for you to revisit tomorrow. If you’d like, I can set a reminder to review it together."
+        }
+    else:
+        return {}
+
+
+def monthly_nudge_count(user_id: int, db: Session) -> int:
+    return nudge_quota.nudge_count(user_id, db)
+
+
+def log_nudge(db: Session, user_id: int, spending_intent: Optional[str], nudge_message: str, plan: Optional[str], source: str, commit: bool = True, quota_reserved: bool = False) -> NudgeLog:
+    """Record a delivered nudge. Shared by the pipeline and the bulk (Plaid/spending) paths.
+
+    quota_reserved: the nudge was already counted by nudge_quota.reserve() in this transaction.
+    """
+    entry = NudgeLog(user_id=user_id, spending_intent=spending_intent, nudge_message=nudge_message, plan=plan, source=source)
+    setattr(entry, nudge_quota.RESERVED_ATTR, quota_reserved)
+    db.add(entry)
+    if commit:
+        db.commit()
+    return entry
+
+
+# --- Stages ---
+
+def load_user(ctx: NudgeContext):
+    ctx.user = ctx.db.query(User).filter(User.id == ctx.user_id).first()
+    if not ctx.user:
+        ctx.halt({"error": "User not found"})
+        return
+    ctx.plan = sanitize_plan(ctx.user.plan)
+    ctx.plan_features = get_plan_features(ctx.plan)
+
+
+def quota_check(ctx: NudgeContext):
+    ctx.nudge_limit = ctx.plan_features.get("nudge_limit")
+    if not ctx.nudge_limit:
+        return
+    # Cheap early exit; log() takes the actual slot with nudge_quota.reserve()
+    ctx.nudge_count = monthly_nudge_count(ctx.user_id, ctx.db)
+    if ctx.nudge_count >= ctx.nudge_limit:
+        _quota_reached(ctx)
+
+
+def _quota_reached(ctx: NudgeContext):
+    ctx.halt({
+        "plan": ctx.plan,
+        "nudge_message": f"[{ctx.plan.title()}] Monthly nudge limit reached. Consider upgrading for more support.",
+        "persuasion_mode": False,
+        "quota": {"nudge_count": ctx.nudge_count, "nudge_limit": ctx.nudge_limit},
+    })
+
+
+def impulse_scan(ctx: NudgeContext):
+    from utils.impulse_engine import DEFAULT_MATCHER, scan_impulse_triggers
+    from utils.impulse_rules import get_user_matcher
+    from utils.feature_store import get_user_counters
+
+    matcher = get_user_matcher(ctx.user_id, ctx.db) if ctx.plan_features.get("custom_rules") else DEFAULT_MATCHER
+    # Recency and regret history come from the server-side feature store
+    scan_input = dict(ctx.payload)
+    counters = get_user_counters(ctx.user_id, ctx.db)
+    if counters["last_purchase_days"] is not None:
+        scan_input["last_purchase_days"] = counters["last_purchase_days"]
+    if not scan_input.get("pattern") and counters["regret_count"] >= REGRET_PATTERN_THRESHOLD:
+        scan_input["pattern"] = True
+    ctx.impulse = scan_impulse_triggers(scan_input, trace=ctx.trace, matcher=matcher)
+
+
+def memory_recall(ctx: NudgeContext):
+    # Regret memories are only used to personalise impulsive nudges on plans with history
+    if not (ctx.impulse["is_impulsive"] and ctx.plan_features.get("nudge_history")):
+        return
+    query = ctx.payload.get("pattern") or ctx.payload.get("spending_intent") or ctx.payload.get("item_name")
+    if not query:
+        return
+    try:
+        from memory import semantic_search_recent_memories
+        ctx.memories = [doc for doc, _ in semantic_search_recent_memories(ctx.user_id, query, n_results=3)]
+    except Exception:
+        logger.exception("Memory recall failed for user %s", ctx.user_id)
+        ctx.memories = []
+
+
+def persuasion(ctx: NudgeContext):
+    ctx.earn = run_earn_persuasion(ctx.payload, ctx.plan_features.get("ai_tone", "basic"))
+
+
+def render(ctx: NudgeContext):
+    impulse = ctx.impulse
+    if impulse["is_impulsive"]:
+        ctx.persuasion_mode = True
+        ctx.nudge_message = PLAN_NUDGE_MESSAGES.get(ctx.plan, DEFAULT_NUDGE_MESSAGE)
+        plan_features = {k: v for k, v in ctx.plan_features.items() if k != "fallback_responses"}
+    else:
+        ctx.persuasion_mode = False
+        ctx.nudge_message = ctx.plan_features.get("fallback_responses", [DEFAULT_FALLBACK_MESSAGE])[0]
+        plan_features = ctx.plan_features
+
+    ctx.response = {
+        "plan": ctx.plan,
+        "plan_features": plan_features,
+        "impulse": {
+            "total_triggers": impulse["total_triggers"],
+            "is_impulsive": impulse["is_impulsive"],
+            "triggered_flags": impulse["triggered_flags"],
+        },
+        "earn": ctx.earn,
+        "persuasion_mode": ctx.persuasion_mode,
+        "nudge_message": ctx.nudge_message,
+        "payload": ctx.payload,
+    }
+    if ctx.memories:
+        ctx.response["memories"] = ctx.memories
+
+
+def log(ctx: NudgeContext):
+    # Only impulsive nudges count towards the monthly quota
+    if not ctx.persuasion_mode:
+        return
+    if ctx.nudge_limit:
+        # A concurrent request may have taken the last slot since quota_check
+        count = nudge_quota.reserve(ctx.user_id, ctx.db, ctx.nudge_limit)
+        if count is None:
+            ctx.nudge_count = ctx.nudge_limit
+            _quota_reached(ctx)
+            return
+        ctx.nudge_count = count
+    log_nudge(ctx.db, ctx.user_id, ctx.payload.get("spending_intent") or ctx.payload.get("item_name"), ctx.nudge_message, ctx.plan, ctx.source,
+              quota_reserved=bool(ctx.nudge_limit))
+
+
+Stage = Tuple[str, Callable[[NudgeContext], None]]
+
+DEFAULT_STAGES: List[Stage] = [
+    ("load_user", load_user),
+    ("quota_check", quota_check),
+    ("impulse_scan", impulse_scan),
+    ("memory_recall", memory_recall),
+    ("persuasion", persuasion),
+    ("render", render),
+    ("log", log),
+]
+
+
+class StageStats:
+    """Process-wide call counts and cumulative time per stage."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, float]] = {}
+
+    def record(self, stage: str, elapsed_ms: float):
+        with self._lock:
+            entry = self._stats.setdefault(stage, {"calls": 0, "total_ms": 0.0, "max_ms": 0.0})
+            entry["calls"] += 1
+            entry["total_ms"] += elapsed_ms
+            entry["max_ms"] = max(entry["max_ms"], elapsed_ms)
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            return {
+                stage: {
+                    "calls": entry["calls"],
+                    "total_ms": round(entry["total_ms"], 3),
+                    "avg_ms": round(entry["total_ms"] / entry["calls"], 3) if entry["calls"] else 0.0,
+                    "max_ms": round(entry["max_ms"], 3),
+                }
+                for stage, entry in self._stats.items()
+            }
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+
+class NudgePipeline:
+    def __init__(self, stages: Optional[List[Stage]] = None, stats: Optional[StageStats] = None):
+        self.stages: List[Stage] = list(stages or DEFAULT_STAGES)
+        self.stats = stats or StageStats()
+
+    def replace(self, name: str, fn: Callable[[NudgeContext], None]):
+        """Swap the implementation of a named stage."""
+        for i, (stage_name, _) in enumerate(self.stages):
+            if stage_name == name:
+                self.stages[i] = (name, fn)
+                return
+        raise KeyError(f"Unknown nudge pipeline stage: {name}")
+
+    def run(self, ctx: NudgeContext) -> NudgeContext:
+        clock = time.perf_counter
+        for name, fn in self.stages:
+            if ctx.halted:
+                break
+            start = clock()
+            fn(ctx)
+            elapsed_ms = (clock() - start) * 1000
+            ctx.timings[name] = round(elapsed_ms, 3)
+            self.stats.record(name, elapsed_ms)
+        logger.debug("[NUDGE PIPELINE] user=%s source=%s timings=%s", ctx.user_id, ctx.source, ctx.timings)
+        return ctx
+
+
+DEFAULT_PIPELINE = NudgePipeline()
+
+
+def run_nudge(user_id: int, payload: Dict[str, Any], db: Session, source: str = "text", trace: bool = False, pipeline: Optional[NudgePipeline] = None) -> Dict[str, Any]:
+    """Run a nudge request through the pipeline and return the response dict.
+
+    With trace=True the response also carries `debug` with the impulse trace
+    and per-stage timings in milliseconds.
+    """
+    ctx = (pipeline or DEFAULT_PIPELINE).run(NudgeContext(user_id=user_id, payload=payload, db=db, source=source, trace=trace))
+    response = ctx.response or {}
+    if trace:
+        debug = dict((ctx.impulse or {}).get("debug") or {})
+        debug["nudge_count"] = ctx.nudge_count
+        debug["nudge_limit"] = ctx.nudge_limit
+        debug["timings_ms"] = ctx.timings
+        response["debug"] = debug
+    return response
+
+
+def pipeline_stats() -> Dict[str, Dict[str, float]]:
+    return DEFAULT_PIPELINE.stats.snapshot()
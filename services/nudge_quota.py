@@ -0,0 +1,230 @@
+"""Monthly nudge quota counters.
+
+Plans cap nudges per calendar month (plan_features nudge_limit). Instead of
+counting nudge_logs on every request, nudge_quota_usage keeps one counter
+row per (user, "YYYY-MM") period:
+
+- A before_flush hook bumps the counter for every NudgeLog written through
+  the ORM, in the same transaction, with an SQL-side increment. Concurrent
+  workers don't lose updates.
+- reserve() is the race-free quota check. It runs a conditional increment
+  (nudge_count + 1 <= limit) in the caller's transaction. The NudgeLog
+  written with it is marked so the hook doesn't count it twice. Two workers
+  racing for a user's last nudge can't both get it.
+- nudge_count() reads through a small in-process cache (NUDGE_QUOTA_CACHE_TTL
+  seconds). Counts only grow within a period, so a cached count at or over
+  the limit safely rejects without touching the database.
+
+A missing counter row is backfilled from nudge_logs the first time its
+period is seen, so the table can be created empty.
+"""
+from collections import OrderedDict, defaultdict
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+import os
+import threading
+import time
+
+from sqlalchemy import event, func, inspect, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from models import NudgeLog, NudgeQuotaUsage
+
+NUDGE_QUOTA_CACHE_TTL = float(os.getenv("NUDGE_QUOTA_CACHE_TTL", "5"))
+NUDGE_QUOTA_CACHE_SIZE = int(os.getenv("NUDGE_QUOTA_CACHE_SIZE", "10000"))
+
+# Set on a NudgeLog whose quota slot was already taken by reserve()
+RESERVED_ATTR = "_quota_reserved"
+# session.info key: {(user_id, period): count or None} to publish to the cache after commit
+_PENDING_KEY = "nudge_quota_pending"
+
+_table = NudgeQuotaUsage.__table__
+_tables_ready: Dict[str, bool] = {}
+
+
+def period_key(ts: Optional[datetime] = None) -> str:
+    return (ts or datetime.utcnow()).strftime("%Y-%m")
+
+
+def _period_bounds(period: str) -> Tuple[datetime, datetime]:
+    start = datetime.strptime(period, "%Y-%m")
+    end = datetime(start.year + 1, 1, 1) if start.month == 12 else datetime(start.year, start.month + 1, 1)
+    return start, end
+
+
+class QuotaCache:
+    """LRU of (user_id, period) -> nudge count with a TTL; thread-safe."""
+
+    def __init__(self, max_entries: int = NUDGE_QUOTA_CACHE_SIZE, ttl: float = NUDGE_QUOTA_CACHE_TTL):
+        self.max_entries = max(1, max_entries)
+        self.ttl = ttl
+        self._entries: "OrderedDict[Tuple[int, str], Tuple[int, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Tuple[int, str]) -> Optional[int]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] < time.monotonic():
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: Tuple[int, str], count: int):
+        with self._lock:
+            self._entries[key] = (count, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key: Tuple[int, str]):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses, "ttl": self.ttl}
+
+
+QUOTA_CACHE = QuotaCache()
+
+
+def _quota_table_exists(session: Session) -> bool:
+    bind = session.get_bind()
+    key = str(bind.url)
+    ready = _tables_ready.get(key)
+    if ready is None:
+        ready = inspect(bind).has_table(_table.name)
+        _tables_ready[key] = ready
+    return ready
+
+
+def _logged_count(session: Session, user_id: int, period: str) -> int:
+    start, end = _period_bounds(period)
+    return session.query(func.count(NudgeLog.id)).filter(
+        NudgeLog.user_id == user_id, NudgeLog.timestamp >= start, NudgeLog.timestamp < end
+    ).scalar() or 0
+
+
+def _insert_backfilled(session: Session, user_id: int, period: str):
+    """Create the counter row from the period's logs unless another writer already has."""
+    values = {"user_id": user_id, "period": period, "nudge_count": _logged_count(session, user_id, period), "updated_at": datetime.utcnow()}
+    dialect = session.get_bind().dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        session.execute(insert(_table).values(**values).on_conflict_do_nothing(index_elements=["user_id", "period"]))
+        return
+    try:
+        with session.begin_nested():
+            session.execute(_table.insert().values(**values))
+    except IntegrityError:
+        pass
+
+
+def _increment(session: Session, user_id: int, period: str, delta: int, limit: Optional[int] = None) -> bool:
+    """Add delta to the counter (only while it stays within limit); False when the limit would be exceeded."""
+    stmt = update(_table).where(_table.c.user_id == user_id, _table.c.period == period)
+    if limit is not None:
+        stmt = stmt.where(_table.c.nudge_count + delta <= limit)
+    stmt = stmt.values(nudge_count=_table.c.nudge_count + delta, updated_at=datetime.utcnow())
+    if session.execute(stmt).rowcount:
+        return True
+    if session.execute(select(_table.c.user_id).where(_table.c.user_id == user_id, _table.c.period == period)).first():
+        return False  # row exists: the limit is reached
+    _insert_backfilled(session, user_id, period)
+    return bool(session.execute(stmt).rowcount)
+
+
+def _mark_pending(session: Session, key: Tuple[int, str], count: Optional[int] = None):
+    session.info.setdefault(_PENDING_KEY, {})[key] = count
+
+
+def nudge_count(user_id: int, db: Session, period: Optional[str] = None) -> int:
+    """Nudges logged for the user in the period (default: this month)."""
+    key = (user_id, period or period_key())
+    cached = QUOTA_CACHE.get(key)
+    if cached is not None:
+        return cached
+    if not _quota_table_exists(db):
+        return _logged_count(db, *key)
+    count = db.execute(select(_table.c.nudge_count).where(_table.c.user_id == key[0], _table.c.period == key[1])).scalar()
+    if count is None:
+        # First look at this period: backfill in its own transaction
+        with Session(bind=db.get_bind()) as session:
+            _insert_backfilled(session, *key)
+            session.commit()
+        count = db.execute(select(_table.c.nudge_count).where(_table.c.user_id == key[0], _table.c.period == key[1])).scalar() or 0
+    QUOTA_CACHE.put(key, count)
+    return count
+
+
+def reserve(user_id: int, db: Session, limit: int) -> Optional[int]:
+    """Take one nudge from this month's quota in db's transaction; the new count, or None when the limit is reached.
+
+    The slot is released if the transaction rolls back. Log the nudge in the
+    same transaction with log_nudge(..., quota_reserved=True).
+    """
+    key = (user_id, period_key())
+    cached = QUOTA_CACHE.get(key)
+    if cached is not None and cached >= limit:
+        return None
+    if not _quota_table_exists(db):
+        count = _logged_count(db, *key)
+        return count + 1 if count < limit else None
+    taken = _increment(db, user_id, key[1], 1, limit=limit)
+    count = db.execute(select(_table.c.nudge_count).where(_table.c.user_id == user_id, _table.c.period == key[1])).scalar() or 0
+    if not taken:
+        if key in db.info.get(_PENDING_KEY, {}):
+            _mark_pending(db, key, count)  # includes this transaction's own reservations
+        else:
+            QUOTA_CACHE.put(key, count)
+        return None
+    _mark_pending(db, key, count)
+    return count
+
+
+def quota_cache_stats() -> Dict:
+    return QUOTA_CACHE.stats()
+
+
+@event.listens_for(Session, "before_flush")
+def _count_nudge_logs(session: Session, flush_context, instances):
+    deltas = defaultdict(int)
+    now = datetime.utcnow()
+    for obj in session.new:
+        if isinstance(obj, NudgeLog) and obj.user_id is not None and not getattr(obj, RESERVED_ATTR, False):
+            if obj.timestamp is None:
+                obj.timestamp = now
+            deltas[(obj.user_id, period_key(obj.timestamp))] += 1
+    if not deltas or not _quota_table_exists(session):
+        return
+    with session.no_autoflush:
+        for (user_id, period), delta in deltas.items():
+            _increment(session, user_id, period, delta)
+            _mark_pending(session, (user_id, period))
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_counts(session: Session):
+    for key, count in session.info.pop(_PENDING_KEY, {}).items():
+        if count is None:
+            QUOTA_CACHE.invalidate(key)
+        else:
+            QUOTA_CACHE.put(key, count)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_counts(session: Session):
+    session.info.pop(_PENDING_KEY, None)
@@ -0,0 +1,38 @@
+"""ONNX int8 embedder vs SentenceTransformer: cosine agreement on the benchmark corpus.
+
+Run with pytest. Skipped unless onnxruntime, sentence-transformers, the
+exported model (scripts/export_onnx_embedder.py, EMBEDDER_ONNX_PATH) and
+the reference model are all available.
+"""
+import os
+
+import pytest
+
+pytest.importorskip("onnxruntime")
+pytest.importorskip("tokenizers")
+sentence_transformers = pytest.importorskip("sentence_transformers")
+
+from benchmarks.corpus import generate_memory_texts
+from benchmarks.embedder_parity import parity
+from utils.embedder_backends import EMBEDDER_ONNX_PATH, ONNX_MODEL_FILE, OnnxEmbedder
+
+MIN_COSINE = 0.98
+MIN_TOP1_AGREEMENT = 0.9
+
+
+@pytest.fixture(scope="module")
+def embeddings():
+    if not os.path.exists(os.path.join(EMBEDDER_ONNX_PATH, ONNX_MODEL_FILE)):
+        pytest.skip(f"No ONNX model at {EMBEDDER_ONNX_PATH}; run scripts/export_onnx_embedder.py")
+    try:
+        reference_model = sentence_transformers.SentenceTransformer("all-MiniLM-L6-v2")
+    except Exception as e:
+        pytest.skip(f"Reference model unavailable: {e}")
+    texts = generate_memory_texts(300, 42)
+    return reference_model.encode(texts), OnnxEmbedder(EMBEDDER_ONNX_PATH).encode(texts)
+
+
+def test_onnx_matches_pytorch_cosine(embeddings):
+    report = parity(*embeddings, queries=100)
+    assert report["cosine_min"] >= MIN_COSINE, report
+    assert report["top1_agreement"] >= MIN_TOP1_AGREEMENT, report
@@ -6,9 +6,9 @@ print('Storing memory 2...')
 store_memory(1, "User usually avoids luxury purchases during weekdays.")
 
 print('Searching for "headphones"...')
-result1 = search_memory("headphones")
+result1 = search_memory("headphones", user_id=1)
 print('Result:', result1)
 
 print('Searching for "luxury purchases"...')
-result2 = search_memory("luxury purchases")
+result2 = search_memory("luxury purchases", user_id=1)
 print('Result:', result2)
@@ -0,0 +1,100 @@
+"""Compaction followed by re-indexing from the outbox.
+
+Run with pytest. Uses a throwaway SQLite database, a persistent Chroma
+client in a temp directory and a deterministic stand-in for the embedding
+model, so no server or model download is needed.
+"""
+from datetime import datetime, timedelta
+import hashlib
+
+import numpy as np
+import pytest
+
+chromadb = pytest.importorskip("chromadb")
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import memory
+import models
+from services import memory_indexer
+from services.chroma_service import CollectionRouter
+from services.embedding_batcher import EmbeddingBatcher
+from services.memory_compaction import run_compaction
+from utils.embedding_cache import EmbeddingCache
+from utils.memory_ids import new_memory_id
+
+
+class TopicEmbedder:
+    """Texts sharing the words before " v" get near-identical unit vectors."""
+
+    def encode(self, texts):
+        vectors = []
+        for text in texts:
+            topic, _, variant = text.partition(" v")
+            base = np.random.default_rng(int(hashlib.sha1(topic.encode()).hexdigest()[:8], 16)).standard_normal(16)
+            noise = np.random.default_rng(int(hashlib.sha1(variant.encode()).hexdigest()[:8], 16)).standard_normal(16)
+            vector = base + 0.01 * noise
+            vectors.append(vector / np.linalg.norm(vector))
+        return np.asarray(vectors, dtype=np.float32)
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    client = chromadb.PersistentClient(path=str(tmp_path / "chroma"))
+    embedder = TopicEmbedder()
+    monkeypatch.setattr(memory, "chroma_client", client)
+    monkeypatch.setattr(memory, "collection_router", CollectionRouter(client, sharding="user"))
+    monkeypatch.setattr(memory, "collection", client.get_or_create_collection("finivo_memory"))
+    monkeypatch.setattr(memory, "embedder", embedder)
+    monkeypatch.setattr(memory, "embedding_cache", EmbeddingCache("test"))
+    monkeypatch.setattr(memory, "embedding_batcher", EmbeddingBatcher(embedder.encode, max_wait_ms=0))
+    for name in ("vector_index", "lexical_index", "projection", "full_vectors"):
+        monkeypatch.setattr(memory, name, None)
+    engine = create_engine(f"sqlite:///{tmp_path / 'memories.db'}")
+    models.Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    session.add(models.User(id=1, name="test", email="test@example.com", plan="essential"))
+    session.commit()
+    yield session
+    session.close()
+
+
+def _store(db, content, days_ago=0):
+    row = models.UserMemory(user_id=1, content=content, timestamp=datetime.utcnow() - timedelta(days=days_ago), memory_uid=new_memory_id())
+    db.add(row)
+    memory_indexer.enqueue(db, row)
+    db.commit()
+    return row
+
+
+def test_fresh_duplicate_of_expired_memory_survives(db):
+    _store(db, "bought a gucci bag", days_ago=200)
+    memory_indexer.drain(db)
+    fresh = _store(db, "bought a gucci bag")
+    memory_indexer.drain(db)
+
+    report = run_compaction(db, user_ids=[1])
+    assert report["sql_rows_after"] == 1
+    assert report["sql_rows_requeued"] == 1
+    assert db.get(models.UserMemory, fresh.id).content == "bought a gucci bag"
+
+    assert memory_indexer.drain(db)["failed"] == 0
+    assert memory.search_memory("gucci bag", user_id=1) == [["bought a gucci bag"]]
+
+
+def test_reembed_after_merging_near_duplicates(db):
+    for variant in ("shoes v1", "shoes v2", "shoes v3", "rent paid"):
+        _store(db, variant)
+    memory_indexer.drain(db)
+
+    report = run_compaction(db, user_ids=[1])
+    assert report["merged"] == 2
+    assert report["sql_rows_repointed"] == 2
+
+    memory_indexer.reembed(db, [1])
+    counts = memory_indexer.drain(db)
+    assert counts["failed"] == 0
+    assert db.query(models.MemoryOutbox).count() == 0
+    assert memory.collection_router.for_user(1).count() == 2
+    assert len(memory.search_memory("shoes v9", user_id=1)[0]) == 2
@@ -0,0 +1,76 @@
+"""Embedding model backends for memory.py.
+
+EMBEDDER_BACKEND picks the implementation:
+    sentence-transformers  PyTorch SentenceTransformer (default)
+    onnx                   int8-quantized ONNX Runtime export of the same model
+
+The ONNX backend needs only onnxruntime and tokenizers at runtime. Build its
+model directory once with scripts/export_onnx_embedder.py and point
+EMBEDDER_ONNX_PATH at it. Both backends expose encode(texts) -> float32 array,
+mean-pooled and L2-normalized like all-MiniLM-L6-v2. Use
+benchmarks/embedder_parity.py to check cosine parity before switching.
+"""
+from typing import List, Sequence
+import logging
+import os
+
+import numpy as np
+
+logger = logging.getLogger("embedder_backends")
+
+EMBEDDER_BACKEND = os.getenv("EMBEDDER_BACKEND", "sentence-transformers").lower()
+EMBEDDER_ONNX_PATH = os.getenv("EMBEDDER_ONNX_PATH", "models/all-MiniLM-L6-v2-onnx-int8")
+ONNX_MODEL_FILE = "model_int8.onnx"
+ONNX_MAX_LENGTH = 256  # all-MiniLM-L6-v2 max_seq_length
+ONNX_BATCH_SIZE = 32
+
+
+class OnnxEmbedder:
+    """Mean-pooled, normalized sentence embeddings from an ONNX Runtime session."""
+
+    def __init__(self, model_dir: str = EMBEDDER_ONNX_PATH, model_file: str = ONNX_MODEL_FILE, max_length: int = ONNX_MAX_LENGTH):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=max_length)
+        self.tokenizer.enable_padding(pad_id=0, pad_token="[PAD]")
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = int(os.getenv("OMP_NUM_THREADS", "1"))
+        self.session = ort.InferenceSession(os.path.join(model_dir, model_file), options, providers=["CPUExecutionProvider"])
+        self._inputs = {i.name for i in self.session.get_inputs()}
+
+    def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch(texts)
+        input_ids = np.array([e.ids for e in encodings], dtype=np.int64)
+        attention_mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+        feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self._inputs:
+            feeds["token_type_ids"] = np.array([e.type_ids for e in encodings], dtype=np.int64)
+        hidden = self.session.run(None, feeds)[0]
+        mask = attention_mask[..., None].astype(np.float32)
+        pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        return pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+
+    def encode(self, texts: Sequence[str], batch_size: int = ONNX_BATCH_SIZE) -> np.ndarray:
+        texts = list(texts)
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        batches = [self._encode_batch(texts[i:i + batch_size]) for i in range(0, len(texts), batch_size)]
+        return np.vstack(batches).astype(np.float32)
+
+
+def load_embedder(model_name: str, backend: str = EMBEDDER_BACKEND):
+    """Return an object with encode(texts) for the configured backend."""
+    if backend == "onnx":
+        logger.info("Loading ONNX int8 embedder from %s", EMBEDDER_ONNX_PATH)
+        return OnnxEmbedder(EMBEDDER_ONNX_PATH)
+    if backend in ("sentence-transformers", "torch"):
+        from sentence_transformers import SentenceTransformer
+        return SentenceTransformer(model_name)
+    raise ValueError(f"Unknown EMBEDDER_BACKEND: {backend}")
+
+
+def cache_model_name(model_name: str, backend: str = EMBEDDER_BACKEND) -> str:
+    """Embedding cache namespace; vectors from different backends must not be mixed."""
+    return model_name if backend in ("sentence-transformers", "torch") else f"{model_name}:{backend}"
@@ -0,0 +1,229 @@
+"""Two-tier cache for SentenceTransformer text embeddings.
+
+Entries are keyed by (model name, SHA-256 of the whitespace-normalized text).
+The memory tier is a bounded LRU of float32 vectors. The optional disk tier
+is a fixed-capacity ring of memory-mapped vectors under EMBEDDING_CACHE_DIR.
+It survives restarts, and once full it overwrites the oldest entries.
+
+Each process should point EMBEDDING_CACHE_DIR at its own directory: the
+memmap files are not safe for several writers.
+"""
+from typing import Callable, Dict, List, Optional, Sequence
+from collections import OrderedDict
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+
+import numpy as np
+
+logger = logging.getLogger("embedding_cache")
+
+# EMBEDDING_CACHE_SIZE=0 disables the memory tier; the disk tier is off unless EMBEDDING_CACHE_DIR is set
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "2048"))
+EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR")
+EMBEDDING_CACHE_DISK_ENTRIES = int(os.getenv("EMBEDDING_CACHE_DISK_ENTRIES", "100000"))
+EMBEDDING_CACHE_DTYPE = os.getenv("EMBEDDING_CACHE_DTYPE", "float32")
+
+_DIGEST_SIZE = 32
+
+
+def text_digest(model_name: str, text: str) -> bytes:
+    """Cache key for a text: whitespace is collapsed, case is kept (it can change the embedding)."""
+    normalized = " ".join(text.split())
+    return hashlib.sha256(f"{model_name}\x00{normalized}".encode("utf-8")).digest()
+
+
+class DiskEmbeddingStore:
+    """Fixed-capacity ring of embeddings in memory-mapped files.
+
+    Three files share a prefix: .vectors (capacity x dim), .keys (capacity x
+    32-byte digests) and .seq (write sequence per slot, 0 = empty). The
+    digest -> slot index is rebuilt from .keys when the store is opened.
+    """
+
+    def __init__(self, directory: str, model_name: str, capacity: int, dtype: str = "float32"):
+        self.directory = directory
+        self.prefix = os.path.join(directory, re.sub(r"[^A-Za-z0-9._-]", "_", model_name))
+        self.capacity = capacity
+        self.dtype = np.dtype(dtype)
+        self.dim: Optional[int] = None
+        self._vectors = self._keys = self._seq = None
+        self._index: Dict[bytes, int] = {}
+        self._counter = 0
+        self._open_existing()
+
+    def _header_path(self) -> str:
+        return self.prefix + ".json"
+
+    def _open_existing(self):
+        try:
+            with open(self._header_path()) as f:
+                header = json.load(f)
+        except (OSError, ValueError):
+            return
+        if header.get("capacity") != self.capacity or header.get("dtype") != self.dtype.name:
+            logger.info("Embedding disk cache at %s has a different layout, starting fresh", self.prefix)
+            return
+        try:
+            self._map(int(header["dim"]), mode="r+")
+        except (OSError, ValueError, KeyError):
+            logger.exception("Could not open embedding disk cache at %s, starting fresh", self.prefix)
+            self._vectors = self._keys = self._seq = None
+            self.dim = None
+            return
+        for slot in np.flatnonzero(self._seq):
+            self._index[self._keys[slot].tobytes()] = int(slot)
+        self._counter = int(self._seq.max()) if self.capacity else 0
+
+    def _map(self, dim: int, mode: str):
+        self.dim = dim
+        self._vectors = np.memmap(self.prefix + ".vectors", dtype=self.dtype, mode=mode, shape=(self.capacity, dim))
+        self._keys = np.memmap(self.prefix + ".keys", dtype=np.uint8, mode=mode, shape=(self.capacity, _DIGEST_SIZE))
+        self._seq = np.memmap(self.prefix + ".seq", dtype=np.int64, mode=mode, shape=(self.capacity,))
+
+    def _create(self, dim: int):
+        os.makedirs(self.directory, exist_ok=True)
+        self._map(dim, mode="w+")
+        with open(self._header_path(), "w") as f:
+            json.dump({"dim": dim, "capacity": self.capacity, "dtype": self.dtype.name}, f)
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def get(self, digest: bytes) -> Optional[np.ndarray]:
+        slot = self._index.get(digest)
+        if slot is None:
+            return None
+        return np.array(self._vectors[slot], dtype=np.float32)
+
+    def put(self, digest: bytes, vector: np.ndarray) -> bool:
+        """Store a vector; returns True when an older entry was overwritten."""
+        if self.capacity <= 0:
+            return False
+        if self.dim is None:
+            self._create(vector.shape[0])
+        elif vector.shape[0] != self.dim:
+            return False
+        slot = self._index.get(digest)
+        evicted = False
+        if slot is None:
+            slot = self._counter % self.capacity
+            if self._seq[slot]:
+                self._index.pop(self._keys[slot].tobytes(), None)
+                evicted = True
+            self._counter += 1
+            self._keys[slot] = np.frombuffer(digest, dtype=np.uint8)
+            self._seq[slot] = self._counter
+            self._index[digest] = slot
+        self._vectors[slot] = vector
+        return evicted
+
+    def flush(self):
+        for mapped in (self._vectors, self._keys, self._seq):
+            if mapped is not None:
+                mapped.flush()
+
+
+class EmbeddingCache:
+    """Memory LRU in front of an optional DiskEmbeddingStore, with hit/miss counters."""
+
+    def __init__(self, model_name: str, maxsize: int = EMBEDDING_CACHE_SIZE, disk_dir: Optional[str] = EMBEDDING_CACHE_DIR,
+                 disk_entries: int = EMBEDDING_CACHE_DISK_ENTRIES, disk_dtype: str = EMBEDDING_CACHE_DTYPE):
+        self.model_name = model_name
+        self.maxsize = maxsize
+        self._data: "OrderedDict[bytes, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.disk = DiskEmbeddingStore(disk_dir, model_name, disk_entries, disk_dtype) if disk_dir and disk_entries > 0 else None
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.disk_evictions = 0
+
+    def _remember(self, digest: bytes, vector: np.ndarray):
+        if self.maxsize <= 0:
+            return
+        self._data[digest] = vector
+        self._data.move_to_end(digest)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def get(self, digest: bytes) -> Optional[np.ndarray]:
+        with self._lock:
+            vector = self._data.get(digest)
+            if vector is not None:
+                self._data.move_to_end(digest)
+                self.memory_hits += 1
+                return vector
+            if self.disk is not None:
+                vector = self.disk.get(digest)
+                if vector is not None:
+                    self._remember(digest, vector)
+                    self.disk_hits += 1
+                    return vector
+            self.misses += 1
+            return None
+
+    def put(self, digest: bytes, vector: np.ndarray):
+        vector = np.asarray(vector, dtype=np.float32)
+        with self._lock:
+            self._remember(digest, vector)
+            if self.disk is not None and self.disk.put(digest, vector):
+                self.disk_evictions += 1
+
+    def _lookup(self, texts: Sequence[str]):
+        digests = [text_digest(self.model_name, text) for text in texts]
+        vectors: List[Optional[np.ndarray]] = [self.get(d) for d in digests]
+        missing: Dict[bytes, List[int]] = {}
+        for i, vector in enumerate(vectors):
+            if vector is None:
+                missing.setdefault(digests[i], []).append(i)
+        return vectors, missing
+
+    def _fill(self, vectors: List[Optional[np.ndarray]], missing: Dict[bytes, List[int]], encoded) -> np.ndarray:
+        encoded = np.asarray(encoded, dtype=np.float32)
+        for (digest, idx), vector in zip(missing.items(), encoded):
+            self.put(digest, vector)
+            for i in idx:
+                vectors[i] = vector
+        if not vectors:
+            return np.zeros((0, 0), dtype=np.float32)
+        return np.vstack(vectors)
+
+    def encode(self, texts: Sequence[str], encode_fn: Callable[[List[str]], np.ndarray]) -> np.ndarray:
+        """Embed texts, calling encode_fn once with only the texts that were not cached."""
+        vectors, missing = self._lookup(texts)
+        encoded = encode_fn([texts[idx[0]] for idx in missing.values()]) if missing else []
+        return self._fill(vectors, missing, encoded)
+
+    def flush(self):
+        with self._lock:
+            if self.disk is not None:
+                self.disk.flush()
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.memory_hits = self.disk_hits = self.misses = self.evictions = self.disk_evictions = 0
+
+    def stats(self) -> Dict:
+        with self._lock:
+            hits = self.memory_hits + self.disk_hits
+            lookups = hits + self.misses
+            return {
+                "model": self.model_name,
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "disk_size": len(self.disk) if self.disk is not None else 0,
+                "disk_capacity": self.disk.capacity if self.disk is not None else 0,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "disk_evictions": self.disk_evictions,
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            }
@@ -0,0 +1,82 @@
+"""Reduced-dimension storage for memory embeddings.
+
+With MEMORY_EMBEDDING_DIM set (e.g. 128), the vector index stores
+projected vectors instead of the model's full 384 dimensions.
+MEMORY_EMBEDDING_REDUCTION picks the method:
+
+    pca       project onto the top principal components fitted by
+              scripts/fit_embedding_projection.py (saved to MEMORY_PCA_PATH)
+    truncate  keep the first dimensions (Matryoshka-style; only accurate for
+              models trained for it, which all-MiniLM-L6-v2 is not)
+
+Projected vectors are renormalized to unit length, so "similarity =
+1 - distance" still holds approximately. memory.py searches the reduced
+index for MEMORY_RERANK_FACTOR x n_results candidates. It then re-ranks
+them with exact distances on the full-precision vectors, which are written
+per memory id to MEMORY_FULL_VECTOR_DIR (float32, utils.vector_index
+files) when the memory is stored. Only memories stored before that get
+re-encoded. Changing these settings needs scripts/reembed_memories.py.
+"""
+from typing import Optional
+import os
+
+import numpy as np
+
+# 0 stores the model's full dimension (no projection, no re-ranking)
+MEMORY_EMBEDDING_DIM = int(os.getenv("MEMORY_EMBEDDING_DIM", "0"))
+MEMORY_EMBEDDING_REDUCTION = os.getenv("MEMORY_EMBEDDING_REDUCTION", "pca").lower()
+MEMORY_PCA_PATH = os.getenv("MEMORY_PCA_PATH", "models/memory_pca.npz")
+MEMORY_RERANK_FACTOR = int(os.getenv("MEMORY_RERANK_FACTOR", "4"))
+MEMORY_FULL_VECTOR_DIR = os.getenv("MEMORY_FULL_VECTOR_DIR", "memory_full_vectors")
+
+
+def _unit(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+class EmbeddingProjection:
+    def __init__(self, dim: int, method: str = "truncate", mean: Optional[np.ndarray] = None, components: Optional[np.ndarray] = None):
+        if method not in ("pca", "truncate"):
+            raise ValueError(f"Unknown MEMORY_EMBEDDING_REDUCTION: {method}")
+        if method == "pca" and (components is None or len(components) < dim):
+            raise ValueError(f"PCA projection needs at least {dim} fitted components")
+        self.dim = dim
+        self.method = method
+        self.mean = None if mean is None else np.asarray(mean, dtype=np.float32)
+        self.components = None if components is None else np.asarray(components[:dim], dtype=np.float32)
+
+    @classmethod
+    def fit_pca(cls, vectors, dim: int) -> "EmbeddingProjection":
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if len(vectors) < dim:
+            raise ValueError(f"Need at least {dim} vectors to fit {dim} components, got {len(vectors)}")
+        mean = vectors.mean(axis=0)
+        _, _, vt = np.linalg.svd(vectors - mean, full_matrices=False)
+        return cls(dim, "pca", mean, vt[:dim])
+
+    def __call__(self, vectors) -> np.ndarray:
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if self.method == "truncate":
+            return _unit(vectors[:, :self.dim])
+        return _unit((vectors - self.mean) @ self.components.T)
+
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        np.savez(path, mean=self.mean, components=self.components)
+
+    @classmethod
+    def load(cls, path: str, dim: int) -> "EmbeddingProjection":
+        data = np.load(path)
+        return cls(dim, "pca", data["mean"], data["components"])
+
+
+def load_projection(dim: int = MEMORY_EMBEDDING_DIM, method: str = MEMORY_EMBEDDING_REDUCTION, path: str = MEMORY_PCA_PATH) -> Optional[EmbeddingProjection]:
+    """The configured projection, or None when full-dimension vectors are stored."""
+    if dim <= 0:
+        return None
+    if method == "pca":
+        if not os.path.exists(path):
+            raise RuntimeError(f"MEMORY_EMBEDDING_DIM={dim} with PCA needs {path}; run scripts/fit_embedding_projection.py")
+        return EmbeddingProjection.load(path, dim)
+    return EmbeddingProjection(dim, method)
@@ -0,0 +1,223 @@
+"""Incremental per-user behavioral features for the impulse engine.
+
+A before_flush hook keeps user_behavior_features and user_daily_spend in step
+with every SpendingLog / NudgeLog written through the ORM, in the same
+transaction. Counters on existing rows are bumped with SQL-side increments
+(col = col + n), so concurrent workers don't lose updates. Reading a user's
+features is a primary-key lookup plus at most 30 daily rows, independent of
+how many logs the user has.
+
+Users without a features row yet are backfilled from their logs the first
+time they are seen. New rows are inserted with ON CONFLICT DO NOTHING, so
+two workers writing a user's first log (or a day's first spend) don't fail
+on the primary key.
+"""
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict
+
+from sqlalchemy import case, event, func, inspect, or_, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.util import identity_key
+
+from models import NudgeLog, SpendingLog, UserBehaviorFeatures, UserDailySpend
+
+ROLLING_WINDOWS = (7, 30)
+
+_features = UserBehaviorFeatures.__table__
+_daily = UserDailySpend.__table__
+
+# Per-engine cache of whether the feature tables exist (tests may bind
+# sessions to engines that only have a subset of the tables).
+_tables_ready: Dict[str, bool] = {}
+
+
+def _feature_tables_exist(session: Session) -> bool:
+    bind = session.get_bind()
+    key = str(bind.url)
+    ready = _tables_ready.get(key)
+    if ready is None:
+        insp = inspect(bind)
+        ready = insp.has_table(UserBehaviorFeatures.__tablename__) and insp.has_table(UserDailySpend.__tablename__)
+        _tables_ready[key] = ready
+    return ready
+
+
+def _insert_ignore(session: Session, table, values: Dict) -> bool:
+    """INSERT unless the primary key already exists (another worker may have inserted it); True if inserted."""
+    dialect = session.get_bind().dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        return bool(session.execute(insert(table).values(**values).on_conflict_do_nothing()).rowcount)
+    try:
+        with session.begin_nested():
+            session.execute(table.insert().values(**values))
+        return True
+    except IntegrityError:
+        return False
+
+
+def _expire_cached(session: Session, model, key):
+    # Rows are changed with Core statements; drop stale copies from the identity map
+    obj = session.identity_map.get(identity_key(model, key))
+    if obj is not None:
+        session.expire(obj)
+
+
+def _backfill_row(session: Session, user_id: int) -> bool:
+    """Create the features row (and recent daily spend rows) from the user's existing logs.
+
+    Returns False if the row already existed, e.g. because a concurrent
+    worker created it first.
+    """
+    purchase_count, last_purchase_at = session.query(
+        func.count(SpendingLog.id), func.max(SpendingLog.timestamp)
+    ).filter(SpendingLog.user_id == user_id).one()
+    regret_count = session.query(func.count(SpendingLog.id)).filter(
+        SpendingLog.user_id == user_id, SpendingLog.regret == True  # noqa: E712
+    ).scalar()
+    nudge_count, last_nudge_at = session.query(
+        func.count(NudgeLog.id), func.max(NudgeLog.timestamp)
+    ).filter(NudgeLog.user_id == user_id).one()
+
+    inserted = _insert_ignore(session, _features, {
+        "user_id": user_id,
+        "purchase_count": purchase_count or 0,
+        "regret_count": regret_count or 0,
+        "last_purchase_at": last_purchase_at,
+        "nudge_count": nudge_count or 0,
+        "last_nudge_at": last_nudge_at,
+        "updated_at": datetime.utcnow(),
+    })
+    if not inserted:
+        return False
+
+    since = datetime.combine(datetime.utcnow().date() - timedelta(days=max(ROLLING_WINDOWS)), datetime.min.time())
+    spend_day = func.date(SpendingLog.timestamp)
+    for day, amount in session.query(spend_day, func.sum(SpendingLog.amount)).filter(
+        SpendingLog.user_id == user_id, SpendingLog.timestamp >= since
+    ).group_by(spend_day):
+        if isinstance(day, str):
+            day = datetime.strptime(day, "%Y-%m-%d").date()
+        _insert_ignore(session, _daily, {"user_id": user_id, "day": day, "amount": amount or 0.0})
+    return True
+
+
+def _latest(current, candidate):
+    return candidate if current is None or candidate > current else current
+
+
+def _later_of(column, value):
+    return case((or_(column.is_(None), column < value), value), else_=column)
+
+
+def _update_features(session: Session, user_id: int, values: Dict) -> int:
+    return session.execute(
+        update(_features).where(_features.c.user_id == user_id).values(updated_at=datetime.utcnow(), **values)
+    ).rowcount
+
+
+@event.listens_for(Session, "before_flush")
+def _track_log_writes(session: Session, flush_context, instances):
+    deltas = defaultdict(lambda: defaultdict(int))
+    last_purchase = {}
+    last_nudge = {}
+    daily_spend = defaultdict(float)
+    now = datetime.utcnow()
+
+    for obj in session.new:
+        if isinstance(obj, SpendingLog) and obj.user_id is not None:
+            if obj.timestamp is None:
+                obj.timestamp = now
+            deltas[obj.user_id]["purchase_count"] += 1
+            if obj.regret:
+                deltas[obj.user_id]["regret_count"] += 1
+            last_purchase[obj.user_id] = _latest(last_purchase.get(obj.user_id), obj.timestamp)
+            daily_spend[(obj.user_id, obj.timestamp.date())] += obj.amount or 0.0
+        elif isinstance(obj, NudgeLog) and obj.user_id is not None:
+            if obj.timestamp is None:
+                obj.timestamp = now
+            deltas[obj.user_id]["nudge_count"] += 1
+            last_nudge[obj.user_id] = _latest(last_nudge.get(obj.user_id), obj.timestamp)
+
+    # Regret is usually set after the purchase was logged
+    for obj in session.dirty:
+        if isinstance(obj, SpendingLog) and obj.user_id is not None:
+            history = inspect(obj).attrs.regret.history
+            if history.has_changes():
+                before = bool(history.deleted[0]) if history.deleted else False
+                after = bool(history.added[0]) if history.added else False
+                if before != after:
+                    deltas[obj.user_id]["regret_count"] += 1 if after else -1
+
+    if not deltas or not _feature_tables_exist(session):
+        return
+
+    # SQL-side increments and conflict-free inserts: concurrent workers writing
+    # a user's first log (or a day's first spend) neither fail nor lose updates
+    with session.no_autoflush:
+        for user_id, user_deltas in deltas.items():
+            values = {attr: getattr(_features.c, attr) + delta for attr, delta in user_deltas.items() if delta}
+            if user_id in last_purchase:
+                values["last_purchase_at"] = _later_of(_features.c.last_purchase_at, last_purchase[user_id])
+            if user_id in last_nudge:
+                values["last_nudge_at"] = _later_of(_features.c.last_nudge_at, last_nudge[user_id])
+            if not values:
+                continue
+            if not _update_features(session, user_id, values):
+                # New user: the backfill counts logs already flushed, this flush's deltas go on top
+                _backfill_row(session, user_id)
+                _update_features(session, user_id, values)
+            _expire_cached(session, UserBehaviorFeatures, user_id)
+        for (user_id, day), amount in daily_spend.items():
+            add = update(_daily).where(_daily.c.user_id == user_id, _daily.c.day == day).values(amount=_daily.c.amount + amount)
+            if not session.execute(add).rowcount and not _insert_ignore(session, _daily, {"user_id": user_id, "day": day, "amount": amount}):
+                session.execute(add)
+            _expire_cached(session, UserDailySpend, (user_id, day))
+
+
+def _ensure_backfilled(user_id: int, db: Session):
+    """Create the features row for a user from their logs, in its own transaction."""
+    with Session(bind=db.get_bind()) as session:
+        _backfill_row(session, user_id)
+        session.commit()
+
+
+def get_user_counters(user_id: int, db: Session) -> Dict:
+    """The user's counters without the rolling spend windows (one primary-key lookup).
+
+    last_purchase_days is whole days since the last logged purchase (None if
+    the user has none), matching the field scan_impulse_triggers reads.
+    """
+    row = db.get(UserBehaviorFeatures, user_id)
+    if row is None:
+        _ensure_backfilled(user_id, db)
+        row = db.get(UserBehaviorFeatures, user_id)
+    now = datetime.utcnow()
+    return {
+        "user_id": user_id,
+        "purchase_count": row.purchase_count if row else 0,
+        "regret_count": row.regret_count if row else 0,
+        "last_purchase_at": row.last_purchase_at if row else None,
+        "last_purchase_days": (now - row.last_purchase_at).days if row and row.last_purchase_at else None,
+        "nudge_count": row.nudge_count if row else 0,
+        "last_nudge_at": row.last_nudge_at if row else None,
+    }
+
+
+def get_user_features(user_id: int, db: Session) -> Dict:
+    """Return regret/purchase/nudge counters and rolling spend for a user."""
+    features = get_user_counters(user_id, db)
+    today = datetime.utcnow().date()
+    window_start = today - timedelta(days=max(ROLLING_WINDOWS) - 1)
+    days = db.query(UserDailySpend.day, UserDailySpend.amount).filter(
+        UserDailySpend.user_id == user_id, UserDailySpend.day >= window_start
+    ).all()
+    for window in ROLLING_WINDOWS:
+        start = today - timedelta(days=window - 1)
+        features[f"spend_{window}d"] = round(sum(amount or 0.0 for day, amount in days if day >= start), 2)
+    return features
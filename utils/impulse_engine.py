@@ -1,17 +1,332 @@
-from typing import List, Dict
-import re
+from typing import List, Dict, Iterable, Iterator, Optional, Sequence, Tuple
+from collections import Counter, OrderedDict, deque
+import itertools
+import logging
+import os
 import string
+import threading
+import time
+
+import numpy as np
+
+logger = logging.getLogger("impulse_engine")
+
+# Keyword lists used by the I.M.P.U.L.S.E. scan
+ESSENTIALS = ["groceries", "rent", "utilities", "medicine", "food", "transport", "bill", "gas", "water", "electric", "insurance"]
+LUXURY_KEYWORDS = ["sneaker", "designer", "gucci", "louis", "limited", "edition", "luxury", "bag", "watch", "jacket", "premium", "iphone", "macbook", "vacation", "trip", "sale", "exclusive", "collectible"]
+MOOD_KEYWORDS = ["sad", "anxious", "bored", "excited", "stressed", "angry", "lonely", "depressed", "fomo", "fear", "impulsive", "restless", "overwhelmed", "tired", "burned out"]
+URGENCY_KEYWORDS = ["urgent", "now", "today", "immediately", "last chance", "act fast", "only one", "limited time", "flash", "ending soon", "sold out", "must buy", "almost sold out", "only 1 left", "ends soon"]
+SITUATION_KEYWORDS = ["celebration", "peer", "pressure", "boredom", "stress", "argument", "fight", "reward", "treat", "deserve", "special", "emotional", "trigger", "event", "occasion", "everyone around me", "everyone else is", "buying new stuff"]
+VAGUE_EXPLANATIONS = ["just felt like it", "i dont know", "because i wanted to", "no reason", "just want", "cant explain", "idk", "impulse", "impulsively", "no solid reason", "felt like it", "just really want", "not sure why", "just want it", "feels right", "not sure", "just want", "probably dont need it", "probably dont need"]
+IMPULSE_KEYWORDS = LUXURY_KEYWORDS + MOOD_KEYWORDS + URGENCY_KEYWORDS + SITUATION_KEYWORDS + VAGUE_EXPLANATIONS + ["impulse", "impulsively", "regret", "splurge", "fomo", "treat", "sale", "exclusive", "scarcity", "limited", "must buy", "cant resist"]
+
+# Each soft-trigger keyword counts once per occurrence in IMPULSE_KEYWORDS
+_SOFT_WEIGHTS = Counter(IMPULSE_KEYWORDS)
+
+# Column order of the flag matrix returned by scan_impulse_batch
+FLAG_ORDER = ("I", "M", "P", "U", "L", "S", "E")
+
+# Plaid import heuristics folded into the batch scan
+LUXURY_AMOUNT_THRESHOLD = 1000
+LUXURY_MERCHANTS = ["rolex", "gucci", "louis"]
+
+# Default verdict thresholds; per-user rule sets may override them
+MIN_TRIGGERS = 3
+SOFT_TRIGGER_THRESHOLD = 3
+RECENT_PURCHASE_DAYS = 3
+
+# Categories a custom rule keyword can extend ("essential" whitelists an item)
+RULE_CATEGORIES = ("essential", "I", "M", "U", "S", "E")
+
+# Scan result cache (see ScanCache); IMPULSE_CACHE_SIZE=0 disables it
+SCAN_CACHE_SIZE = int(os.getenv("IMPULSE_CACHE_SIZE", "4096"))
+SCAN_CACHE_TTL = float(os.getenv("IMPULSE_CACHE_TTL", "300"))
+
+# Precompiled punctuation stripping for _normalize
+_PUNCTUATION_TABLE = str.maketrans("", "", string.punctuation)
+
+_matcher_serial = itertools.count(1)
+
+
+class KeywordAutomaton:
+    """Aho-Corasick automaton that finds every keyword occurring in a text in one pass.
+
+    Matching is plain substring matching, so `kw in automaton.find(text)` is
+    equivalent to `kw in text` for every keyword the automaton was built with.
+    """
+
+    def __init__(self, keywords: Iterable[str]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[Tuple[str, ...]] = [()]
+        for kw in dict.fromkeys(keywords):
+            if kw:
+                self._insert(kw)
+        self._build()
+
+    def _insert(self, keyword: str):
+        state = 0
+        for ch in keyword:
+            nxt = self._goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(())
+            state = nxt
+        self._out[state] = self._out[state] + (keyword,)
+
+    def _build(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fail = self._fail[state]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[nxt] = self._goto[fail].get(ch, 0)
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def iter_matches(self, text: str) -> Iterator[Tuple[int, str]]:
+        """Yield (end, keyword) for every occurrence, where end is the exclusive end index."""
+        goto, fail, out = self._goto, self._fail, self._out
+        state = 0
+        for i, ch in enumerate(text):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if out[state]:
+                for kw in out[state]:
+                    yield i + 1, kw
+
+    def find(self, text: str) -> set:
+        """Return the set of keywords that occur anywhere in text."""
+        return {kw for _, kw in self.iter_matches(text)}
+
+
+class ImpulseMatcher:
+    """Compiled keyword sets and thresholds for one scan configuration.
+
+    The built-in lists are always included; extra_keywords maps a category in
+    RULE_CATEGORIES to additional keywords. Everything is compiled into a
+    single automaton, so a custom rule set is scanned in the same one pass as
+    the defaults.
+    """
+
+    def __init__(
+        self,
+        extra_keywords: Optional[Dict[str, Iterable[str]]] = None,
+        min_triggers: int = MIN_TRIGGERS,
+        soft_trigger_threshold: int = SOFT_TRIGGER_THRESHOLD,
+        recent_purchase_days: int = RECENT_PURCHASE_DAYS,
+        amount_threshold: float = LUXURY_AMOUNT_THRESHOLD,
+    ):
+        extra = {}
+        for category, keywords in (extra_keywords or {}).items():
+            if category not in RULE_CATEGORIES:
+                raise ValueError(f"Unknown impulse rule category: {category}")
+            extra[category] = [kw for kw in (_normalize(k) for k in keywords) if kw]
+
+        self.essentials = ESSENTIALS + extra.get("essential", [])
+        self.luxury_keywords = LUXURY_KEYWORDS + extra.get("I", [])
+        self.mood_keywords = MOOD_KEYWORDS + extra.get("M", [])
+        self.urgency_keywords = URGENCY_KEYWORDS + extra.get("U", [])
+        self.situation_keywords = SITUATION_KEYWORDS + extra.get("S", [])
+        self.vague_explanations = VAGUE_EXPLANATIONS + extra.get("E", [])
+
+        self.essentials_set = frozenset(self.essentials)
+        self.luxury_set = frozenset(self.luxury_keywords)
+        self.mood_set = frozenset(self.mood_keywords)
+        self.urgency_set = frozenset(self.urgency_keywords)
+        self.situation_set = frozenset(self.situation_keywords)
+        self.vague_set = frozenset(self.vague_explanations)
+
+        # Custom trigger keywords also count towards the soft-trigger fallback
+        custom_triggers = [kw for category, kws in extra.items() if category != "essential" for kw in kws]
+        self.soft_weights = _SOFT_WEIGHTS + Counter(custom_triggers)
+
+        self.min_triggers = min_triggers
+        self.soft_trigger_threshold = soft_trigger_threshold
+        self.recent_purchase_days = recent_purchase_days
+        self.amount_threshold = amount_threshold
+        # Unique per instance, never reused; identifies this matcher in ScanCache keys
+        self.serial = next(_matcher_serial)
+        self.automaton = KeywordAutomaton(self.essentials + IMPULSE_KEYWORDS + custom_triggers)
+
+
+def _scan_fields(matcher: "ImpulseMatcher", item: str, mood: str, situation: str, explanation: str):
+    """Scan the joined fields once and attribute each hit to the field that contains it.
+
+    Returns (all_text, item_hits, mood_hits, situation_hits, explanation_hits, all_hits).
+    Hits that straddle a field boundary only appear in all_hits, matching the
+    behaviour of substring checks against the concatenated text.
+    """
+    all_text = f"{item} {mood} {situation} {explanation}"
+    mood_start = len(item) + 1
+    situation_start = mood_start + len(mood) + 1
+    explanation_start = situation_start + len(situation) + 1
+    item_hits, mood_hits, situation_hits, explanation_hits, all_hits = set(), set(), set(), set(), set()
+    for end, kw in matcher.automaton.iter_matches(all_text):
+        all_hits.add(kw)
+        start = end - len(kw)
+        if end < mood_start:
+            item_hits.add(kw)
+        elif start >= mood_start and end < situation_start:
+            mood_hits.add(kw)
+        elif start >= situation_start and end < explanation_start:
+            situation_hits.add(kw)
+        elif start >= explanation_start:
+            explanation_hits.add(kw)
+    return all_text, item_hits, mood_hits, situation_hits, explanation_hits, all_hits
+
 
 def _normalize(text):
     if not isinstance(text, str):
         return ""
-    text = text.lower().strip()
-    text = re.sub(rf"[{re.escape(string.punctuation)}]", "", text)
-    return text
+    return text.lower().strip().translate(_PUNCTUATION_TABLE)
+
+
+class ScanCache:
+    """Bounded LRU cache with a TTL for scan verdicts, with hit/miss counters.
+
+    Keys are tuples of the normalized payload fields plus the matcher serial,
+    so entries for different rule sets never collide.
+    """
+
+    def __init__(self, maxsize: int = SCAN_CACHE_SIZE, ttl: float = SCAN_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or (self.ttl and entry[0] < now):
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value):
+        if self.maxsize <= 0:
+            return
+        expires = time.monotonic() + self.ttl if self.ttl else 0
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
 
-def scan_impulse_triggers(data: Dict) -> Dict:
-    triggered_flags = []
-    debug = {}
+SCAN_CACHE = ScanCache()
+
+
+def impulse_cache_stats() -> Dict:
+    return SCAN_CACHE.stats()
+
+
+# Built once at import time; covers every category plus the soft-trigger set
+DEFAULT_MATCHER = ImpulseMatcher()
+
+
+def _evaluate(matcher: ImpulseMatcher, item: str, mood: str, situation: str, explanation: str, pattern=None, urgency=None, last_days=None):
+    """Compute the I.M.P.U.L.S.E. flags (in FLAG_ORDER) and soft-trigger count for normalized fields."""
+    _, item_hits, mood_hits, situation_hits, explanation_hits, all_hits = _scan_fields(matcher, item, mood, situation, explanation)
+    flags = (
+        bool(item) and item_hits.isdisjoint(matcher.essentials_set) and not item_hits.isdisjoint(matcher.luxury_set),
+        not mood_hits.isdisjoint(matcher.mood_set),
+        bool(pattern),
+        bool(urgency) or not situation_hits.isdisjoint(matcher.urgency_set) or not explanation_hits.isdisjoint(matcher.urgency_set),
+        isinstance(last_days, int) and last_days <= matcher.recent_purchase_days,
+        not situation_hits.isdisjoint(matcher.situation_set),
+        not explanation_hits.isdisjoint(matcher.vague_set),
+    )
+    soft_weights = matcher.soft_weights
+    soft_trigger_count = sum(soft_weights[k] for k in all_hits if k in soft_weights)
+    return flags, soft_trigger_count
+
+
+def _keyword_spans(matcher: ImpulseMatcher, field: str, text: str, keywords: frozenset) -> List[Dict]:
+    return [
+        {"field": field, "keyword": kw, "start": end - len(kw), "end": end}
+        for end, kw in matcher.automaton.iter_matches(text)
+        if kw in keywords
+    ]
+
+
+def _build_trace(matcher: ImpulseMatcher, item, mood, situation, explanation, pattern, urgency, last_days, flags) -> Dict:
+    """Structured per-flag trace: normalized input, matched keywords and their spans."""
+    i_flag, m_flag, p_flag, u_flag, l_flag, s_flag, e_flag = flags
+    item_spans = _keyword_spans(matcher, "item_name", item, matcher.luxury_set)
+    mood_spans = _keyword_spans(matcher, "mood", mood, matcher.mood_set)
+    urgency_spans = _keyword_spans(matcher, "situation", situation, matcher.urgency_set) + _keyword_spans(matcher, "explanation", explanation, matcher.urgency_set)
+    situation_spans = _keyword_spans(matcher, "situation", situation, matcher.situation_set)
+    explanation_spans = _keyword_spans(matcher, "explanation", explanation, matcher.vague_set)
+
+    def matched(keywords, spans):
+        found = {span["keyword"] for span in spans}
+        return [kw for kw in keywords if kw in found]
+
+    return {
+        "I": {"input": item, "matched": matched(matcher.luxury_keywords, item_spans), "spans": item_spans, "triggered": i_flag},
+        "M": {"input": mood, "matched": matched(matcher.mood_keywords, mood_spans), "spans": mood_spans, "triggered": m_flag},
+        "P": {"input": pattern, "matched": ["pattern_true"] if p_flag else [], "spans": [], "triggered": p_flag},
+        "U": {"input": {"situation": situation, "explanation": explanation, "urgency": urgency}, "matched": matched(matcher.urgency_keywords, urgency_spans), "spans": urgency_spans, "triggered": u_flag},
+        "L": {"input": last_days, "matched": [f"days={last_days}"] if l_flag else [], "spans": [], "triggered": l_flag},
+        "S": {"input": situation, "matched": matched(matcher.situation_keywords, situation_spans), "spans": situation_spans, "triggered": s_flag},
+        "E": {"input": explanation, "matched": matched(matcher.vague_explanations, explanation_spans), "spans": explanation_spans, "triggered": e_flag},
+    }
+
+
+def trace_requested(trace=None, header=None) -> bool:
+    """True if tracing was asked for per call (trace=True) or via a truthy request header value."""
+    if trace is True:
+        return True
+    return isinstance(header, str) and header.strip().lower() in ("1", "true", "yes", "on")
+
+
+def scan_impulse_triggers(data: Dict, trace: bool = False, matcher: Optional[ImpulseMatcher] = None) -> Dict:
+    """Run the I.M.P.U.L.S.E. scan over a spending payload.
+
+    The default path only computes flags. With trace=True the result also
+    carries a `debug` dict with per-flag inputs, matched keywords and match
+    spans, and the trace is emitted at DEBUG level on the impulse_engine logger.
+    Pass a matcher (see utils.impulse_rules.get_user_matcher) to scan with a
+    user's custom rules instead of the built-in lists.
+
+    Untraced verdicts are memoized in SCAN_CACHE, keyed on the normalized
+    fields and the matcher.
+    """
+    matcher = matcher or DEFAULT_MATCHER
     # Normalize all fields
     item = _normalize(data.get("item_name", ""))
     mood = _normalize(data.get("mood", ""))
@@ -21,80 +336,135 @@ def scan_impulse_triggers(data: Dict) -> Dict:
     situation = _normalize(data.get("situation", ""))
     explanation = _normalize(data.get("explanation", ""))
 
-    # I - Item Type
-    essentials = ["groceries", "rent", "utilities", "medicine", "food", "transport", "bill", "gas", "water", "electric", "insurance"]
-    luxury_keywords = ["sneaker", "designer", "gucci", "louis", "limited", "edition", "luxury", "bag", "watch", "jacket", "premium", "iphone", "macbook", "vacation", "trip", "sale", "exclusive", "collectible"]
-    i_flag = False
-    i_matches = [kw for kw in luxury_keywords if kw in item]
-    if item and not any(e in item for e in essentials) and i_matches:
-        i_flag = True
-        triggered_flags.append("I")
-    debug['I'] = f"[DEBUG] I: input = {item}, matched = {i_matches}, triggered = {i_flag}"
-
-    # M - Mood
-    mood_keywords = ["sad", "anxious", "bored", "excited", "stressed", "angry", "lonely", "depressed", "fomo", "fear", "impulsive", "restless", "overwhelmed", "tired", "burned out"]
-    m_matches = [kw for kw in mood_keywords if kw in mood]
-    m_flag = bool(m_matches)
-    if m_flag:
-        triggered_flags.append("M")
-    debug['M'] = f"[DEBUG] M: input = {mood}, matched = {m_matches}, triggered = {m_flag}"
-
-    # P - Pattern
-    p_flag = bool(pattern)
-    p_matches = ["pattern_true"] if p_flag else []
-    if p_flag:
-        triggered_flags.append("P")
-    debug['P'] = f"[DEBUG] P: input = {pattern}, matched = {p_matches}, triggered = {p_flag}"
-
-    # U - Urgency
-    urgency_keywords = ["urgent", "now", "today", "immediately", "last chance", "act fast", "only one", "limited time", "flash", "ending soon", "sold out", "must buy", "almost sold out", "only 1 left", "ends soon"]
-    u_matches = [kw for kw in urgency_keywords if kw in situation or kw in explanation]
-    u_flag = bool(urgency) or bool(u_matches)
-    if u_flag:
-        triggered_flags.append("U")
-    debug['U'] = f"[DEBUG] U: input = {situation} | {explanation}, matched = {u_matches}, triggered = {u_flag}"
-
-    # L - Last Purchase
-    l_flag = False
-    l_matches = []
-    if isinstance(last_days, int) and last_days <= 3:
-        l_flag = True
-        l_matches.append(f"days={last_days}")
-        triggered_flags.append("L")
-    debug['L'] = f"[DEBUG] L: input = {last_days}, matched = {l_matches}, triggered = {l_flag}"
-
-    # S - Situation
-    situation_keywords = ["celebration", "peer", "pressure", "boredom", "stress", "argument", "fight", "reward", "treat", "deserve", "special", "emotional", "trigger", "event", "occasion", "everyone around me", "everyone else is", "buying new stuff"]
-    s_matches = [kw for kw in situation_keywords if kw in situation]
-    s_flag = bool(s_matches)
-    if s_flag:
-        triggered_flags.append("S")
-    debug['S'] = f"[DEBUG] S: input = {situation}, matched = {s_matches}, triggered = {s_flag}"
-
-    # E - Explanation
-    vague_explanations = ["just felt like it", "i dont know", "because i wanted to", "no reason", "just want", "cant explain", "idk", "impulse", "impulsively", "no solid reason", "felt like it", "just really want", "not sure why", "just want it", "feels right", "not sure", "just want", "probably dont need it", "probably dont need"]
-    e_matches = [kw for kw in vague_explanations if kw in explanation]
-    e_flag = bool(e_matches)
-    if e_flag:
-        triggered_flags.append("E")
-    debug['E'] = f"[DEBUG] E: input = {explanation}, matched = {e_matches}, triggered = {e_flag}"
-
-    # Fallback: if 4+ impulse-related keywords in any text, count as impulsive
-    all_text = f"{item} {mood} {situation} {explanation}"
-    impulse_keywords = luxury_keywords + mood_keywords + urgency_keywords + situation_keywords + vague_explanations + ["impulse", "impulsively", "regret", "splurge", "fomo", "treat", "sale", "exclusive", "scarcity", "limited", "must buy", "cant resist"]
-    soft_trigger_count = sum(1 for k in impulse_keywords if k in all_text)
-    total_triggers = len(set(triggered_flags))
-    if total_triggers < 3 and soft_trigger_count >= 3:
-        triggered_flags += ["soft"] * (3 - total_triggers)
-        total_triggers = 3
-    is_impulsive = total_triggers >= 3
-    debug['soft_trigger_count'] = soft_trigger_count
-    debug['total_triggers'] = total_triggers
-    debug['is_impulsive'] = is_impulsive
-    print("[IMPULSE DEBUG]", debug, "Triggered Flags:", triggered_flags)
-    return {
+    if not trace and SCAN_CACHE.maxsize > 0:
+        key = (
+            matcher.serial, item, mood, situation, explanation,
+            bool(pattern), bool(urgency), last_days if isinstance(last_days, int) else None,
+        )
+        cached = SCAN_CACHE.get(key)
+        if cached is not None:
+            total_triggers, is_impulsive, triggered_flags = cached
+            return {
+                "total_triggers": total_triggers,
+                "is_impulsive": is_impulsive,
+                "triggered_flags": list(triggered_flags),
+            }
+    else:
+        key = None
+
+    flags, soft_trigger_count = _evaluate(matcher, item, mood, situation, explanation, pattern, urgency, last_days)
+    triggered_flags = [flag for flag, on in zip(FLAG_ORDER, flags) if on]
+
+    # Fallback: enough impulse-related keywords across all text count as impulsive
+    min_triggers = matcher.min_triggers
+    total_triggers = len(triggered_flags)
+    if total_triggers < min_triggers and soft_trigger_count >= matcher.soft_trigger_threshold:
+        triggered_flags += ["soft"] * (min_triggers - total_triggers)
+        total_triggers = min_triggers
+    is_impulsive = total_triggers >= min_triggers
+    result = {
         "total_triggers": total_triggers,
         "is_impulsive": is_impulsive,
         "triggered_flags": list(set(triggered_flags)),
-        "debug": debug
+    }
+    if key is not None:
+        SCAN_CACHE.put(key, (total_triggers, is_impulsive, tuple(result["triggered_flags"])))
+    if trace:
+        debug = _build_trace(matcher, item, mood, situation, explanation, pattern, urgency, last_days, flags)
+        debug['soft_trigger_count'] = soft_trigger_count
+        debug['total_triggers'] = total_triggers
+        debug['is_impulsive'] = is_impulsive
+        logger.debug("[IMPULSE TRACE] %s Triggered Flags: %s", debug, triggered_flags)
+        result["debug"] = debug
+    return result
+
+def _column(values: Optional[Sequence], n: int) -> Sequence:
+    if values is None:
+        return [None] * n
+    if len(values) != n:
+        raise ValueError("All columns passed to scan_impulse_batch must have the same length")
+    return values
+
+
+def _amount_array(amounts: Sequence) -> np.ndarray:
+    out = np.full(len(amounts), np.nan, dtype=np.float64)
+    for i, amount in enumerate(amounts):
+        try:
+            out[i] = float(amount)
+        except (TypeError, ValueError):
+            pass
+    return out
+
+
+def _has_luxury_category(categories) -> bool:
+    if not categories:
+        return False
+    if isinstance(categories, str):
+        categories = [categories]
+    return any("luxury" in str(c).lower() for c in categories)
+
+
+def scan_impulse_batch(
+    item_names: Sequence[Optional[str]],
+    explanations: Optional[Sequence[Optional[str]]] = None,
+    amounts: Optional[Sequence] = None,
+    categories: Optional[Sequence] = None,
+    merchants: Optional[Sequence[Optional[str]]] = None,
+    matcher: Optional[ImpulseMatcher] = None,
+) -> Dict[str, np.ndarray]:
+    """Scan a column of transactions in one pass.
+
+    Each row is scanned like `scan_impulse_triggers` with only item_name and
+    explanation set (no mood, pattern, urgency, recency or situation), then the
+    Plaid heuristics are applied: amount over the matcher's amount_threshold
+    (LUXURY_AMOUNT_THRESHOLD by default), a category containing "luxury", or a
+    merchant in LUXURY_MERCHANTS.
+
+    Returns a dict of numpy arrays:
+        flags:              bool (n, 7), columns in FLAG_ORDER
+        total_triggers:     int, as reported by scan_impulse_triggers
+        soft_trigger_count: int
+        heuristic:          bool, True if a Plaid heuristic fired
+        is_impulsive:       bool, engine verdict OR heuristic
+    """
+    matcher = matcher or DEFAULT_MATCHER
+    n = len(item_names)
+    explanations = _column(explanations, n)
+    categories = _column(categories, n)
+    merchants = _column(merchants, n)
+
+    flags = np.zeros((n, len(FLAG_ORDER)), dtype=bool)
+    soft_counts = np.zeros(n, dtype=np.int32)
+    luxury_category = np.zeros(n, dtype=bool)
+    luxury_merchant = np.zeros(n, dtype=bool)
+
+    for row in range(n):
+        row_flags, soft_counts[row] = _evaluate(matcher, _normalize(item_names[row]), "", "", _normalize(explanations[row]))
+        flags[row] = row_flags
+        luxury_category[row] = _has_luxury_category(categories[row])
+        merchant = merchants[row]
+        if merchant:
+            merchant = str(merchant).lower()
+            luxury_merchant[row] = any(m in merchant for m in LUXURY_MERCHANTS)
+
+    # Vectorized verdict: soft triggers top the flag count up to min_triggers
+    min_triggers = matcher.min_triggers
+    total_triggers = flags.sum(axis=1)
+    total_triggers = np.where((total_triggers < min_triggers) & (soft_counts >= matcher.soft_trigger_threshold), min_triggers, total_triggers)
+    scan_impulsive = total_triggers >= min_triggers
+
+    if amounts is None:
+        large_amount = np.zeros(n, dtype=bool)
+    else:
+        amount_values = _amount_array(_column(amounts, n))
+        with np.errstate(invalid="ignore"):
+            large_amount = amount_values > matcher.amount_threshold
+    heuristic = large_amount | luxury_category | luxury_merchant
+
+    return {
+        "flags": flags,
+        "total_triggers": total_triggers,
+        "soft_trigger_count": soft_counts,
+        "heuristic": heuristic,
+        "is_impulsive": scan_impulsive | heuristic,
     }
@@ -0,0 +1,114 @@
+"""Per-user custom impulse rules.
+
+Rule sets live in the impulse_rule_sets / impulse_rule_keywords tables. Each
+one is compiled into an ImpulseMatcher once and kept in an in-process LRU keyed
+by (user_id, version); saving a rule set bumps its version, so other workers
+pick up the change on their next lookup.
+"""
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from sqlalchemy.orm import Session
+
+from models import ImpulseRuleSet, ImpulseRuleKeyword
+from utils.impulse_engine import (
+    DEFAULT_MATCHER,
+    ImpulseMatcher,
+    LUXURY_AMOUNT_THRESHOLD,
+    MIN_TRIGGERS,
+    RECENT_PURCHASE_DAYS,
+    RULE_CATEGORIES,
+    SOFT_TRIGGER_THRESHOLD,
+)
+
+MATCHER_CACHE_SIZE = int(os.getenv("IMPULSE_RULES_CACHE_SIZE", "1024"))
+
+_matcher_cache: "OrderedDict[tuple, ImpulseMatcher]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+THRESHOLD_FIELDS = ("min_triggers", "soft_trigger_threshold", "recent_purchase_days", "amount_threshold")
+
+
+def rule_set_keywords(rule_set: ImpulseRuleSet) -> Dict[str, List[str]]:
+    keywords: Dict[str, List[str]] = {}
+    for rule in rule_set.keywords:
+        keywords.setdefault(rule.category, []).append(rule.keyword)
+    return keywords
+
+
+def compile_rule_set(rule_set: ImpulseRuleSet) -> ImpulseMatcher:
+    """Build the matcher for a stored rule set (built-in lists plus the user's keywords)."""
+    return ImpulseMatcher(
+        extra_keywords=rule_set_keywords(rule_set),
+        min_triggers=rule_set.min_triggers if rule_set.min_triggers is not None else MIN_TRIGGERS,
+        soft_trigger_threshold=rule_set.soft_trigger_threshold if rule_set.soft_trigger_threshold is not None else SOFT_TRIGGER_THRESHOLD,
+        recent_purchase_days=rule_set.recent_purchase_days if rule_set.recent_purchase_days is not None else RECENT_PURCHASE_DAYS,
+        amount_threshold=rule_set.amount_threshold if rule_set.amount_threshold is not None else LUXURY_AMOUNT_THRESHOLD,
+    )
+
+
+def get_user_matcher(user_id: int, db: Session) -> ImpulseMatcher:
+    """Return the compiled matcher for a user, or DEFAULT_MATCHER if they have no rules.
+
+    A cache hit costs one indexed (id, version) lookup; the rule rows are only
+    loaded and compiled when the version is not cached yet.
+    """
+    row = db.query(ImpulseRuleSet.id, ImpulseRuleSet.version).filter(ImpulseRuleSet.user_id == user_id).first()
+    if row is None:
+        return DEFAULT_MATCHER
+    key = (user_id, row.version)
+    with _cache_lock:
+        matcher = _matcher_cache.get(key)
+        if matcher is not None:
+            _matcher_cache.move_to_end(key)
+            return matcher
+
+    rule_set = db.query(ImpulseRuleSet).filter(ImpulseRuleSet.id == row.id).first()
+    matcher = compile_rule_set(rule_set)
+    with _cache_lock:
+        _matcher_cache[key] = matcher
+        _matcher_cache.move_to_end(key)
+        while len(_matcher_cache) > MATCHER_CACHE_SIZE:
+            _matcher_cache.popitem(last=False)
+    return matcher
+
+
+def invalidate_user_rules(user_id: int):
+    """Drop every cached matcher for a user."""
+    with _cache_lock:
+        for key in [k for k in _matcher_cache if k[0] == user_id]:
+            del _matcher_cache[key]
+
+
+def save_user_rules(user_id: int, db: Session, keywords: Dict[str, List[str]], thresholds: Optional[Dict] = None) -> ImpulseRuleSet:
+    """Replace a user's rule set, bump its version and invalidate cached matchers.
+
+    Raises ValueError for an unknown category so callers can surface a 400/422.
+    """
+    for category in keywords:
+        if category not in RULE_CATEGORIES:
+            raise ValueError(f"Unknown impulse rule category: {category}")
+
+    rule_set = db.query(ImpulseRuleSet).filter(ImpulseRuleSet.user_id == user_id).first()
+    if rule_set is None:
+        rule_set = ImpulseRuleSet(user_id=user_id, version=1)
+        db.add(rule_set)
+    else:
+        rule_set.version = (rule_set.version or 0) + 1
+
+    thresholds = thresholds or {}
+    for field in THRESHOLD_FIELDS:
+        setattr(rule_set, field, thresholds.get(field))
+
+    rule_set.keywords = [
+        ImpulseRuleKeyword(category=category, keyword=kw.strip().lower())
+        for category, kws in keywords.items()
+        for kw in dict.fromkeys(kws)
+        if kw and kw.strip()
+    ]
+    db.commit()
+    db.refresh(rule_set)
+    invalidate_user_rules(user_id)
+    return rule_set
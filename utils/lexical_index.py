@@ -0,0 +1,255 @@
+"""Per-user BM25 inverted index over memory documents.
+
+Nudge queries are usually a short item or brand ("gucci bag", "rolex"). When
+a user's memories mention every term of such a query, the lexical hits are
+the answer. memory.py returns them without encoding the query or touching
+the vector store. Longer queries, or queries that no memory fully covers,
+still go to vector search, and the BM25 ranking is fused with the vector
+ranking (reciprocal rank fusion).
+
+Indexes live in process memory, one per user, built on first use from the
+vector store. memory.py updates them on every add and delete. Memories
+written by other worker processes show up at most MEMORY_LEXICAL_TTL
+seconds later: an expired index is refreshed in place by one request, which
+tokenizes only the rows it doesn't have yet, while concurrent requests keep
+searching the current one.
+"""
+from collections import Counter, OrderedDict
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+import math
+import os
+import re
+import threading
+import time
+
+MEMORY_LEXICAL_SEARCH = os.getenv("MEMORY_LEXICAL_SEARCH", "true").lower() in ("1", "true", "yes")
+# Queries with more terms than this always use vector search
+MEMORY_LEXICAL_MAX_TERMS = int(os.getenv("MEMORY_LEXICAL_MAX_TERMS", "4"))
+MEMORY_LEXICAL_TTL = float(os.getenv("MEMORY_LEXICAL_TTL", "60"))
+MEMORY_LEXICAL_USERS = int(os.getenv("MEMORY_LEXICAL_USERS", "1024"))
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+RRF_K = 60
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset(
+    "a an and are as at be but by for from had has have i in is it its me my of on or so that the this to was "
+    "were with you your just really very about after again all am any been before being did do does doing".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased alphanumeric terms without stopwords; a trailing plural "s" is dropped ("shoes" -> "shoe")."""
+    terms = []
+    for token in _TOKEN.findall(text.casefold()):
+        if token in STOPWORDS:
+            continue
+        if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+            token = token[:-1]
+        terms.append(token)
+    return terms
+
+
+class UserLexicalIndex:
+    def __init__(self):
+        self.postings: Dict[str, Dict[str, int]] = {}
+        self.lengths: Dict[str, int] = {}
+        self.rows: Dict[str, Tuple[str, Dict]] = {}
+        self.total_length = 0
+        self.built_at = time.monotonic()
+        # Set while a refresh is loading rows; ids written meanwhile are left as they are by sync()
+        self.refreshing = False
+        self._touched: set = set()
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def add(self, ids: Sequence[str], documents: Sequence[str], metadatas: Sequence[Dict]):
+        for mem_id, doc, meta in zip(ids, documents, metadatas):
+            if self.refreshing:
+                self._touched.add(mem_id)
+            if mem_id in self.rows or doc is None:
+                continue
+            terms = Counter(tokenize(doc))
+            for term, tf in terms.items():
+                self.postings.setdefault(term, {})[mem_id] = tf
+            length = sum(terms.values())
+            self.lengths[mem_id] = length
+            self.total_length += length
+            self.rows[mem_id] = (doc, meta or {})
+
+    def remove(self, ids: Iterable[str]):
+        for mem_id in ids:
+            if self.refreshing:
+                self._touched.add(mem_id)
+            row = self.rows.pop(mem_id, None)
+            if row is None:
+                continue
+            self.total_length -= self.lengths.pop(mem_id)
+            for term in set(tokenize(row[0])):
+                postings = self.postings.get(term)
+                if postings is not None:
+                    postings.pop(mem_id, None)
+                    if not postings:
+                        del self.postings[term]
+
+    def sync(self, ids: Sequence[str], documents: Sequence[str], metadatas: Sequence[Dict]):
+        """Match the rows loaded from the vector store, keeping ids added or removed during the load."""
+        loaded = set(ids)
+        self.remove([mem_id for mem_id in self.rows if mem_id not in loaded and mem_id not in self._touched])
+        new = [i for i, mem_id in enumerate(ids) if mem_id not in self.rows and mem_id not in self._touched]
+        self.add([ids[i] for i in new], [documents[i] for i in new], [metadatas[i] for i in new])
+        self._touched.clear()
+        self.built_at = time.monotonic()
+
+    def max_score(self, terms: Sequence[str]) -> float:
+        """Upper bound of the BM25 score for terms (every term with a very high frequency in a short row)."""
+        count = len(self.rows)
+        total = 0.0
+        for term in set(terms):
+            postings = self.postings.get(term)
+            if postings:
+                total += math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5)) * (BM25_K1 + 1)
+        return total
+
+    def search(self, terms: Sequence[str], n_results: int, since: Optional[float] = None) -> List[Tuple[str, Dict, float, int]]:
+        """Top rows by BM25 as (document, metadata, score, query terms matched), best first."""
+        count = len(self.rows)
+        if not count or not terms:
+            return []
+        avg_length = self.total_length / count
+        scores: Dict[str, float] = {}
+        matched: Counter = Counter()
+        for term in set(terms):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for mem_id, tf in postings.items():
+                norm = tf + BM25_K1 * (1 - BM25_B + BM25_B * self.lengths[mem_id] / avg_length)
+                scores[mem_id] = scores.get(mem_id, 0.0) + idf * tf * (BM25_K1 + 1) / norm
+                matched[mem_id] += 1
+        hits = []
+        for mem_id, score in scores.items():
+            doc, meta = self.rows[mem_id]
+            if since is not None and float(meta.get("ts", math.inf)) < since:
+                continue
+            hits.append((doc, meta, score, matched[mem_id]))
+        hits.sort(key=lambda hit: (-hit[3], -hit[2]))
+        return hits[:n_results]
+
+
+class LexicalIndex:
+    """Keeps a bounded number of per-user indexes; load_fn(user_id) -> (ids, documents, metadatas) builds one."""
+
+    def __init__(self, load_fn: Callable, max_users: int = MEMORY_LEXICAL_USERS, ttl: float = MEMORY_LEXICAL_TTL):
+        self.load_fn = load_fn
+        self.max_users = max(1, max_users)
+        self.ttl = ttl
+        self._indexes: "OrderedDict[int, UserLexicalIndex]" = OrderedDict()
+        self._lock = threading.Lock()
+        # One loader per user at a time; the others wait for it (first build) or use the current index (refresh)
+        self._load_locks: Dict[int, threading.Lock] = {}
+        self.short_circuits = 0
+        self.fallbacks = 0
+
+    def _fresh(self, index: Optional[UserLexicalIndex]) -> bool:
+        return index is not None and time.monotonic() - index.built_at < self.ttl
+
+    def user(self, user_id: int) -> UserLexicalIndex:
+        with self._lock:
+            index = self._indexes.get(user_id)
+            if index is not None and (index.refreshing or self._fresh(index)):
+                self._indexes.move_to_end(user_id)
+                return index
+            if index is not None:
+                index.refreshing = True
+            load_lock = self._load_locks.setdefault(user_id, threading.Lock())
+        with load_lock:
+            with self._lock:
+                index = self._indexes.get(user_id)
+                if self._fresh(index) and not index.refreshing:
+                    return index  # built by the request we waited for
+            try:
+                rows = self.load_fn(user_id)
+            except Exception:
+                if index is not None:
+                    with self._lock:
+                        index.refreshing = False
+                        index._touched.clear()
+                raise
+            with self._lock:
+                index = self._indexes.get(user_id)
+                if index is None:
+                    index = UserLexicalIndex()
+                    index.add(*rows)
+                    self._indexes[user_id] = index
+                else:
+                    index.sync(*rows)
+                    index.refreshing = False
+                self._indexes.move_to_end(user_id)
+                while len(self._indexes) > self.max_users:
+                    self._indexes.popitem(last=False)
+                self._load_locks.pop(user_id, None)
+        return index
+
+    def _loaded(self, user_id: int) -> Optional[UserLexicalIndex]:
+        with self._lock:
+            return self._indexes.get(user_id)
+
+    def add(self, user_id: int, ids, documents, metadatas):
+        index = self._loaded(user_id)  # not loaded yet: the first search loads it with these rows
+        if index is not None:
+            with self._lock:
+                index.add(ids, documents, metadatas)
+
+    def remove(self, user_id: int, ids):
+        index = self._loaded(user_id)
+        if index is not None:
+            with self._lock:
+                index.remove(ids)
+
+    def confident_hits(self, user_id: int, query: str, n_results: int, since: Optional[float] = None) -> Optional[List[Tuple[str, Dict, float]]]:
+        """Memories containing every term of a short query, or None when vector search is needed.
+
+        Scores are BM25 divided by its upper bound for the query, so they fall
+        in (0, 1); they are not cosine similarities.
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms or len(terms) > MEMORY_LEXICAL_MAX_TERMS:
+            return None
+        index = self.user(user_id)
+        with self._lock:
+            hits = index.search(terms, n_results, since=since)
+            best = index.max_score(terms)
+        full = [(doc, meta, score / best) for doc, meta, score, matched in hits if matched == len(terms)]
+        with self._lock:
+            if full:
+                self.short_circuits += 1
+            else:
+                self.fallbacks += 1
+        return full or None
+
+    def ranked(self, user_id: int, query: str, n_results: int, since: Optional[float] = None) -> List[Tuple[str, Dict, float]]:
+        terms = tokenize(query)
+        index = self.user(user_id)
+        with self._lock:
+            return [(doc, meta, score) for doc, meta, score, _ in index.search(terms, n_results, since=since)]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "users": len(self._indexes),
+                "short_circuits": self.short_circuits,
+                "vector_fallbacks": self.fallbacks,
+            }
+
+
+def reciprocal_rank_fusion(*rankings: Sequence[str], k: int = RRF_K) -> Dict[str, float]:
+    """Fused score per document: sum of 1 / (k + rank) over the rankings it appears in."""
+    fused: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking):
+            fused[doc] = fused.get(doc, 0.0) + 1.0 / (k + rank + 1)
+    return fused
@@ -0,0 +1,69 @@
+"""Monotonic memory IDs (ULIDs) shared by the vector store and the user_memory table.
+
+A ULID is a 48-bit millisecond timestamp followed by 80 random bits, written
+as 26 Crockford base32 characters. Allocation is O(1) and needs no round trip
+to Chroma or the database. The random part makes collisions between workers
+negligible. Within one process, IDs minted in the same millisecond increment
+the random part, so they stay unique and sort in creation order.
+"""
+import os
+import threading
+import time
+
+_CROCKFORD = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+_RANDOM_BITS = 80
+_RANDOM_LIMIT = 1 << _RANDOM_BITS
+
+
+def _encode(value: int) -> str:
+    chars = []
+    for _ in range(26):
+        chars.append(_CROCKFORD[value & 31])
+        value >>= 5
+    return "".join(reversed(chars))
+
+
+class MemoryIdAllocator:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._last_ms = -1
+        self._random = 0
+
+    def new_id(self) -> str:
+        with self._lock:
+            ms = time.time_ns() // 1_000_000
+            if ms <= self._last_ms:
+                # Same millisecond (or the clock stepped back): keep the last timestamp and count up
+                ms = self._last_ms
+                self._random += 1
+                if self._random >= _RANDOM_LIMIT:
+                    ms += 1
+                    self._random = int.from_bytes(os.urandom(10), "big") >> 1
+            else:
+                # Top bit left clear so the counter has room before it overflows
+                self._random = int.from_bytes(os.urandom(10), "big") >> 1
+            self._last_ms = ms
+            value = (ms << _RANDOM_BITS) | self._random
+        return _encode(value)
+
+    def new_ids(self, count: int) -> list:
+        return [self.new_id() for _ in range(count)]
+
+
+_allocator = MemoryIdAllocator()
+
+
+def new_memory_id() -> str:
+    return _allocator.new_id()
+
+
+def new_memory_ids(count: int) -> list:
+    return _allocator.new_ids(count)
+
+
+def memory_id_time(memory_id: str) -> float:
+    """Epoch seconds encoded in a memory ID."""
+    value = 0
+    for char in memory_id[:10]:
+        value = value * 32 + _CROCKFORD.index(char)
+    return value / 1000
@@ -0,0 +1,152 @@
+"""Structured, sampled, non-blocking logging for the memory subsystem.
+
+memory.py used to print and log every store and search call, including the
+full 384-float embedding and the memory text. That wrote kilobytes of
+synchronous stdout and file I/O per request to a memory_debug.log that was
+never rotated. Now:
+
+- log_event(name, **fields) writes one JSON line to the "memory" logger.
+  Per-call events (sampled=True) are kept with probability
+  MEMORY_LOG_SAMPLE_RATE, and the sampling decision is made before
+  anything is formatted. Warnings and errors are always kept.
+- Vectors are never serialized. A list or array of numbers is logged as its
+  shape. Memory and query text is passed as texts={"query": text} and
+  logged as a length plus a short content digest (text_fields), so a
+  user's journal never lands in the log; the digest is only computed for
+  records that survive sampling.
+- Records go through a bounded queue to a QueueListener thread that owns a
+  RotatingFileHandler (MEMORY_LOG_FILE, MEMORY_LOG_MAX_BYTES,
+  MEMORY_LOG_BACKUPS). A full queue drops the record and counts it instead
+  of blocking the request.
+"""
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Any, Dict, Optional
+import atexit
+import hashlib
+import json
+import logging
+import os
+import queue
+import random
+import threading
+
+MEMORY_LOG_FILE = os.getenv("MEMORY_LOG_FILE", "memory_debug.log")
+MEMORY_LOG_LEVEL = os.getenv("MEMORY_LOG_LEVEL", "INFO").upper()
+MEMORY_LOG_SAMPLE_RATE = float(os.getenv("MEMORY_LOG_SAMPLE_RATE", "0.01"))
+MEMORY_LOG_MAX_BYTES = int(os.getenv("MEMORY_LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+MEMORY_LOG_BACKUPS = int(os.getenv("MEMORY_LOG_BACKUPS", "5"))
+MEMORY_LOG_QUEUE = int(os.getenv("MEMORY_LOG_QUEUE", "10000"))
+
+logger = logging.getLogger("memory")
+
+_setup_lock = threading.Lock()
+_listener = None
+_handler = None
+
+
+class DroppingQueueHandler(QueueHandler):
+    """QueueHandler that drops records when the queue is full instead of blocking or raising."""
+
+    def __init__(self, q):
+        super().__init__(q)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def prepare(self, record):
+        # Format on the listener thread, not the request thread
+        return record
+
+
+class JsonLineFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "event": record.getMessage(),
+        }
+        entry.update(getattr(record, "fields", {}))
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def configure(path: str = MEMORY_LOG_FILE, level: str = MEMORY_LOG_LEVEL, max_bytes: int = MEMORY_LOG_MAX_BYTES,
+              backups: int = MEMORY_LOG_BACKUPS, queue_size: int = MEMORY_LOG_QUEUE):
+    """Attach the queue handler to the "memory" logger (once; later calls are no-ops until shutdown())."""
+    global _listener, _handler
+    with _setup_lock:
+        if _listener is not None:
+            return
+        file_handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups, encoding="utf-8", delay=True)
+        file_handler.setFormatter(JsonLineFormatter())
+        _handler = DroppingQueueHandler(queue.Queue(maxsize=queue_size))
+        _listener = QueueListener(_handler.queue, file_handler)
+        _listener.start()
+        logger.addHandler(_handler)
+        logger.setLevel(level)
+        logger.propagate = False
+
+
+def shutdown():
+    """Flush queued records and stop the listener thread."""
+    global _listener, _handler
+    with _setup_lock:
+        if _listener is None:
+            return
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        logger.removeHandler(_handler)
+        _listener = _handler = None
+
+
+atexit.register(shutdown)
+
+
+def _scrub(value: Any) -> Any:
+    if hasattr(value, "shape") and hasattr(value, "dtype"):
+        return f"<vector shape={tuple(value.shape)}>"
+    if isinstance(value, (list, tuple)) and value:
+        first = value[0]
+        if isinstance(first, float) or (isinstance(first, (list, tuple)) and first and isinstance(first[0], float)):
+            inner = len(first) if isinstance(first, (list, tuple)) else None
+            shape = (len(value), inner) if inner is not None else (len(value),)
+            return f"<vector shape={shape}>"
+    return value
+
+
+def text_fields(text: str, prefix: str = "text") -> Dict[str, Any]:
+    """Length and a short digest of a memory or query instead of the text itself."""
+    return {f"{prefix}_chars": len(text), f"{prefix}_digest": hashlib.sha256(text.encode("utf-8")).hexdigest()[:12]}
+
+
+def log_event(event: str, level: int = logging.INFO, sampled: bool = True, exc_info: bool = False,
+              texts: Optional[Dict[str, str]] = None, **fields):
+    """Log one structured event; sampled per-call events are usually dropped before any formatting.
+
+    texts maps a field prefix to raw text, logged as text_fields(text, prefix).
+    """
+    if sampled and level < logging.WARNING and random.random() >= MEMORY_LOG_SAMPLE_RATE:
+        return
+    if _listener is None:
+        configure()
+    if not logger.isEnabledFor(level):
+        return
+    for prefix, text in (texts or {}).items():
+        fields.update(text_fields(text, prefix))
+    if sampled and level < logging.WARNING:
+        fields["sample_rate"] = MEMORY_LOG_SAMPLE_RATE
+    logger.log(level, event, exc_info=exc_info, extra={"fields": {key: _scrub(value) for key, value in fields.items()}})
+
+
+def log_stats() -> Dict[str, Any]:
+    return {
+        "sample_rate": MEMORY_LOG_SAMPLE_RATE,
+        "queued": _handler.queue.qsize() if _handler is not None else 0,
+        "dropped": _handler.dropped if _handler is not None else 0,
+    }
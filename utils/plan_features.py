@@ -26,6 +26,7 @@ def get_plan_features(plan: str) -> dict:
         "essential": {
             "price": 79,
             "nudge_limit": 20,
+            "memory_retention_days": 90,
             "report_frequency": "monthly",
             "deep_insights": False,
             "plaid_enabled": True,
@@ -47,6 +48,7 @@ def get_plan_features(plan: str) -> dict:
         "prestige": {
             "price": 149,
             "nudge_limit": 60,
+            "memory_retention_days": 365,
             "report_frequency": "weekly",
             "deep_insights": False,
             "plaid_enabled": True,
@@ -70,6 +72,7 @@ def get_plan_features(plan: str) -> dict:
         "elite": {
             "price": 299,
             "nudge_limit": None,  # Unlimited
+            "memory_retention_days": None,  # Kept forever
             "report_frequency": "weekly",
             "deep_insights": True,
             "plaid_enabled": True,
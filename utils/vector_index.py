@@ -0,0 +1,347 @@
+"""Per-user NumPy vector index, an alternative to the shared Chroma collection.
+
+Most users have tens to hundreds of memories. A brute-force dot product over
+one small contiguous matrix beats a filtered ANN query at that size, and it
+is exact. Each user gets two files under MEMORY_INDEX_DIR:
+
+    user_<id>.f16    float16 vectors, row-major, appended on every add and
+                     memory-mapped read-only for search (.f32 with dtype=np.float32)
+    user_<id>.jsonl  one line per row: id, dimension, document and metadata
+
+Several processes (or an evicted and a reopened handle in one process)
+can share the files. Every read and write takes an flock on user_<id>.lock,
+shared for searches and exclusive for add/remove, and first catches up with
+rows appended or rewritten by others, so the id/row mapping always matches
+the files. On platforms without fcntl only a single writer process is safe
+(as with EMBEDDING_CACHE_DIR).
+
+Distances are squared L2, the same as the default for Chroma collections,
+so callers' "similarity = 1 - distance" logic behaves the same on both
+backends. memory.py picks the backend with MEMORY_INDEX_BACKEND.
+
+With dtype=np.float32 the same files hold full-precision vectors: memory.py
+keeps one such store (MEMORY_FULL_VECTOR_DIR) for re-ranking when the search
+index holds reduced-dimension vectors.
+"""
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime, timezone
+import json
+import logging
+import os
+import re
+import threading
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process locking, so run a single writer process there
+    fcntl = None
+
+logger = logging.getLogger("vector_index")
+
+MEMORY_INDEX_DIR = os.getenv("MEMORY_INDEX_DIR", "memory_index")
+# Open per-user indexes kept in memory (least recently used are closed first)
+MEMORY_INDEX_OPEN_USERS = int(os.getenv("MEMORY_INDEX_OPEN_USERS", "1024"))
+# Rows upcast to float32 per matmul block during search
+SEARCH_BLOCK_ROWS = 16384
+
+_USER_FILE = re.compile(r"^user_(\d+)\.jsonl$")
+
+
+def _row_epoch(metadata: Dict) -> float:
+    """Epoch seconds for recency filters; rows from before "ts" existed fall back to the ISO timestamp."""
+    if "ts" in metadata:
+        return float(metadata["ts"])
+    raw = metadata.get("timestamp")
+    if not raw:
+        return float("inf")  # no timestamp: always counted as recent, as before
+    try:
+        stamp = datetime.fromisoformat(raw)
+    except (TypeError, ValueError):
+        return 0.0
+    if stamp.tzinfo is None:
+        stamp = stamp.replace(tzinfo=timezone.utc)
+    return stamp.timestamp()
+
+
+class UserVectorIndex:
+    def __init__(self, root: str, user_id: int, dtype=np.float16):
+        self.user_id = user_id
+        self.dtype = np.dtype(dtype)
+        self.vectors_path = os.path.join(root, f"user_{user_id}.f{self.dtype.itemsize * 8}")
+        self.rows_path = os.path.join(root, f"user_{user_id}.jsonl")
+        self.lock_path = os.path.join(root, f"user_{user_id}.lock")
+        self.lock = threading.Lock()
+        self._reset()
+        with self.lock:
+            if os.path.exists(self.rows_path + ".compact"):
+                with self._file_lock(exclusive=True):
+                    self._finish_compaction()
+            with self._file_lock(exclusive=False):
+                self._refresh()
+
+    def _reset(self):
+        self.ids: List[str] = []
+        self.documents: List[str] = []
+        self.metadatas: List[Dict] = []
+        self.hashes: Dict[str, int] = {}
+        self._ts_values: List[float] = []
+        self.dim: Optional[int] = None
+        self._matrix: Optional[np.ndarray] = None
+        self._sq_norms: Optional[np.ndarray] = None
+        self._ts: Optional[np.ndarray] = None
+        # (inode, size) of the rows file the in-memory state reflects
+        self._seen: Optional[Tuple[int, int]] = None
+
+    @contextmanager
+    def _file_lock(self, exclusive: bool):
+        """flock on the user's lock file: shared for reads, exclusive for writes, across processes and handles."""
+        if fcntl is None:
+            yield
+            return
+        os.makedirs(os.path.dirname(self.lock_path) or ".", exist_ok=True)
+        with open(self.lock_path, "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _refresh(self):
+        """Catch up with rows written by other processes or handles. Needs self.lock and the file lock.
+
+        Appends are read incrementally from the last seen offset; a rows file
+        that was replaced (remove()) or shrank is reloaded in full.
+        """
+        try:
+            stat = os.stat(self.rows_path)
+        except FileNotFoundError:
+            if self._seen is not None:
+                self._reset()
+            return
+        seen = (stat.st_ino, stat.st_size)
+        if seen == self._seen:
+            return
+        if self._seen is not None and self._seen[0] == stat.st_ino and stat.st_size > self._seen[1]:
+            offset = self._seen[1]
+        else:
+            offset = 0
+            self._reset()
+        start = len(self.ids)
+        with open(self.rows_path, "rb") as f:
+            f.seek(offset)
+            for line in f:
+                if not line.strip():
+                    continue
+                row = json.loads(line)
+                self.dim = row["dim"]
+                self._remember(row["id"], row["document"], row["metadata"])
+        self._seen = seen
+        if len(self.ids) > start:
+            self._remap()
+            new_norms = self._block_sq_norms(self._matrix[start:])
+            self._sq_norms = new_norms if start == 0 else np.concatenate([self._sq_norms, new_norms])
+            self._ts = np.asarray(self._ts_values, dtype=np.float64)
+
+    def _finish_compaction(self):
+        # remove() swaps in the vectors file first, then the rows file. With the vectors
+        # already swapped only the rows rename is left to do; otherwise nothing was swapped.
+        rows_tmp, vectors_tmp = self.rows_path + ".compact", self.vectors_path + ".compact"
+        if not os.path.exists(rows_tmp):
+            return
+        if os.path.exists(vectors_tmp):
+            os.remove(vectors_tmp)
+            os.remove(rows_tmp)
+        else:
+            os.replace(rows_tmp, self.rows_path)
+
+    def _remember(self, mem_id: str, document: str, metadata: Dict):
+        digest = metadata.get("content_hash")
+        if digest:
+            self.hashes.setdefault(digest, len(self.ids))
+        self.ids.append(mem_id)
+        self.documents.append(document)
+        self.metadatas.append(metadata)
+        self._ts_values.append(_row_epoch(metadata))
+
+    def _remap(self):
+        self._matrix = np.memmap(self.vectors_path, dtype=self.dtype, mode="r", shape=(len(self.ids), self.dim))
+
+    @staticmethod
+    def _block_sq_norms(matrix) -> np.ndarray:
+        norms = np.empty(len(matrix), dtype=np.float32)
+        for start in range(0, len(matrix), SEARCH_BLOCK_ROWS):
+            block = np.asarray(matrix[start:start + SEARCH_BLOCK_ROWS], dtype=np.float32)
+            norms[start:start + len(block)] = np.einsum("ij,ij->i", block, block)
+        return norms
+
+    def __len__(self) -> int:
+        with self.lock, self._file_lock(exclusive=False):
+            self._refresh()
+            return len(self.ids)
+
+    def id_for_hash(self, digest: str) -> Optional[str]:
+        """ID of the memory stored with this content hash, if any."""
+        with self.lock, self._file_lock(exclusive=False):
+            self._refresh()
+            row = self.hashes.get(digest)
+            return self.ids[row] if row is not None else None
+
+    def ids_for_hashes(self, digests: Iterable[str]) -> Dict[str, str]:
+        """{content hash: memory id} for the hashes already stored."""
+        with self.lock, self._file_lock(exclusive=False):
+            self._refresh()
+            return {d: self.ids[self.hashes[d]] for d in digests if d in self.hashes}
+
+    def known_ids(self, ids: Iterable[str]) -> set:
+        """The ids among these that are stored."""
+        with self.lock, self._file_lock(exclusive=False):
+            self._refresh()
+            stored = set(self.ids)
+            return {mem_id for mem_id in ids if mem_id in stored}
+
+    def has_hash(self, digest: str) -> bool:
+        return self.id_for_hash(digest) is not None
+
+    def vectors_for_hashes(self, digests: Iterable[str]) -> Dict[str, np.ndarray]:
+        """{content hash: float32 vector} for the hashes already stored."""
+        with self.lock, self._file_lock(exclusive=False):
+            self._refresh()
+            return {d: np.asarray(self._matrix[self.hashes[d]], dtype=np.float32) for d in digests if d in self.hashes}
+
+    def rows(self, include_vectors: bool = False) -> Tuple:
+        """(ids, documents, metadatas), plus float32 vectors with include_vectors, as of now."""
+        with self.lock, self._file_lock(exclusive=False):
+            self._refresh()
+            rows = (list(self.ids), list(self.documents), list(self.metadatas))
+            if include_vectors:
+                vectors = np.asarray(self._matrix[:len(self.ids)], dtype=np.float32) if self.ids else np.empty((0, self.dim or 0), dtype=np.float32)
+                rows += (vectors,)
+            return rows
+
+    def add(self, ids: Sequence[str], documents: Sequence[str], metadatas: Sequence[Dict], embeddings) -> None:
+        vectors = np.asarray(embeddings, dtype=self.dtype)
+        if vectors.ndim != 2 or len(vectors) != len(ids):
+            raise ValueError("embeddings must be one row per id")
+        with self.lock, self._file_lock(exclusive=True):
+            self._refresh()
+            if self.dim is not None and vectors.shape[1] != self.dim:
+                raise ValueError(f"Expected {self.dim}-dimensional embeddings, got {vectors.shape[1]}")
+            dim = vectors.shape[1]
+            os.makedirs(os.path.dirname(self.vectors_path) or ".", exist_ok=True)
+            # Drop vectors appended by an add that crashed before writing its rows, so rows stay aligned
+            expected = len(self.ids) * dim * self.dtype.itemsize
+            if os.path.exists(self.vectors_path) and os.path.getsize(self.vectors_path) > expected:
+                os.truncate(self.vectors_path, expected)
+            # Vectors first: a crash between the two writes leaves vectors without rows (truncated above)
+            with open(self.vectors_path, "ab") as f:
+                f.write(np.ascontiguousarray(vectors).tobytes())
+            with open(self.rows_path, "a", encoding="utf-8") as f:
+                for mem_id, doc, meta in zip(ids, documents, metadatas):
+                    f.write(json.dumps({"id": mem_id, "dim": dim, "document": doc, "metadata": meta}) + "\n")
+            self._refresh()
+
+    def remove(self, ids: Iterable[str]) -> int:
+        """Drop rows by id and rewrite both files without them. Returns the number removed."""
+        drop = set(ids)
+        with self.lock, self._file_lock(exclusive=True):
+            self._refresh()
+            keep = [i for i, mem_id in enumerate(self.ids) if mem_id not in drop]
+            if len(keep) == len(self.ids):
+                return 0
+            removed = len(self.ids) - len(keep)
+            rows = [(self.ids[i], self.documents[i], self.metadatas[i]) for i in keep]
+            vectors = np.asarray(self._matrix[keep], dtype=self.dtype) if keep else np.empty((0, self.dim), dtype=self.dtype)
+            rows_tmp, vectors_tmp = self.rows_path + ".compact", self.vectors_path + ".compact"
+            with open(vectors_tmp, "wb") as f:
+                f.write(np.ascontiguousarray(vectors).tobytes())
+            with open(rows_tmp, "w", encoding="utf-8") as f:
+                for mem_id, doc, meta in rows:
+                    f.write(json.dumps({"id": mem_id, "dim": self.dim, "document": doc, "metadata": meta}) + "\n")
+            self._matrix = None
+            os.replace(vectors_tmp, self.vectors_path)
+            os.replace(rows_tmp, self.rows_path)
+            # An emptied index forgets its dimension; the next add may come from a different model
+            self._reset()
+            self._refresh()
+        return removed
+
+    def vectors(self) -> np.ndarray:
+        """All stored vectors as float32, in row order."""
+        return self.rows(include_vectors=True)[3]
+
+    def query(self, embedding, n_results: int, since: Optional[float] = None, max_distance: Optional[float] = None) -> List[Tuple[str, Dict, float]]:
+        """n_results nearest rows as (document, metadata, squared L2 distance), closest first.
+
+        since (epoch seconds) and max_distance are applied before the top-k
+        selection, so filtered-out rows never take a result slot.
+        """
+        with self.lock, self._file_lock(exclusive=False):
+            self._refresh()
+            matrix, sq_norms, ts, count = self._matrix, self._sq_norms, self._ts, len(self.ids)
+            documents, metadatas = self.documents, self.metadatas
+        if not count or n_results <= 0:
+            return []
+        q = np.asarray(embedding, dtype=np.float32).reshape(-1)
+        dots = np.empty(count, dtype=np.float32)
+        for start in range(0, count, SEARCH_BLOCK_ROWS):
+            block = np.asarray(matrix[start:start + SEARCH_BLOCK_ROWS], dtype=np.float32)
+            dots[start:start + len(block)] = block @ q
+        distances = sq_norms[:count] - 2 * dots + float(q @ q)
+        keep = np.ones(count, dtype=bool)
+        if since is not None:
+            keep &= ts[:count] >= since
+        if max_distance is not None:
+            keep &= distances <= max_distance
+        candidates = np.flatnonzero(keep)
+        k = min(n_results, len(candidates))
+        if k == 0:
+            return []
+        if k < len(candidates):
+            candidates = candidates[np.argpartition(distances[candidates], k - 1)[:k]]
+        top = candidates[np.argsort(distances[candidates], kind="stable")]
+        return [(documents[i], metadatas[i], float(distances[i])) for i in top]
+
+
+class NumpyMemoryIndex:
+    """Opens per-user indexes on demand and keeps a bounded number of them in memory."""
+
+    def __init__(self, root: str = MEMORY_INDEX_DIR, max_open: int = MEMORY_INDEX_OPEN_USERS, dtype=np.float16):
+        self.root = root
+        self.dtype = dtype
+        self.max_open = max(1, max_open)
+        self._open: "OrderedDict[int, UserVectorIndex]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def user(self, user_id: int) -> UserVectorIndex:
+        with self._lock:
+            index = self._open.get(user_id)
+            if index is not None:
+                self._open.move_to_end(user_id)
+                return index
+        index = UserVectorIndex(self.root, user_id, self.dtype)
+        with self._lock:
+            index = self._open.setdefault(user_id, index)
+            self._open.move_to_end(user_id)
+            while len(self._open) > self.max_open:
+                self._open.popitem(last=False)
+        return index
+
+    def user_ids(self) -> Iterable[int]:
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(int(m.group(1)) for m in map(_USER_FILE.match, os.listdir(self.root)) if m)
+
+    def count(self, user_id: int) -> int:
+        return len(self.user(user_id))
+
+    def query_all(self, embedding, n_results: int) -> List[Tuple[str, Dict, float]]:
+        """Nearest rows across every user (for the unscoped search_memory)."""
+        hits: List[Tuple[str, Dict, float]] = []
+        for user_id in self.user_ids():
+            hits.extend(self.user(user_id).query(embedding, n_results))
+        hits.sort(key=lambda hit: hit[2])
+        return hits[:n_results]